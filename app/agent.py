@@ -0,0 +1,251 @@
+"""Worker agent: a process that owns a local execution engine and runs invocations for the API.
+
+Run one or more next to the API (or on other machines) and start the API with DISPATCH_MODE=agents:
+
+    AGENT_TOKEN=<secret> python -m app.agent --port 9001 --registry http://localhost:8000
+
+Each agent registers itself by heartbeating its URL, capacity, load and available runtimes to
+the API's /agents/heartbeat, which the API's dispatcher reads to place invocations. On shutdown,
+or when drained through the API or POST /drain, it stops taking new calls, finishes the ones it
+has and deregisters. Agents need no database; the API records metrics for the calls it dispatches.
+The API and its agents must share the same AGENT_TOKEN: heartbeats, deregistration, /execute
+and /drain are refused without it.
+"""
+import os
+import sys
+import json
+import socket
+import asyncio
+import argparse
+import functools
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional
+from urllib.request import Request, urlopen
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse, Response
+from app.api.agents import require_agent_token
+from app.core import telemetry
+from app.core.dispatcher import AGENT_TOKEN, AGENT_TOKEN_HEADER
+from app.core.execution import FunctionExecutionEngine
+from app.core.health import DockerUnavailableError
+from app.models.function import Runtime
+from app.schemas.agent import AgentExecute
+
+logger = logging.getLogger(__name__)
+
+AGENT_HOST = os.getenv("AGENT_HOST", "127.0.0.1")
+AGENT_PORT = int(os.getenv("AGENT_PORT", "9001"))
+AGENT_ID = os.getenv("AGENT_ID") or f"{socket.gethostname()}:{AGENT_PORT}"
+# The address the API reaches this agent on, if not the one it listens on.
+AGENT_URL = os.getenv("AGENT_URL") or f"http://{AGENT_HOST}:{AGENT_PORT}"
+AGENT_REGISTRY_URL = os.getenv("AGENT_REGISTRY_URL", "http://localhost:8000")
+# Executions run at once; further calls are turned away with 503 so the dispatcher tries another agent.
+AGENT_CAPACITY = int(os.getenv("AGENT_CAPACITY", "8"))
+AGENT_HEARTBEAT_INTERVAL = float(os.getenv("AGENT_HEARTBEAT_INTERVAL", "5"))
+AGENT_DRAIN_TIMEOUT = float(os.getenv("AGENT_DRAIN_TIMEOUT", "60"))
+
+
+class Agent:
+    def __init__(self, engine: FunctionExecutionEngine, agent_id: str = AGENT_ID, url: str = AGENT_URL,
+                 registry_url: str = AGENT_REGISTRY_URL, capacity: int = AGENT_CAPACITY,
+                 heartbeat_interval: float = AGENT_HEARTBEAT_INTERVAL):
+        self.engine = engine
+        self.id = agent_id
+        self.url = url
+        self.registry_url = registry_url.rstrip("/")
+        self.capacity = capacity
+        self.heartbeat_interval = heartbeat_interval
+        self.started_at = datetime.utcnow()
+        self.draining = False
+        self.executor = ThreadPoolExecutor(max_workers=capacity, thread_name_prefix="agent")
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._idle = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_heartbeat: Optional[datetime] = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="agent-heartbeat", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = AGENT_DRAIN_TIMEOUT) -> None:
+        # Stop taking work, let the dispatchers know, and wait for the calls already running.
+        self.drain()
+        with self._idle:
+            self._idle.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.heartbeat_interval + 5)
+            self._thread = None
+        try:
+            self._call_registry("DELETE", f"/agents/{self.id}")
+        except Exception as e:
+            logger.warning("Deregistering agent %s failed: %s", self.id, e)
+        self.executor.shutdown(wait=False)
+
+    def drain(self) -> None:
+        self.draining = True
+        self.heartbeat()
+
+    def try_acquire(self) -> bool:
+        with self._idle:
+            if self.draining or self._in_flight >= self.capacity:
+                self._rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._idle:
+            self._in_flight -= 1
+            self._completed += 1
+            self._idle.notify_all()
+
+    def runtimes(self):
+        available = self.engine.health.status()["runtimes"]
+        return [runtime.value for runtime in Runtime if available.get(runtime.value)]
+
+    def status(self) -> Dict[str, Any]:
+        with self._idle:
+            return {
+                "id": self.id,
+                "url": self.url,
+                "capacity": self.capacity,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "draining": self.draining,
+                "runtimes": self.runtimes(),
+                "started_at": self.started_at.isoformat(),
+                "last_heartbeat": self._last_heartbeat.isoformat() if self._last_heartbeat else None,
+            }
+
+    def heartbeat(self) -> None:
+        status = self.status()
+        body = {key: status[key] for key in ("id", "url", "capacity", "in_flight", "draining", "runtimes", "started_at")}
+        try:
+            registered = self._call_registry("POST", "/agents/heartbeat", body)
+        except Exception as e:
+            logger.warning("Heartbeat from agent %s failed: %s", self.id, e)
+            return
+        self._last_heartbeat = datetime.utcnow()
+        if registered.get("draining") and not self.draining:
+            logger.info("Agent %s drained through the API", self.id)
+            self.draining = True
+
+    def _call_registry(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(body).encode() if body is not None else None
+        request = Request(self.registry_url + path, data=data, method=method,
+                          headers={"Content-Type": "application/json", AGENT_TOKEN_HEADER: AGENT_TOKEN})
+        with urlopen(request, timeout=self.heartbeat_interval) as response:
+            payload = response.read()
+        return json.loads(payload) if payload else {}
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.heartbeat()
+            self._stopped.wait(self.heartbeat_interval)
+
+
+def create_app(agent: Agent) -> FastAPI:
+    app = FastAPI(title="Serverless Function Worker Agent", version="1.0.0")
+    engine = agent.engine
+
+    def unavailable(detail: str) -> JSONResponse:
+        # 503 tells the dispatcher to place the call on another agent.
+        return JSONResponse(status_code=503, content={"detail": detail, "draining": agent.draining})
+
+    # Anyone who can call /execute can run code here, so it takes the API's AGENT_TOKEN.
+    @app.post("/execute", dependencies=[Depends(require_agent_token)])
+    async def execute(request: AgentExecute):
+        if not agent.try_acquire():
+            return unavailable("Agent is draining" if agent.draining else f"Agent is at capacity ({agent.capacity})")
+        try:
+            engine.ensure_available(request.runtime)
+            run = functools.partial(engine.execute, request.function_id, request.code, request.language,
+                                    request.input, runtime=request.runtime, timeout=request.timeout,
+                                    memory_limit=request.memory_limit)
+            result, metrics = await asyncio.get_running_loop().run_in_executor(agent.executor, run)
+            return {"result": result, "metrics": metrics}
+        except DockerUnavailableError as e:
+            return unavailable(str(e))
+        except Exception as e:
+            return JSONResponse(status_code=400, content={"detail": str(e)})
+        finally:
+            agent.release()
+
+    @app.get("/status")
+    def status():
+        return agent.status()
+
+    @app.post("/drain", dependencies=[Depends(require_agent_token)])
+    def drain():
+        agent.drain()
+        return agent.status()
+
+    @app.get("/health")
+    def health():
+        status = engine.health.status()
+        status["agent"] = agent.status()
+        return JSONResponse(content=status, status_code=503 if agent.draining else 200)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(content=telemetry.render(), media_type=telemetry.CONTENT_TYPE)
+
+    @app.on_event("startup")
+    def start_agent():
+        engine.start()
+        agent.start()
+
+    @app.on_event("shutdown")
+    def stop_agent():
+        agent.shutdown()
+        engine.shutdown()
+
+    return app
+
+
+engine = FunctionExecutionEngine()
+agent = Agent(engine)
+app = create_app(agent)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a worker agent that executes functions for the API.")
+    parser.add_argument("--host", default=AGENT_HOST)
+    parser.add_argument("--port", type=int, default=AGENT_PORT)
+    parser.add_argument("--id", help="Agent id (default: hostname:port)")
+    parser.add_argument("--url", help="URL the API reaches this agent on (default: http://host:port)")
+    parser.add_argument("--registry", default=AGENT_REGISTRY_URL, help="Base URL of the API")
+    parser.add_argument("--capacity", type=int, default=AGENT_CAPACITY)
+    args = parser.parse_args()
+    if not AGENT_TOKEN:
+        parser.error("set AGENT_TOKEN to the secret shared with the API")
+
+    # Settings are read when the app module is imported, so they are handed over in the environment.
+    os.environ.update({
+        "AGENT_HOST": args.host,
+        "AGENT_PORT": str(args.port),
+        "AGENT_REGISTRY_URL": args.registry,
+        "AGENT_CAPACITY": str(args.capacity),
+    })
+    if args.id:
+        os.environ["AGENT_ID"] = args.id
+    if args.url:
+        os.environ["AGENT_URL"] = args.url
+
+    import uvicorn
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run("app.agent:app", host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime
+from app.core.database import get_db
+from app.core.dispatcher import AGENT_TOKEN, AGENT_TOKEN_HEADER, agent_token_valid, is_live, record_heartbeat
+from app.models.agent import WorkerAgent
+from app.models.function import Runtime
+from app.schemas.agent import Agent, AgentHeartbeat
+
+# Registry of worker agents (python -m app.agent). Agents call the heartbeat route themselves;
+# the rest is for operators.
+router = APIRouter()
+
+def require_agent_token(token: Optional[str] = Header(None, alias=AGENT_TOKEN_HEADER)) -> None:
+    # Registering an agent means receiving function code and input, so only holders of the
+    # shared AGENT_TOKEN may do it; the agents check the same token on the calls they run.
+    if not AGENT_TOKEN:
+        raise HTTPException(status_code=403, detail="Worker agents are disabled; set AGENT_TOKEN to enable them")
+    if not agent_token_valid(token):
+        raise HTTPException(status_code=401, detail=f"Missing or invalid {AGENT_TOKEN_HEADER} header")
+
+def _agent(agent: WorkerAgent, now: datetime) -> Agent:
+    return Agent(
+        id=agent.id,
+        url=agent.url,
+        capacity=agent.capacity,
+        in_flight=agent.in_flight,
+        draining=agent.draining,
+        runtimes=[Runtime(runtime) for runtime in agent.runtimes or []],
+        started_at=agent.started_at,
+        last_heartbeat=agent.last_heartbeat,
+        live=is_live(agent, now)
+    )
+
+def _get_agent_or_404(db: Session, agent_id: str) -> WorkerAgent:
+    agent = db.query(WorkerAgent).filter(WorkerAgent.id == agent_id).first()
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent
+
+@router.post("/heartbeat", response_model=Agent, dependencies=[Depends(require_agent_token)])
+def heartbeat(heartbeat: AgentHeartbeat, db: Session = Depends(get_db)):
+    # The response tells the agent whether an operator has asked it to drain.
+    return _agent(record_heartbeat(db, heartbeat), datetime.utcnow())
+
+@router.get("/", response_model=List[Agent])
+def list_agents(db: Session = Depends(get_db)):
+    now = datetime.utcnow()
+    return [_agent(agent, now) for agent in db.query(WorkerAgent).order_by(WorkerAgent.id).all()]
+
+@router.post("/{agent_id}/drain", response_model=Agent)
+def drain_agent(agent_id: str, db: Session = Depends(get_db)):
+    # Dispatchers stop sending new calls at their next refresh; the agent finishes what it has
+    # and stays drained until it restarts.
+    agent = _get_agent_or_404(db, agent_id)
+    agent.draining = True
+    db.commit()
+    db.refresh(agent)
+    return _agent(agent, datetime.utcnow())
+
+@router.delete("/{agent_id}", status_code=204, dependencies=[Depends(require_agent_token)])
+def deregister_agent(agent_id: str, db: Session = Depends(get_db)):
+    agent = _get_agent_or_404(db, agent_id)
+    db.delete(agent)
+    db.commit()
+    return Response(status_code=204)
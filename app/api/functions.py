@@ -1,18 +1,50 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List, Optional, Tuple
 from datetime import datetime
-from app.core.database import get_db
+import asyncio
+import base64
+import json
+import os
+import time
+from app.core.database import get_async_db
 from app.core.execution import FunctionExecutionEngine
+from app.core.dispatcher import Dispatcher, DISPATCH_MODE
+from app.core.function_cache import FunctionCache, FunctionDefinition
+from app.core.health import DockerUnavailableError
+from app.core.scheduler import ExecutionScheduler, SchedulerSaturatedError
+from app.core.jobs import JobWorkerPool
+from app.core.recorder import MetricRecorder
+from app.core.autoscaler import Autoscaler, AUTOSCALE_ENABLED
+from app.core.retention import RetentionWorker
+from app.core.rollups import function_totals, function_totals_statement
+from app.core.streaming import ThreadEventStream
+from app.core import telemetry
 from app.models.function import Function as FunctionModel
-from app.schemas.function import Function, FunctionCreate, FunctionUpdate, FunctionExecute
-from app.models.metrics import ExecutionMetric  # <- Add this line
+from app.models.metrics import ExecutionMetric as ExecutionMetricModel
+from app.schemas.function import (Function, FunctionCreate, FunctionUpdate, FunctionExecute, FunctionBatchExecute,
+                                  StreamFormat, ExecutionMetricPage)
+from app.schemas.job import JobSubmitted
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+METRICS_PAGE_MAX = int(os.getenv("METRICS_PAGE_MAX", "1000"))
 
 router = APIRouter()
-execution_engine = FunctionExecutionEngine()
+# With DISPATCH_MODE=agents, executions run on worker agents (python -m app.agent) instead of here.
+execution_engine = FunctionExecutionEngine(dispatcher=Dispatcher() if DISPATCH_MODE == "agents" else None)
+function_cache = FunctionCache()
+scheduler = ExecutionScheduler()
+metric_recorder = MetricRecorder()
+retention_worker = RetentionWorker()
+# The local pool is unused when dispatching to agents, each of which keeps its own.
+autoscaler = Autoscaler(execution_engine.pool, execution_engine.is_pooled,
+                        enabled=AUTOSCALE_ENABLED and execution_engine.dispatcher is None)
+job_workers = JobWorkerPool(execution_engine, metric_recorder, function_cache=function_cache)
 
 @router.post("/", response_model=Function)
-def create_function(function: FunctionCreate, db: Session = Depends(get_db)):
+async def create_function(function: FunctionCreate, db: AsyncSession = Depends(get_async_db)):
     db_function = FunctionModel(
         name=function.name,
         code=function.code,
@@ -20,74 +52,287 @@ def create_function(function: FunctionCreate, db: Session = Depends(get_db)):
         timeout=function.timeout,
         memory_limit=function.memory_limit,
         runtime=function.runtime,
+        cacheable=bool(function.cacheable),
         created_at=datetime.utcnow()
     )
     db.add(db_function)
-    db.commit()
-    db.refresh(db_function)
+    await db.commit()
+    await db.refresh(db_function)
     return db_function
 
+async def _get_function_or_404(db: AsyncSession, function_id: int) -> FunctionModel:
+    function = (await db.execute(select(FunctionModel).where(FunctionModel.id == function_id))).scalars().first()
+    if not function:
+        raise HTTPException(status_code=404, detail="Function not found")
+    return function
+
+async def _get_definition_or_404(function_id: int) -> FunctionDefinition:
+    # Execution paths read through the function cache, so a warm call needs no database round trip.
+    function = await function_cache.aget(function_id)
+    if function is None:
+        raise HTTPException(status_code=404, detail="Function not found")
+    return function
+
+async def _attach_summaries(db: AsyncSession, functions: List[FunctionModel]) -> None:
+    # One grouped query for the whole page instead of loading each function's metrics.
+    if not functions:
+        return
+    rows = await db.execute(function_totals_statement([function.id for function in functions]))
+    totals = function_totals(rows.all())
+    for function in functions:
+        function.metrics_summary = totals.get(function.id, {})
+
 @router.get("/", response_model=List[Function])
-def list_functions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(FunctionModel).offset(skip).limit(limit).all()
+async def list_functions(skip: int = 0, limit: int = 100, include_summary: bool = False,
+                         db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(FunctionModel).order_by(FunctionModel.id).offset(skip).limit(limit))
+    functions = result.scalars().all()
+    if include_summary:
+        await _attach_summaries(db, functions)
+    return functions
 
 @router.get("/{function_id}", response_model=Function)
-def get_function(function_id: int, db: Session = Depends(get_db)):
-    function = db.query(FunctionModel).filter(FunctionModel.id == function_id).first()
-    if not function:
-        raise HTTPException(status_code=404, detail="Function not found")
+async def get_function(function_id: int, include_summary: bool = False, db: AsyncSession = Depends(get_async_db)):
+    function = await _get_function_or_404(db, function_id)
+    if include_summary:
+        await _attach_summaries(db, [function])
     return function
 
+def _encode_cursor(metric: ExecutionMetricModel) -> str:
+    return base64.urlsafe_b64encode(f"{metric.created_at.isoformat()}|{metric.id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, metric_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(metric_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/{function_id}/metrics", response_model=ExecutionMetricPage)
+async def list_function_metrics(function_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                                limit: int = 100, cursor: Optional[str] = None,
+                                db: AsyncSession = Depends(get_async_db)):
+    # Newest first. Keyset pagination on (created_at, id) walks the (function_id, created_at, id)
+    # index, so deep pages cost the same as the first one.
+    await _get_function_or_404(db, function_id)
+    limit = max(1, min(limit, METRICS_PAGE_MAX))
+    query = select(ExecutionMetricModel).where(ExecutionMetricModel.function_id == function_id)
+    if since is not None:
+        query = query.where(ExecutionMetricModel.created_at >= since)
+    if until is not None:
+        query = query.where(ExecutionMetricModel.created_at < until)
+    if cursor is not None:
+        created_at, metric_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            ExecutionMetricModel.created_at < created_at,
+            and_(ExecutionMetricModel.created_at == created_at, ExecutionMetricModel.id < metric_id),
+        ))
+    query = query.order_by(ExecutionMetricModel.created_at.desc(), ExecutionMetricModel.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).scalars().all()
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
+
 @router.put("/{function_id}", response_model=Function)
-def update_function(function_id: int, function: FunctionUpdate, db: Session = Depends(get_db)):
-    db_function = db.query(FunctionModel).filter(FunctionModel.id == function_id).first()
-    if not db_function:
-        raise HTTPException(status_code=404, detail="Function not found")
+async def update_function(function_id: int, function: FunctionUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_function = await _get_function_or_404(db, function_id)
 
     update_data = function.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_function, key, value)
 
-    db.commit()
-    db.refresh(db_function)
+    await db.commit()
+    await db.refresh(db_function)
+    function_cache.invalidate(function_id)
+    execution_engine.artifacts.invalidate(function_id)
+    execution_engine.results.invalidate(function_id)
     return db_function
 
 @router.delete("/{function_id}")
-def delete_function(function_id: int, db: Session = Depends(get_db)):
-    function = db.query(FunctionModel).filter(FunctionModel.id == function_id).first()
-    if not function:
-        raise HTTPException(status_code=404, detail="Function not found")
-    db.delete(function)
-    db.commit()
+async def delete_function(function_id: int, db: AsyncSession = Depends(get_async_db)):
+    function = await _get_function_or_404(db, function_id)
+    await db.delete(function)
+    await db.commit()
+    function_cache.invalidate(function_id)
+    execution_engine.artifacts.invalidate(function_id)
+    execution_engine.results.invalidate(function_id)
     return {"message": "Function deleted successfully"}
 
+def _format_event(event: dict, format: StreamFormat) -> str:
+    if format == StreamFormat.SSE:
+        if "chunk" in event:
+            kind = "chunk"
+        elif "error" in event and "result" not in event:
+            kind = "error"
+        else:
+            kind = "result"
+        return f"event: {kind}\ndata: {json.dumps(event)}\n\n"
+    return json.dumps(event) + "\n"
+
+def _media_type(format: StreamFormat) -> str:
+    return "text/event-stream" if format == StreamFormat.SSE else "application/x-ndjson"
+
+def _queued(func, function_id: int, language, runtime):
+    # Records how long the call waited in the scheduler before a worker thread picked it up.
+    queued_at = time.perf_counter()
+
+    def run(*args, **kwargs):
+        telemetry.observe_phase("queue", time.perf_counter() - queued_at, function_id, language, runtime)
+        return func(*args, **kwargs)
+    return run
+
 @router.post("/{function_id}/execute")
-def execute_function(function_id: int, input_data: FunctionExecute, db: Session = Depends(get_db)):
-    function = db.query(FunctionModel).filter(FunctionModel.id == function_id).first()
-    if not function:
-        raise HTTPException(status_code=404, detail="Function not found")
+async def execute_function(function_id: int, input_data: FunctionExecute):
+    # The function lookup uses the async engine (or the cache) and container runs go through
+    # the scheduler, so the event loop is never blocked.
+    request_start = time.perf_counter()
+    function = await _get_definition_or_404(function_id)
+    labels = (function.id, function.language, function.runtime)
+    telemetry.observe_phase("db_lookup", time.perf_counter() - request_start, *labels)
 
     try:
-        result, metrics = execution_engine.execute(
-            function_id=function.id,
-            code=function.code,
-            language=function.language,
-            runtime=function.runtime,
-            input_data=input_data.input
-        )
-        success = metrics.get("error") is None  # If no error, success is True
-
-        db_metric = ExecutionMetric(
-            function_id=function.id,
-            execution_time=metrics["execution_time"],
-            memory_used=metrics["memory_used"],
-            success=success,
-            error=metrics.get("error"),
-            created_at=datetime.utcnow()
+        # A memoized result is served without a scheduler slot, a container or even Docker.
+        hit = function.cacheable and execution_engine.cached(function.id, function.code, function.language,
+                                                              input_data.input)
+        if hit:
+            result, metrics = hit
+        else:
+            execution_engine.ensure_available(function.runtime)
+            result, metrics = await scheduler.submit(
+                function.id,
+                function.runtime,
+                _queued(execution_engine.execute, *labels),
+                function_id=function.id,
+                code=function.code,
+                language=function.language,
+                runtime=function.runtime,
+                timeout=function.timeout,
+                memory_limit=function.memory_limit,
+                input_data=input_data.input,
+                cacheable=function.cacheable
             )
-        db.add(db_metric)
-        db.commit()
+
+        # Queued for a background bulk insert, so the response does not wait on the database.
+        with telemetry.timed("metric_record", *labels):
+            metric_recorder.record(function.id, metrics, function.runtime)
 
         return {"result": result, "metrics": metrics}
+    except SchedulerSaturatedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DockerUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        telemetry.observe_request("execute", time.perf_counter() - request_start, *labels)
+
+@router.post("/{function_id}/execute:async", response_model=JobSubmitted, status_code=202)
+async def execute_function_async(function_id: int, input_data: FunctionExecute,
+                                 db: AsyncSession = Depends(get_async_db)):
+    function = await _get_definition_or_404(function_id)
+    job = await job_workers.submit_async(db, function.id, input_data.input)
+    return JobSubmitted(job_id=job.id, status=job.status)
+
+@router.post("/{function_id}/execute:batch")
+async def execute_function_batch(function_id: int, batch: FunctionBatchExecute,
+                                 format: StreamFormat = StreamFormat.NDJSON):
+    if len(batch.inputs) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"Batch exceeds {BATCH_MAX_ITEMS} inputs")
+    request_start = time.perf_counter()
+    function = await _get_definition_or_404(function_id)
+    try:
+        execution_engine.ensure_available(function.runtime)
+    except DockerUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    # Looked up once for the whole batch; items share the function's warm containers.
+    function_key = function.id
+    code, language, runtime = function.code, function.language, function.runtime
+    timeout, memory_limit, cacheable = function.timeout, function.memory_limit, function.cacheable
+    parallelism = min(batch.parallelism or scheduler.max_per_function, scheduler.max_per_function)
+
+    async def run_item(index: int, item: Any, slots: asyncio.Semaphore) -> Tuple[dict, Optional[dict]]:
+        hit = cacheable and execution_engine.cached(function_key, code, language, item)
+        if hit:
+            result, metrics = hit
+        else:
+            async with slots:
+                try:
+                    result, metrics = await scheduler.submit(
+                        function_key,
+                        runtime,
+                        _queued(execution_engine.execute, function_key, language, runtime),
+                        function_id=function_key,
+                        code=code,
+                        language=language,
+                        runtime=runtime,
+                        timeout=timeout,
+                        memory_limit=memory_limit,
+                        input_data=item,
+                        cacheable=cacheable
+                    )
+                except Exception as e:
+                    return {"index": index, "error": str(e)}, None
+        metrics["created_at"] = datetime.utcnow()
+        line_metrics = {key: value for key, value in metrics.items() if key != "created_at"}
+        return {"index": index, "result": result, "metrics": line_metrics}, metrics
+
+    async def stream():
+        slots = asyncio.Semaphore(parallelism)
+        tasks = [asyncio.ensure_future(run_item(index, item, slots)) for index, item in enumerate(batch.inputs)]
+        completed = []
+        try:
+            pending = tasks if batch.ordered else asyncio.as_completed(tasks)
+            for task in pending:
+                line, metrics = await task
+                if metrics is not None:
+                    completed.append(metrics)
+                yield _format_event(line, format)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Every item that finished is recorded, even if the client went away.
+            with telemetry.timed("metric_record", function_key, language, runtime):
+                metric_recorder.record_many(function_key, completed, runtime)
+            telemetry.observe_request("batch", time.perf_counter() - request_start, function_key, language, runtime)
+
+    return StreamingResponse(stream(), media_type=_media_type(format))
+
+@router.post("/{function_id}/execute:stream")
+async def execute_function_stream(function_id: int, input_data: FunctionExecute,
+                                  format: StreamFormat = StreamFormat.NDJSON):
+    request_start = time.perf_counter()
+    function = await _get_definition_or_404(function_id)
+    function_key = function.id
+    code, language, runtime = function.code, function.language, function.runtime
+    timeout, memory_limit = function.timeout, function.memory_limit
+
+    stream = ThreadEventStream(lambda: execution_engine.execute_stream(
+        function_id=function_key,
+        code=code,
+        language=language,
+        runtime=runtime,
+        timeout=timeout,
+        memory_limit=memory_limit,
+        input_data=input_data.input
+    ))
+    # Wait for the first event so saturation and daemon errors still map to HTTP status codes.
+    try:
+        execution_engine.ensure_available(runtime)
+        stream.start(lambda pump: scheduler.submit(function_key, runtime, _queued(pump, function_key, language, runtime)))
+        first = await stream.next()
+    except SchedulerSaturatedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DockerUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def body():
+        try:
+            async for event in stream.events(first):
+                if "metrics" in event:
+                    with telemetry.timed("metric_record", function_key, language, runtime):
+                        metric_recorder.record(function_key, event["metrics"], runtime)
+                yield _format_event(event, format)
+        finally:
+            telemetry.observe_request("stream", time.perf_counter() - request_start, function_key, language, runtime)
+
+    return StreamingResponse(body(), media_type=_media_type(format))
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.models.job import ExecutionJob
+from app.schemas.job import Job, JobMetrics
+
+router = APIRouter()
+
+@router.get("/{job_id}", response_model=Job)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(ExecutionJob).filter(ExecutionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Job(
+        job_id=job.id,
+        function_id=job.function_id,
+        status=job.status,
+        result=job.result,
+        metrics=JobMetrics(
+            execution_time=job.execution_time,
+            memory_used=job.memory_used,
+            error=job.error
+        ),
+        attempts=job.attempts,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
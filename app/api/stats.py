@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from datetime import datetime
+from app.core.database import get_db
+from app.core.rollups import RollupAggregate, combine, query_rollups
+from app.models.function import Function as FunctionModel
+from app.schemas.stats import Granularity, FunctionStats, FunctionSummary, MetricSummary, RuntimeSummary, SeriesPoint
+
+# Everything here is served from the pre-aggregated rollup table; raw metrics are never scanned.
+router = APIRouter()
+
+def _group(rollups, key) -> Dict:
+    groups: Dict = {}
+    for rollup in rollups:
+        aggregate = groups.get(key(rollup))
+        if aggregate is None:
+            aggregate = groups[key(rollup)] = RollupAggregate()
+        aggregate.add_rollup(rollup)
+    return groups
+
+@router.get("/functions", response_model=List[FunctionSummary])
+def function_stats(granularity: Granularity = Granularity.DAY, since: Optional[datetime] = None,
+                   until: Optional[datetime] = None, db: Session = Depends(get_db)):
+    rollups = query_rollups(db, granularity.value, since, until)
+    groups = _group(rollups, lambda rollup: rollup.function_id)
+    return [FunctionSummary(function_id=function_id, **aggregate.summary())
+            for function_id, aggregate in sorted(groups.items())]
+
+@router.get("/functions/{function_id}", response_model=FunctionStats)
+def function_detail(function_id: int, granularity: Granularity = Granularity.HOUR, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None, db: Session = Depends(get_db)):
+    if not db.query(FunctionModel.id).filter(FunctionModel.id == function_id).first():
+        raise HTTPException(status_code=404, detail="Function not found")
+    rollups = query_rollups(db, granularity.value, since, until, function_id=function_id)
+    runtimes = _group(rollups, lambda rollup: rollup.runtime)
+    series = _group(rollups, lambda rollup: rollup.bucket_start)
+    return FunctionStats(
+        function_id=function_id,
+        granularity=granularity,
+        summary=MetricSummary(**combine(rollups).summary()),
+        runtimes=[RuntimeSummary(runtime=runtime, **aggregate.summary()) for runtime, aggregate in runtimes.items()],
+        series=[SeriesPoint(bucket_start=start, **aggregate.summary()) for start, aggregate in sorted(series.items())],
+    )
+
+@router.get("/runtimes", response_model=List[RuntimeSummary])
+def runtime_stats(granularity: Granularity = Granularity.DAY, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, function_id: Optional[int] = None, db: Session = Depends(get_db)):
+    # Docker vs gVisor: the same rollups, merged per runtime instead of per function.
+    rollups = query_rollups(db, granularity.value, since, until, function_id=function_id)
+    groups = _group(rollups, lambda rollup: rollup.runtime)
+    return [RuntimeSummary(runtime=runtime, **aggregate.summary()) for runtime, aggregate in groups.items()]
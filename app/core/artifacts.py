@@ -0,0 +1,111 @@
+import os
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+from app.models.function import Language, Runtime
+from app.core.protocol import encode_frame
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_CACHE_MAX_ENTRIES = int(os.getenv("ARTIFACT_CACHE_MAX_ENTRIES", "512"))
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Bump whenever FunctionExecutionEngine._wrap_code or the worker handler template changes,
+# so artifacts built from the old template are never reused.
+TEMPLATE_VERSION = "3"
+
+
+@dataclass
+class FunctionArtifact:
+    key: str
+    wrapped_source: str
+    # The wrapped source already encoded as the first stdin frame for run.py / run.js.
+    source_frame: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.wrapped_source) + len(self.source_frame)
+
+
+def artifact_key(code: str, language: Language, runtime: Runtime) -> str:
+    digest = hashlib.sha256()
+    for part in (TEMPLATE_VERSION, language.value, runtime.value, code):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, wrap: Callable[[str, Language], str], max_entries: int = ARTIFACT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = ARTIFACT_CACHE_MAX_BYTES):
+        self._wrap = wrap
+        self.max_entries = max(max_entries, 1)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, FunctionArtifact]" = OrderedDict()
+        self._functions: Dict[int, str] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, function_id: int, code: str, language: Language, runtime: Runtime) -> FunctionArtifact:
+        key = artifact_key(code, language, runtime)
+        with self._lock:
+            artifact = self._entries.get(key)
+            if artifact is not None:
+                self._entries.move_to_end(key)
+                self._functions[function_id] = key
+                self._hits += 1
+                return artifact
+            self._misses += 1
+
+        # Templating happens outside the lock; two racing misses build the same bytes.
+        wrapped = self._wrap(code, language)
+        artifact = FunctionArtifact(key, wrapped, encode_frame({"source": wrapped}))
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = artifact
+                self._bytes += artifact.size
+            self._functions[function_id] = key
+            self._evict()
+            return self._entries.get(key, artifact)
+
+    def invalidate(self, function_id: int) -> None:
+        with self._lock:
+            key = self._functions.pop(function_id, None)
+            if key is None:
+                return
+            # Identical code may be shared by other functions; keep the entry if so.
+            if key not in self._functions.values():
+                self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._functions.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def _discard(self, key: str) -> Optional[FunctionArtifact]:
+        artifact = self._entries.pop(key, None)
+        if artifact is not None:
+            self._bytes -= artifact.size
+        return artifact
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key, artifact = self._entries.popitem(last=False)
+            self._bytes -= artifact.size
+            for function_id in [fid for fid, fkey in self._functions.items() if fkey == key]:
+                del self._functions[function_id]
+            logger.debug("Evicted function artifact %s", key[:12])
@@ -0,0 +1,234 @@
+import os
+import math
+import threading
+import logging
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
+from sqlalchemy import select
+from app.core import telemetry
+from app.core.database import SessionLocal
+from app.core.pool import ContainerPool, PoolKey, POOL_DEFAULT_MEMORY_MB
+from app.core.rollups import bucket_start
+from app.models.function import Function, Language, Runtime
+from app.models.rollup import MetricRollup
+
+logger = logging.getLogger(__name__)
+
+AUTOSCALE_ENABLED = os.getenv("AUTOSCALE_ENABLED", "true").lower() == "true"
+AUTOSCALE_INTERVAL = float(os.getenv("AUTOSCALE_INTERVAL", "15"))
+# Weight of the latest complete minute in each function's moving average of its call rate.
+AUTOSCALE_EWMA_ALPHA = float(os.getenv("AUTOSCALE_EWMA_ALPHA", "0.3"))
+# Functions with no calls for this long, and none expected from yesterday's pattern, get no warm workers.
+AUTOSCALE_IDLE_AFTER = float(os.getenv("AUTOSCALE_IDLE_AFTER", "900"))
+# Spare capacity on top of the predicted concurrency.
+AUTOSCALE_HEADROOM = float(os.getenv("AUTOSCALE_HEADROOM", "0.25"))
+# Also expect the rate seen in the same hour yesterday, looking AUTOSCALE_LOOKAHEAD seconds ahead.
+AUTOSCALE_TIME_OF_DAY = os.getenv("AUTOSCALE_TIME_OF_DAY", "true").lower() == "true"
+AUTOSCALE_LOOKAHEAD = float(os.getenv("AUTOSCALE_LOOKAHEAD", "300"))
+AUTOSCALE_HISTORY = int(os.getenv("AUTOSCALE_HISTORY", "50"))
+
+# A partial minute shorter than this is not extrapolated, so one early call is not read as a burst.
+MIN_PARTIAL_SECONDS = 15
+
+FunctionKey = Tuple[int, Runtime]
+
+
+@dataclass
+class Demand:
+    language: Language
+    memory_mb: int
+    ewma: float = 0.0  # Calls per second, over complete minutes
+    current: float = 0.0  # Calls per second so far in the current minute
+    seasonal: float = 0.0  # Calls per second in the same hour yesterday
+    avg_duration: float = 0.0  # Seconds each call holds a worker
+    last_seen: Optional[datetime] = None
+
+    @property
+    def rate(self) -> float:
+        return max(self.ewma, self.current, self.seasonal)
+
+
+def pool_label(key: PoolKey) -> str:
+    language, runtime, memory_mb = key
+    return f"{language.value}/{runtime.value}/{memory_mb}m"
+
+
+class Autoscaler:
+    # Sizes the warm pool from invocation history instead of a fixed POOL_MIN_SIZE. Every
+    # interval it reads the minute rollups (already maintained as metrics are written) to
+    # update each function's call rate, predicts the workers needed per pool key from that
+    # rate and the call duration (Little's law, plus headroom), and hands the targets to the
+    # pool. Pool keys with no calls for AUTOSCALE_IDLE_AFTER scale to zero; until the autoscaler
+    # has been running that long, keys without calls keep the pool's min_size floor.
+
+    def __init__(self, pool: ContainerPool, is_pooled: Callable[[Runtime], bool],
+                 session_factory: Callable = SessionLocal, interval: float = AUTOSCALE_INTERVAL,
+                 alpha: float = AUTOSCALE_EWMA_ALPHA, idle_after: float = AUTOSCALE_IDLE_AFTER,
+                 headroom: float = AUTOSCALE_HEADROOM, time_of_day: bool = AUTOSCALE_TIME_OF_DAY,
+                 lookahead: float = AUTOSCALE_LOOKAHEAD, enabled: bool = AUTOSCALE_ENABLED):
+        self.pool = pool
+        self.is_pooled = is_pooled
+        self.session_factory = session_factory
+        self.interval = interval
+        self.alpha = min(max(alpha, 0.0), 1.0)
+        self.idle_after = idle_after
+        self.headroom = headroom
+        self.time_of_day = time_of_day
+        self.lookahead = lookahead
+        self.enabled = enabled
+        self._demand: Dict[FunctionKey, Demand] = {}
+        self._targets: Dict[PoolKey, int] = {}
+        # Start of the first minute not yet folded into the averages.
+        self._processed_until: Optional[datetime] = None
+        self._first_run: Optional[datetime] = None
+        self._decisions: Deque[Dict[str, Any]] = deque(maxlen=AUTOSCALE_HISTORY)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_run: Optional[datetime] = None
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        self._stopped.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="pool-autoscaler", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 10) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "last_run": self._last_run.isoformat() if self._last_run else None,
+                "functions": len(self._demand),
+                "targets": {pool_label(key): target for key, target in self._targets.items()},
+                "cold_start_ratio": telemetry.cold_start_ratio(),
+                "decisions": list(self._decisions),
+            }
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("Pool autoscaling failed: %s", e)
+            self._stopped.wait(self.interval)
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[PoolKey, int]:
+        now = now or datetime.utcnow()
+        self._first_run = self._first_run or now
+        current_minute = bucket_start(now, "minute")
+        horizon = current_minute - timedelta(seconds=self.idle_after)
+        since = max(self._processed_until or horizon, horizon)
+        db = self.session_factory()
+        try:
+            recent = db.execute(self._rollups("minute").where(MetricRollup.bucket_start >= since)
+                                .order_by(MetricRollup.bucket_start)).all()
+            seasonal = []
+            if self.time_of_day:
+                hour = bucket_start(now + timedelta(seconds=self.lookahead) - timedelta(days=1), "hour")
+                seasonal = db.execute(self._rollups("hour").where(MetricRollup.bucket_start == hour)).all()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._observe(recent, since, current_minute, now)
+            for key, demand in self._demand.items():
+                demand.seasonal = 0.0
+            for row in seasonal:
+                if row.runtime is not None:
+                    self._demand_for(row).seasonal = self._executed(row) / 3600
+            targets = self._plan(now)
+            self._apply(targets, now)
+            self._last_run = now
+        self.pool.scale(targets)
+        return targets
+
+    def _rollups(self, granularity: str):
+        return (select(MetricRollup.function_id, MetricRollup.runtime, MetricRollup.bucket_start, MetricRollup.count,
+                       MetricRollup.cache_hit_count, MetricRollup.time_sum, Function.language, Function.memory_limit)
+                .join(Function, Function.id == MetricRollup.function_id)
+                .where(MetricRollup.granularity == granularity))
+
+    @staticmethod
+    def _executed(row) -> int:
+        # Cache hits are answered without a worker, so they are not demand.
+        return row.count - (row.cache_hit_count or 0)
+
+    def _demand_for(self, row) -> Demand:
+        key = (row.function_id, row.runtime)
+        memory_mb = row.memory_limit or POOL_DEFAULT_MEMORY_MB
+        demand = self._demand.get(key)
+        if demand is None:
+            demand = self._demand[key] = Demand(row.language, memory_mb)
+        # A function's language and memory limit may change; follow its current definition.
+        demand.language, demand.memory_mb = row.language, memory_mb
+        return demand
+
+    def _observe(self, rows: Iterable, since: datetime, current_minute: datetime, now: datetime) -> None:
+        minutes: Dict[datetime, Dict[FunctionKey, int]] = {}
+        for row in rows:
+            if row.runtime is None:
+                continue
+            demand = self._demand_for(row)
+            executed = self._executed(row)
+            if executed > 0:
+                seen = min(row.bucket_start + timedelta(minutes=1), now)
+                demand.last_seen = max(demand.last_seen or seen, seen)
+                demand.avg_duration = row.time_sum / row.count
+            minutes.setdefault(row.bucket_start, {})[(row.function_id, row.runtime)] = executed
+
+        # Fold each complete minute into the averages; a function without calls in it counts as zero.
+        minute = since
+        while minute < current_minute:
+            counts = minutes.get(minute, {})
+            for key, demand in self._demand.items():
+                demand.ewma = self.alpha * counts.get(key, 0) / 60 + (1 - self.alpha) * demand.ewma
+            minute += timedelta(minutes=1)
+        self._processed_until = max(current_minute, since)
+
+        elapsed = max((now - current_minute).total_seconds(), MIN_PARTIAL_SECONDS)
+        current = minutes.get(current_minute, {})
+        for key, demand in self._demand.items():
+            demand.current = current.get(key, 0) / elapsed
+
+    def _plan(self, now: datetime) -> Dict[PoolKey, int]:
+        concurrency: Dict[PoolKey, float] = {}
+        for key, demand in list(self._demand.items()):
+            function_id, runtime = key
+            idle = demand.last_seen is None or (now - demand.last_seen).total_seconds() > self.idle_after
+            if idle and not demand.seasonal:
+                # Forgotten until it is called again, at which point it starts from its new calls.
+                del self._demand[key]
+                continue
+            if not self.is_pooled(runtime):
+                continue
+            # Little's law: workers busy at once = arrival rate x time each call holds a worker.
+            pool_key = (demand.language, runtime, demand.memory_mb)
+            concurrency[pool_key] = concurrency.get(pool_key, 0.0) + demand.rate * demand.avg_duration
+        # Any recent caller keeps at least one worker warm; the rest is predicted load plus headroom.
+        targets = {key: max(1, math.ceil(load * (1 + self.headroom))) for key, load in concurrency.items()}
+        # Not having seen calls only means a pool is idle once a whole idle window has been watched.
+        if (now - self._first_run).total_seconds() >= self.idle_after:
+            for key in self.pool.keys():
+                if self.is_pooled(key[1]):
+                    targets.setdefault(key, 0)
+        return targets
+
+    def _apply(self, targets: Dict[PoolKey, int], now: datetime) -> None:
+        for key in sorted(set(targets) | set(self._targets), key=pool_label):
+            before, after = self._targets.get(key, 0), targets.get(key, 0)
+            if before != after:
+                self._decisions.append({"at": now.isoformat(), "pool": pool_label(key), "from": before, "to": after})
+                logger.info("Autoscaling %s from %d to %d warm workers", pool_label(key), before, after)
+        self._targets = targets
+        telemetry.POOL_TARGET_SLOTS.replace({key: target for key, target in targets.items()})
+        telemetry.PREDICTED_RATE.replace({key: round(demand.rate, 4) for key, demand in self._demand.items()})
@@ -0,0 +1,454 @@
+import os
+import json
+import queue
+import socket
+import struct
+import subprocess
+import threading
+import http.client
+import logging
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_BACKEND = os.getenv("CONTAINER_BACKEND", "auto")
+DOCKER_API_VERSION = os.getenv("DOCKER_API_VERSION", "v1.41")
+DOCKER_API_POOL_SIZE = int(os.getenv("DOCKER_API_POOL_SIZE", "8"))
+DOCKER_API_TIMEOUT = float(os.getenv("DOCKER_API_TIMEOUT", "30"))
+FUNCTION_CPUS = float(os.getenv("FUNCTION_CPUS", "1"))
+FUNCTION_PIDS_LIMIT = int(os.getenv("FUNCTION_PIDS_LIMIT", "64"))
+# Exit status of a container whose main process was SIGKILLed (deadline kill or the OOM killer).
+SIGKILL_EXIT_CODE = 137
+
+DAEMON_ERROR_MARKERS = ("Cannot connect to the Docker daemon", "error during connect", "Is the docker daemon running")
+
+
+class DockerDaemonError(Exception):
+    pass
+
+
+@dataclass
+class ContainerSpec:
+    image: str
+    command: List[str]
+    binds: List[str] = field(default_factory=list)
+    memory_mb: int = 30
+    cpus: float = FUNCTION_CPUS
+    pids_limit: int = FUNCTION_PIDS_LIMIT
+    network_disabled: bool = True
+    runtime: Optional[str] = None
+    # Keep stdin open so the request can be piped in.
+    interactive: bool = False
+
+
+@dataclass
+class ContainerResult:
+    exit_code: int
+    stdout: bytes
+    stderr: str
+    timed_out: bool = False
+    oom_killed: bool = False
+
+
+class ContainerBackend:
+    name = "base"
+
+    def info(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def create(self, spec: ContainerSpec) -> str:
+        raise NotImplementedError
+
+    def start(self, container_id: str) -> None:
+        raise NotImplementedError
+
+    def wait(self, container_id: str, timeout: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+    def logs(self, container_id: str) -> Tuple[bytes, str]:
+        raise NotImplementedError
+
+    def remove(self, container_id: str) -> None:
+        raise NotImplementedError
+
+    def attach(self, container_id: str, timeout: Optional[float] = None) -> Any:
+        raise NotImplementedError
+
+    def communicate(self, stream: Any, stdin: bytes) -> Tuple[bytes, str]:
+        raise NotImplementedError
+
+    def kill(self, container_id: str) -> None:
+        raise NotImplementedError
+
+    def oom_killed(self, container_id: str) -> bool:
+        return False
+
+    def run(self, spec: ContainerSpec, stdin: Optional[bytes] = None, timeout: Optional[float] = None) -> ContainerResult:
+        if stdin is not None:
+            spec.interactive = True
+        container_id = self.create(spec)
+        deadline = Deadline(lambda: self.kill(container_id), timeout)
+        try:
+            if stdin is None:
+                self.start(container_id)
+                deadline.start()
+                exit_code = self.wait(container_id)
+                stdout, stderr = self.logs(container_id)
+            else:
+                # Attach before starting so no output is missed.
+                stream = self.attach(container_id)
+                self.start(container_id)
+                deadline.start()
+                stdout, stderr = self.communicate(stream, stdin)
+                exit_code = self.wait(container_id)
+            deadline.cancel()
+            return ContainerResult(exit_code, stdout, stderr, timed_out=deadline.expired,
+                                   oom_killed=not deadline.expired and self.oom_killed(container_id))
+        finally:
+            deadline.cancel()
+            try:
+                self.remove(container_id)
+            except Exception as e:
+                logger.warning("Failed to remove container %s: %s", container_id, e)
+
+    def close(self) -> None:
+        pass
+
+
+class Deadline:
+    # Kills a container from the host once its wall-clock limit passes, whatever the function is doing.
+
+    def __init__(self, kill: Callable[[], None], timeout: Optional[float]):
+        self._kill = kill
+        self._timer = threading.Timer(timeout, self._fire) if timeout is not None else None
+        self._fired = threading.Event()
+        if self._timer is not None:
+            self._timer.daemon = True
+
+    @property
+    def expired(self) -> bool:
+        return self._fired.is_set()
+
+    def start(self) -> None:
+        if self._timer is not None:
+            self._timer.start()
+
+    def cancel(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _fire(self) -> None:
+        self._fired.set()
+        try:
+            self._kill()
+        except Exception as e:
+            logger.warning("Failed to kill container at its deadline: %s", e)
+
+
+class CLIBackend(ContainerBackend):
+    name = "cli"
+
+    def _docker(self, args: List[str], timeout: Optional[float] = None,
+                stdin: Optional[bytes] = None) -> subprocess.CompletedProcess:
+        try:
+            if stdin is None:
+                result = subprocess.run(['docker'] + args, capture_output=True, text=True, timeout=timeout)
+            else:
+                result = subprocess.run(['docker'] + args, capture_output=True, input=stdin, timeout=timeout)
+                result.stderr = result.stderr.decode(errors="replace")
+        except FileNotFoundError as e:
+            raise DockerDaemonError(str(e))
+        if result.returncode != 0 and any(marker in result.stderr for marker in DAEMON_ERROR_MARKERS):
+            raise DockerDaemonError(result.stderr.strip())
+        return result
+
+    def info(self) -> Dict[str, Any]:
+        result = self._docker(['info', '--format', '{{json .}}'], timeout=DOCKER_API_TIMEOUT)
+        if result.returncode != 0:
+            raise DockerDaemonError(result.stderr.strip() or "docker info failed")
+        return json.loads(result.stdout)
+
+    def _create_args(self, spec: ContainerSpec) -> List[str]:
+        # Swap is capped at the memory limit so the function cannot page its way past it.
+        args = ['--memory', f'{spec.memory_mb}m', '--memory-swap', f'{spec.memory_mb}m',
+                '--cpus', str(spec.cpus), '--pids-limit', str(spec.pids_limit)]
+        if spec.interactive:
+            args.append('-i')
+        if spec.network_disabled:
+            args += ['--network', 'none']
+        if spec.runtime:
+            args.append(f'--runtime={spec.runtime}')
+        for bind in spec.binds:
+            args += ['-v', bind]
+        return args + [spec.image] + spec.command
+
+    def create(self, spec: ContainerSpec) -> str:
+        result = self._docker(['create'] + self._create_args(spec))
+        if result.returncode != 0:
+            raise Exception(f"Container creation failed: {result.stderr}")
+        return result.stdout.strip()
+
+    def start(self, container_id: str) -> None:
+        result = self._docker(['start', container_id])
+        if result.returncode != 0:
+            raise Exception(f"Container start failed: {result.stderr}")
+
+    def wait(self, container_id: str, timeout: Optional[float] = None) -> int:
+        result = self._docker(['wait', container_id], timeout=timeout)
+        if result.returncode != 0:
+            raise Exception(f"Container wait failed: {result.stderr}")
+        return int(result.stdout.strip())
+
+    def logs(self, container_id: str) -> Tuple[bytes, str]:
+        result = self._docker(['logs', container_id])
+        return result.stdout.encode(), result.stderr
+
+    def remove(self, container_id: str) -> None:
+        self._docker(['rm', '-f', container_id])
+
+    def kill(self, container_id: str) -> None:
+        self._docker(['kill', container_id], timeout=DOCKER_API_TIMEOUT)
+
+    def run(self, spec: ContainerSpec, stdin: Optional[bytes] = None, timeout: Optional[float] = None) -> ContainerResult:
+        # A single `docker run` is cheaper than four CLI round trips. It is named so the
+        # deadline can kill the container itself, not just the CLI process attached to it.
+        if stdin is not None:
+            spec.interactive = True
+        name = f"fn-run-{uuid.uuid4().hex[:12]}"
+        deadline = Deadline(lambda: self.kill(name), timeout)
+        deadline.start()
+        try:
+            result = self._docker(['run', '--rm', '--name', name] + self._create_args(spec), stdin=stdin)
+        finally:
+            deadline.cancel()
+        stdout = result.stdout if isinstance(result.stdout, bytes) else result.stdout.encode()
+        # `--rm` discards the container state, so a SIGKILL that was not ours is taken to be the OOM killer.
+        oom_killed = not deadline.expired and result.returncode == SIGKILL_EXIT_CODE
+        return ContainerResult(result.returncode, stdout, result.stderr, timed_out=deadline.expired,
+                               oom_killed=oom_killed)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = DOCKER_API_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class EngineAPIBackend(ContainerBackend):
+    name = "api"
+
+    def __init__(self, socket_path: Optional[str] = None, pool_size: int = DOCKER_API_POOL_SIZE,
+                 api_version: str = DOCKER_API_VERSION):
+        self.socket_path = socket_path or docker_socket_path() or "/var/run/docker.sock"
+        self.api_version = api_version
+        self._connections: "queue.LifoQueue[UnixHTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+
+    def _checkout(self) -> UnixHTTPConnection:
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            return UnixHTTPConnection(self.socket_path)
+
+    def _checkin(self, conn: UnixHTTPConnection) -> None:
+        try:
+            self._connections.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None,
+                 params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = DOCKER_API_TIMEOUT) -> Tuple[int, bytes]:
+        url = f"/{self.api_version}{path}"
+        if params:
+            url += "?" + urlencode(params)
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+
+        # A pooled connection may have been closed by the daemon; retry once on a fresh one.
+        for attempt in range(2):
+            conn = self._checkout() if attempt == 0 else UnixHTTPConnection(self.socket_path)
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conn.close()
+                if attempt == 0:
+                    continue
+                raise DockerDaemonError(f"Docker daemon closed the connection: {str(e)}")
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                conn.close()
+                raise DockerDaemonError(f"Cannot connect to the Docker daemon at {self.socket_path}: {str(e)}")
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(conn)
+            return response.status, data
+
+    def _check(self, status: int, data: bytes, action: str) -> None:
+        if status >= 400:
+            try:
+                message = json.loads(data).get("message", "")
+            except Exception:
+                message = data.decode(errors="replace")
+            raise Exception(f"Container {action} failed ({status}): {message}")
+
+    def info(self) -> Dict[str, Any]:
+        status, data = self._request("GET", "/info")
+        self._check(status, data, "info")
+        return json.loads(data)
+
+    def create(self, spec: ContainerSpec) -> str:
+        host_config: Dict[str, Any] = {
+            "Memory": spec.memory_mb * 1024 * 1024,
+            "MemorySwap": spec.memory_mb * 1024 * 1024,
+            "NanoCpus": int(spec.cpus * 1e9),
+            "PidsLimit": spec.pids_limit,
+            "Binds": spec.binds,
+        }
+        if spec.network_disabled:
+            host_config["NetworkMode"] = "none"
+        if spec.runtime:
+            host_config["Runtime"] = spec.runtime
+        body = {
+            "Image": spec.image,
+            "NetworkDisabled": spec.network_disabled,
+            "HostConfig": host_config,
+        }
+        if spec.command:
+            body["Cmd"] = spec.command
+        if spec.interactive:
+            body.update({"OpenStdin": True, "StdinOnce": True, "AttachStdin": True,
+                         "AttachStdout": True, "AttachStderr": True})
+        status, data = self._request("POST", "/containers/create", body=body)
+        self._check(status, data, "creation")
+        return json.loads(data)["Id"]
+
+    def start(self, container_id: str) -> None:
+        status, data = self._request("POST", f"/containers/{container_id}/start")
+        self._check(status, data, "start")
+
+    def wait(self, container_id: str, timeout: Optional[float] = None) -> int:
+        status, data = self._request("POST", f"/containers/{container_id}/wait", timeout=timeout)
+        self._check(status, data, "wait")
+        return int(json.loads(data)["StatusCode"])
+
+    def logs(self, container_id: str) -> Tuple[bytes, str]:
+        status, data = self._request("GET", f"/containers/{container_id}/logs", params={"stdout": 1, "stderr": 1})
+        self._check(status, data, "logs")
+        return demux_logs(data)
+
+    def attach(self, container_id: str, timeout: Optional[float] = None) -> socket.socket:
+        # The attach endpoint hijacks the connection, so it gets its own socket
+        # rather than one from the keep-alive pool.
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            sock.close()
+            raise DockerDaemonError(f"Cannot connect to the Docker daemon at {self.socket_path}: {str(e)}")
+        query = urlencode({"stream": 1, "stdin": 1, "stdout": 1, "stderr": 1})
+        sock.sendall(
+            f"POST /{self.api_version}/containers/{container_id}/attach?{query} HTTP/1.1\r\n"
+            "Host: localhost\r\nConnection: Upgrade\r\nUpgrade: tcp\r\nContent-Length: 0\r\n\r\n".encode()
+        )
+        response = b""
+        while b"\r\n\r\n" not in response:
+            chunk = sock.recv(4096)
+            if not chunk:
+                sock.close()
+                raise Exception("Container attach failed: connection closed")
+            response += chunk
+        head, _, rest = response.partition(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        if status not in (101, 200):
+            sock.close()
+            raise Exception(f"Container attach failed ({status})")
+        return AttachedStream(sock, rest)
+
+    def communicate(self, stream: "AttachedStream", stdin: bytes) -> Tuple[bytes, str]:
+        try:
+            stream.sock.sendall(stdin)
+            # Half-close so the container sees EOF on stdin.
+            stream.sock.shutdown(socket.SHUT_WR)
+            data = stream.buffered
+            while True:
+                chunk = stream.sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+            return demux_logs(data)
+        finally:
+            stream.sock.close()
+
+    def kill(self, container_id: str) -> None:
+        status, data = self._request("POST", f"/containers/{container_id}/kill")
+        # 409: the container already stopped on its own.
+        if status not in (404, 409):
+            self._check(status, data, "kill")
+
+    def oom_killed(self, container_id: str) -> bool:
+        status, data = self._request("GET", f"/containers/{container_id}/json")
+        if status >= 400:
+            return False
+        return bool(json.loads(data).get("State", {}).get("OOMKilled"))
+
+    def remove(self, container_id: str) -> None:
+        status, data = self._request("DELETE", f"/containers/{container_id}", params={"force": 1})
+        if status != 404:
+            self._check(status, data, "removal")
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+@dataclass
+class AttachedStream:
+    sock: socket.socket
+    buffered: bytes
+
+
+def demux_logs(data: bytes) -> Tuple[bytes, str]:
+    # Non-TTY log streams are framed as [stream, 0, 0, 0, size (4 bytes big-endian)] + payload.
+    stdout, stderr = [], []
+    offset = 0
+    while offset + 8 <= len(data):
+        stream, size = struct.unpack(">BxxxL", data[offset:offset + 8])
+        chunk = data[offset + 8:offset + 8 + size]
+        (stderr if stream == 2 else stdout).append(chunk)
+        offset += 8 + size
+    return b"".join(stdout), b"".join(stderr).decode(errors="replace")
+
+
+def docker_socket_path() -> Optional[str]:
+    docker_host = os.getenv("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://"):]
+    if not docker_host and hasattr(socket, "AF_UNIX") and os.path.exists("/var/run/docker.sock"):
+        return "/var/run/docker.sock"
+    return None
+
+
+def get_backend(name: str = CONTAINER_BACKEND) -> ContainerBackend:
+    if name == "api" or (name == "auto" and docker_socket_path()):
+        return EngineAPIBackend()
+    return CLIBackend()
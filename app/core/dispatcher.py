@@ -0,0 +1,402 @@
+import os
+import json
+import bisect
+import hashlib
+import hmac
+import queue
+import socket
+import threading
+import http.client
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+from app.core import telemetry
+from app.core.database import SessionLocal
+from app.core.health import DockerUnavailableError
+from app.models.agent import WorkerAgent
+from app.models.function import Language, Runtime
+from app.schemas.agent import AgentHeartbeat
+
+logger = logging.getLogger(__name__)
+
+# "local" runs invocations in the API process's own engine; "agents" sends them to worker agents.
+DISPATCH_MODE = os.getenv("DISPATCH_MODE", "local")
+# "hash" keeps each function on the same agent (consistent hashing on the function id) so its warm
+# workers and caches are reused; "least_loaded" picks the agent with the most spare capacity.
+DISPATCH_PLACEMENT = os.getenv("DISPATCH_PLACEMENT", "hash")
+# Further agents tried after the first one fails, is draining or is full.
+DISPATCH_RETRIES = int(os.getenv("DISPATCH_RETRIES", "2"))
+DISPATCH_REFRESH_INTERVAL = float(os.getenv("DISPATCH_REFRESH_INTERVAL", "2"))
+# Points per agent on the hash ring; more points spread functions more evenly.
+DISPATCH_HASH_REPLICAS = int(os.getenv("DISPATCH_HASH_REPLICAS", "64"))
+DISPATCH_CONNECT_TIMEOUT = float(os.getenv("DISPATCH_CONNECT_TIMEOUT", "2"))
+# Added to the function timeout for the whole round trip, covering agent queueing and worker start-up.
+DISPATCH_TIMEOUT_GRACE = float(os.getenv("DISPATCH_TIMEOUT_GRACE", "15"))
+DISPATCH_POOL_SIZE = int(os.getenv("DISPATCH_POOL_SIZE", "16"))
+# An agent that has not sent a heartbeat for this long is no longer dispatched to.
+AGENT_HEARTBEAT_TIMEOUT = float(os.getenv("AGENT_HEARTBEAT_TIMEOUT", "15"))
+# Shared secret between the API and its agents, sent in the AGENT_TOKEN_HEADER header on every call
+# either way. Without it the API registers no agents and agents run nothing.
+AGENT_TOKEN = os.getenv("AGENT_TOKEN", "")
+AGENT_TOKEN_HEADER = "X-Agent-Token"
+
+DEFAULT_TIMEOUT = 30
+
+
+class AgentUnavailableError(DockerUnavailableError):
+    # A DockerUnavailableError so the API answers 503, as it does when the local daemon is down.
+    pass
+
+
+class AgentBusyError(Exception):
+    pass
+
+
+class AgentFailedError(Exception):
+    pass
+
+
+def agent_token_valid(token: Optional[str], expected: str = AGENT_TOKEN) -> bool:
+    return bool(expected) and token is not None and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def is_live(agent: WorkerAgent, now: Optional[datetime] = None, timeout: float = AGENT_HEARTBEAT_TIMEOUT) -> bool:
+    now = now or datetime.utcnow()
+    return agent.last_heartbeat is not None and now - agent.last_heartbeat <= timedelta(seconds=timeout)
+
+
+def whole_seconds(value: Optional[datetime]) -> Optional[datetime]:
+    # MySQL DATETIME columns drop fractional seconds, so times that are stored and later compared
+    # are kept at whole seconds on every database.
+    return value.replace(microsecond=0) if value is not None else None
+
+
+def record_heartbeat(db, heartbeat: AgentHeartbeat) -> WorkerAgent:
+    agent = db.query(WorkerAgent).filter(WorkerAgent.id == heartbeat.id).first()
+    if agent is None:
+        agent = WorkerAgent(id=heartbeat.id)
+        db.add(agent)
+    # A drain requested through the API holds until the agent restarts (a new started_at).
+    started_at = whole_seconds(heartbeat.started_at)
+    drained = agent.draining and whole_seconds(agent.started_at) == started_at
+    agent.url = heartbeat.url
+    agent.capacity = heartbeat.capacity
+    agent.in_flight = heartbeat.in_flight
+    agent.draining = bool(drained or heartbeat.draining)
+    agent.runtimes = [runtime.value for runtime in heartbeat.runtimes]
+    agent.started_at = started_at
+    agent.last_heartbeat = whole_seconds(datetime.utcnow())
+    db.commit()
+    db.refresh(agent)
+    return agent
+
+
+@dataclass
+class AgentView:
+    id: str
+    url: str
+    capacity: int
+    in_flight: int
+    draining: bool
+    runtimes: Set[str] = field(default_factory=set)
+    last_heartbeat: Optional[datetime] = None
+
+
+class AgentClient:
+    # Keep-alive HTTP connections to one agent, pooled like the Docker API backend's.
+
+    def __init__(self, url: str, pool_size: int = DISPATCH_POOL_SIZE,
+                 connect_timeout: float = DISPATCH_CONNECT_TIMEOUT, token: str = AGENT_TOKEN):
+        parts = urlsplit(url)
+        self.url = url
+        self.token = token
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 80
+        self.connect_timeout = connect_timeout
+        self._connections: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+
+    def _checkout(self) -> http.client.HTTPConnection:
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _checkin(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._connections.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None,
+                timeout: Optional[float] = None) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        headers[AGENT_TOKEN_HEADER] = self.token
+
+        # A pooled connection may have been closed by the agent; retry once on a fresh one.
+        for attempt in range(2):
+            conn = self._checkout() if attempt == 0 else self._connect()
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                conn.sock.settimeout(timeout)
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conn.close()
+                if attempt == 0:
+                    continue
+                raise AgentFailedError(f"Agent at {self.url} closed the connection: {str(e)}")
+            except (socket.timeout, OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise AgentFailedError(f"Cannot reach agent at {self.url}: {str(e) or type(e).__name__}")
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(conn)
+            return response.status, data
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class Dispatcher:
+    # Routes invocations from the API to worker agents (app/agent.py). Agents register and report
+    # their capacity through heartbeats stored in the worker_agents table; the dispatcher reloads
+    # that table every DISPATCH_REFRESH_INTERVAL, skips agents that are draining or have missed
+    # their heartbeats, and places each call by consistent hash of the function id (falling
+    # through to the next agent on the ring when the home agent is full) or by least load. A call
+    # whose agent cannot be reached, is draining or is full is retried on the next candidate.
+    #
+    # Retries are at-least-once: an agent that dies mid-call may already have run the function.
+
+    def __init__(self, session_factory: Callable = SessionLocal, placement: str = DISPATCH_PLACEMENT,
+                 retries: int = DISPATCH_RETRIES, refresh_interval: float = DISPATCH_REFRESH_INTERVAL,
+                 heartbeat_timeout: float = AGENT_HEARTBEAT_TIMEOUT, replicas: int = DISPATCH_HASH_REPLICAS,
+                 timeout_grace: float = DISPATCH_TIMEOUT_GRACE):
+        self.session_factory = session_factory
+        self.placement = placement
+        self.retries = retries
+        self.refresh_interval = refresh_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.replicas = replicas
+        self.timeout_grace = timeout_grace
+        self._agents: Dict[str, AgentView] = {}
+        self._ring: List[Tuple[int, str]] = []
+        self._clients: Dict[str, AgentClient] = {}
+        # Calls this process has in flight per agent; the heartbeat count lags behind it.
+        self._dispatched: Dict[str, int] = {}
+        # Agents that failed a call are skipped until they send a newer heartbeat.
+        self._failed_at: Dict[str, datetime] = {}
+        self._counts = {"dispatched": 0, "retried": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_refresh: Optional[datetime] = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error("Loading worker agents failed: %s", e)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="agent-dispatcher", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 10) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            agents = {
+                agent.id: {
+                    "url": agent.url,
+                    "capacity": agent.capacity,
+                    "in_flight": agent.in_flight,
+                    "dispatched": self._dispatched.get(agent.id, 0),
+                    "draining": agent.draining,
+                    "available": self._available(agent),
+                    "runtimes": sorted(agent.runtimes),
+                }
+                for agent in self._agents.values()
+            }
+            return {
+                "placement": self.placement,
+                "last_refresh": self._last_refresh.isoformat() if self._last_refresh else None,
+                "live_agents": sum(1 for agent in agents.values() if agent["available"]),
+                "agents": agents,
+                **self._counts,
+            }
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Refreshing worker agents failed: %s", e)
+
+    def refresh(self) -> None:
+        db = self.session_factory()
+        try:
+            rows = db.query(WorkerAgent).all()
+            now = datetime.utcnow()
+            agents = {
+                row.id: AgentView(row.id, row.url, row.capacity, row.in_flight, row.draining,
+                                  set(row.runtimes or []), row.last_heartbeat)
+                for row in rows if is_live(row, now, self.heartbeat_timeout)
+            }
+        finally:
+            db.close()
+
+        with self._lock:
+            if set(agents) != set(self._agents):
+                self._ring = sorted((self._hash(f"{agent_id}#{i}"), agent_id)
+                                    for agent_id in agents for i in range(self.replicas))
+            for agent_id in set(self._clients) - set(agents):
+                self._clients.pop(agent_id).close()
+            for agent in agents.values():
+                client = self._clients.get(agent.id)
+                if client is not None and client.url != agent.url:
+                    # Restarted on another address.
+                    self._clients.pop(agent.id).close()
+            self._agents = agents
+            self._last_refresh = now
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def _available(self, agent: AgentView) -> bool:
+        failed_at = self._failed_at.get(agent.id)
+        return not agent.draining and (failed_at is None or agent.last_heartbeat > failed_at)
+
+    def _load(self, agent: AgentView) -> int:
+        return max(agent.in_flight, self._dispatched.get(agent.id, 0))
+
+    def ensure_available(self, runtime: Runtime) -> None:
+        with self._lock:
+            if not any(self._available(agent) and runtime.value in agent.runtimes for agent in self._agents.values()):
+                raise AgentUnavailableError(f"No worker agent is available for the {runtime.value} runtime")
+
+    def candidates(self, function_id: int, runtime: Runtime) -> List[AgentView]:
+        # Agents to try, in order of preference.
+        with self._lock:
+            eligible = {agent.id: agent for agent in self._agents.values()
+                        if self._available(agent) and runtime.value in agent.runtimes}
+            if self.placement == "least_loaded":
+                return sorted(eligible.values(), key=lambda agent: (self._load(agent) / max(agent.capacity, 1),
+                                                                    self._dispatched.get(agent.id, 0)))
+            # Walk the ring clockwise from the function's hash, taking each agent once.
+            ordered: List[AgentView] = []
+            start = bisect.bisect(self._ring, (self._hash(str(function_id)), ""))
+            for i in range(len(self._ring)):
+                agent = eligible.pop(self._ring[(start + i) % len(self._ring)][1], None)
+                if agent is not None:
+                    ordered.append(agent)
+                    if not eligible:
+                        break
+            # Bounded load: a full home agent hands the call to the next one on the ring instead.
+            spare = [agent for agent in ordered if self._load(agent) < agent.capacity]
+            return spare + [agent for agent in ordered if agent not in spare]
+
+    def _client(self, agent: AgentView) -> AgentClient:
+        with self._lock:
+            client = self._clients.get(agent.id)
+            if client is None:
+                client = self._clients[agent.id] = AgentClient(agent.url)
+            return client
+
+    def _mark_failed(self, agent: AgentView) -> None:
+        with self._lock:
+            # A heartbeat in the same second as the failure is not taken as proof of recovery.
+            self._failed_at[agent.id] = whole_seconds(datetime.utcnow())
+            self._counts["failed"] += 1
+
+    def execute(self, function_id: int, code: str, language: Language, input_data: Any, runtime: Runtime,
+                timeout: int, memory_limit: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        timeout = timeout or DEFAULT_TIMEOUT
+        body = {
+            "function_id": function_id,
+            "code": code,
+            "language": language.value,
+            "runtime": runtime.value,
+            "timeout": timeout,
+            "memory_limit": memory_limit,
+            "input": input_data,
+        }
+        errors = []
+        for attempt, agent in enumerate(self.candidates(function_id, runtime)[:1 + self.retries]):
+            if attempt:
+                with self._lock:
+                    self._counts["retried"] += 1
+            try:
+                return self._send(agent, body, language, runtime, timeout)
+            except AgentBusyError as e:
+                telemetry.AGENT_DISPATCHES.inc(agent=agent.id, outcome="busy")
+                errors.append(str(e))
+            except AgentFailedError as e:
+                logger.warning("Worker agent %s failed: %s", agent.id, e)
+                telemetry.AGENT_DISPATCHES.inc(agent=agent.id, outcome="failed")
+                self._mark_failed(agent)
+                errors.append(str(e))
+        detail = "; ".join(errors) or "none is registered"
+        raise AgentUnavailableError(f"No worker agent could run the function for the {runtime.value} runtime: {detail}")
+
+    def _send(self, agent: AgentView, body: Dict[str, Any], language: Language, runtime: Runtime,
+              timeout: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        client = self._client(agent)
+        with self._lock:
+            self._dispatched[agent.id] = self._dispatched.get(agent.id, 0) + 1
+            self._counts["dispatched"] += 1
+        start_clock = time.perf_counter()
+        try:
+            status, data = client.request("POST", "/execute", body, timeout=timeout + self.timeout_grace)
+        finally:
+            with self._lock:
+                self._dispatched[agent.id] -= 1
+        elapsed = time.perf_counter() - start_clock
+
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            payload = {"detail": data.decode(errors="replace")}
+        if status == 503:
+            # Draining, full, or its runtime is down; another agent may still take the call.
+            if payload.get("draining"):
+                with self._lock:
+                    agent.draining = True
+            raise AgentBusyError(f"Agent {agent.id}: {payload.get('detail')}")
+        if status in (401, 403):
+            # The agent does not share this API's AGENT_TOKEN; it cannot take any call.
+            raise AgentFailedError(f"Agent {agent.id} rejected the call ({status}): {payload.get('detail')}")
+        if status >= 500:
+            raise AgentFailedError(f"Agent {agent.id} returned {status}: {payload.get('detail')}")
+        if status >= 400:
+            raise Exception(f"Failed to execute function: {payload.get('detail')}")
+
+        telemetry.AGENT_DISPATCHES.inc(agent=agent.id, outcome="ok")
+        output, metrics = payload["result"], payload["metrics"]
+        function_id = body["function_id"]
+        telemetry.observe_phase("dispatch", max(elapsed - metrics["execution_time"], 0.0), function_id, language, runtime)
+        telemetry.observe_execution(function_id, language, runtime, metrics)
+        metrics["agent"] = agent.id
+        return output, metrics
@@ -1,153 +1,365 @@
 import os
-import json
-import tempfile
-import subprocess
 import logging
 import time
-import psutil
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Iterator, Optional, Tuple
 from app.models.function import Language, Runtime
+from app.core.pool import (ContainerPool, ExecutionTimeoutError, OutOfMemoryError, PoolExhaustedError, PoolKey,
+                           WarmContainer, POOL_DEFAULT_MEMORY_MB, POOL_ENABLED, MAX_OUTPUT_BYTES)
+from app.core.health import CircuitState, DockerHealthMonitor
+from app.core.dispatcher import Dispatcher
+from app.core.backends import ContainerBackend, ContainerResult, ContainerSpec, DockerDaemonError, get_backend
+from app.core.sandbox import ALLOW_LOCAL_RUNTIMES, LOCAL_RUNTIMES, SubprocessBackend
+from app.core.protocol import decode_frames, encode_frame, is_usage_frame
+from app.core.artifacts import ArtifactStore
+from app.core.result_cache import ResultCache
+from app.core import telemetry
+from app.models.metrics import RESOURCE_COUNTERS
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_TIMEOUT = 30
+DEFAULT_MEMORY_MB = POOL_DEFAULT_MEMORY_MB
+# Per-call containers also pay for container start-up before the function's alarm is armed.
+CONTAINER_TIMEOUT_GRACE = float(os.getenv("CONTAINER_TIMEOUT_GRACE", "10"))
+
+
+class ErrorType:
+    ERROR = "error"
+    TIMEOUT = "timeout"
+    OOM = "oom"
+
+
 class FunctionExecutionEngine:
-    def __init__(self):
-        self.temp_dir = os.path.join(os.getcwd(), "temp")
-        os.makedirs(self.temp_dir, exist_ok=True)
+    def __init__(self, use_pool: bool = POOL_ENABLED, backend: Optional[ContainerBackend] = None,
+                 dispatcher: Optional[Dispatcher] = None):
+        self.backend = backend or get_backend()
+        # Per-call runs go through the backend of their runtime; Docker and gVisor share the daemon's.
+        self.backends: Dict[Runtime, ContainerBackend] = {Runtime.SUBPROCESS: SubprocessBackend()}
+        # The process runtime is a persistent worker by definition, so it is pooled even with pooling off.
+        self.use_pool = use_pool
+        self.pool = ContainerPool()
+        self.health = DockerHealthMonitor(self.backend)
+        # Wrapped sources keyed by a hash of the code, so hot functions skip templating.
+        self.artifacts = ArtifactStore(self._wrap_code)
+        # Memoized outputs of functions marked cacheable.
+        self.results = ResultCache()
+        # When set, invocations run on worker agents instead of this process's containers.
+        self.dispatcher = dispatcher
+
+    def start(self) -> None:
+        if self.dispatcher is not None:
+            # The containers live on the agents; nothing local to check or prewarm.
+            self.dispatcher.start()
+            return
+        self.health.start()
+        runtimes = [Runtime.PROCESS] if ALLOW_LOCAL_RUNTIMES else []
+        if self.use_pool:
+            runtimes.append(Runtime.DOCKER)
+            if self.health.gvisor_available:
+                runtimes.append(Runtime.GVISOR)
+        self.pool.start(
+            [(language, runtime, POOL_DEFAULT_MEMORY_MB) for language in Language for runtime in runtimes],
+            can_prewarm=self.can_prewarm
+        )
+
+    def shutdown(self) -> None:
+        if self.dispatcher is not None:
+            self.dispatcher.shutdown()
+        self.health.shutdown()
+        self.pool.shutdown()
+        self.backend.close()
+        for backend in self.backends.values():
+            backend.close()
+
+    def is_pooled(self, runtime: Runtime) -> bool:
+        return self.use_pool or runtime == Runtime.PROCESS
+
+    def ensure_available(self, runtime: Runtime) -> None:
+        # Raises DockerUnavailableError when no container (or agent) can run the runtime right now.
+        if self.dispatcher is not None:
+            self.dispatcher.ensure_available(runtime)
+        else:
+            self.health.ensure_available(runtime)
+
+    def can_prewarm(self, key: PoolKey) -> bool:
+        runtime = key[1]
+        if runtime in LOCAL_RUNTIMES:
+            return ALLOW_LOCAL_RUNTIMES
+        if self.health.state == CircuitState.OPEN:
+            return False
+        return runtime != Runtime.GVISOR or self.health.gvisor_available
 
     def _wrap_code(self, code: str, language: Language) -> str:
+        # The wrapped source is sent as the first stdin frame and run by the image's
+        # run.py / run.js, which provide read_frame/write_frame for the input and result
+        # and TIMEOUT from the limits frame that follows the source. The modules handlers may use
+        # without importing them (json, sys, signal, time) come from the image's prelude.py /
+        # prelude.js, which warm workers use too.
         if language == Language.PYTHON:
             indented_code = '\n'.join('    ' + line for line in code.split('\n'))
-            return f'''import json
-import sys
-import signal
-import time
-
-def handler(input_data):
+            return f'''def handler(input_data):
 {indented_code}
 
 def timeout_handler(signum, frame):
     raise TimeoutError("Function execution timed out")
 
 signal.signal(signal.SIGALRM, timeout_handler)
-signal.alarm(30)
+signal.alarm(TIMEOUT)
 
 try:
-    with open('/app/input.json', 'r') as f:
-        data = json.load(f)
-        # Handle both direct input and nested input structure
-        input_data = data.get("input", data)
+    data = read_frame()
+    # Handle both direct input and nested input structure
+    input_data = data.get("input", data) if isinstance(data, dict) else data
 
     result = handler(input_data)
 
     if not isinstance(result, (dict, list, str, int, float, bool, type(None))):
         result = str(result)
 
-    with open('/app/output.json', 'w') as f:
-        json.dump({{"output": result}}, f)
+    write_frame({{"output": result}})
+except TimeoutError as e:
+    write_frame({{"error": str(e), "error_type": "timeout"}})
+except MemoryError:
+    write_frame({{"error": "Function exceeded its memory limit", "error_type": "oom"}})
 except Exception as e:
-    with open('/app/output.json', 'w') as f:
-        json.dump({{"error": str(e)}}, f)
+    write_frame({{"error": str(e)}})
 '''
         else:
             indented_code = '\n'.join('    ' + line for line in code.split('\n'))
-            return f'''const fs = require('fs');
-
-function handler(input_data) {{
+            return f'''function handler(input_data) {{
 {indented_code}
 }}
 
-module.exports = {{ handler }};
-
-const data = JSON.parse(fs.readFileSync('/app/input.json', 'utf8'));
+const data = readFrame();
 // Handle both direct input and nested input structure
-const inputData = data.input || data;
+const inputData = (data && data.input) || data;
 
 try {{
     const result = handler(inputData);
     const output = typeof result === 'object' ? result : {{ output: result }};
-    fs.writeFileSync('/app/output.json', JSON.stringify(output));
+    writeFrame(output);
 }} catch (error) {{
-    fs.writeFileSync('/app/output.json', JSON.stringify({{ error: error.message }}));
+    writeFrame({{ error: error.message }});
 }}
 '''
 
-    def execute(self, function_id: int, code: str, language: Language, input_data: Dict[str, Any], runtime: Runtime = Runtime.DOCKER) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def cached(self, function_id: int, code: str, language: Language,
+               input_data: Any) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        # A memoized result with hit metrics, or None. Cheap enough to call before scheduling.
+        start_clock = time.perf_counter()
+        output = self.results.get(function_id, code, language, input_data)
+        if output is None:
+            return None
+        return output, {
+            "execution_time": round(time.perf_counter() - start_clock, 4),
+            "memory_used": None,
+            "error": None,
+            "error_type": None,
+            "cache_hit": True,
+        }
+
+    def execute(self, function_id: int, code: str, language: Language, input_data: Dict[str, Any], runtime: Runtime = Runtime.DOCKER,
+                timeout: int = DEFAULT_TIMEOUT, memory_limit: int = DEFAULT_MEMORY_MB,
+                cacheable: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        # Callers look up memoized results with cached() first, before taking a scheduler slot;
+        # cacheable only controls whether this run's result is stored.
+        if self.dispatcher is not None:
+            output, metrics = self.dispatcher.execute(function_id, code, language, input_data, runtime, timeout,
+                                                      memory_limit)
+        else:
+            output, metrics = self._execute(function_id, code, language, input_data, runtime, timeout, memory_limit)
+        # Only successful results are memoized; a failure may be transient (timeout, OOM, daemon).
+        if cacheable and metrics["error"] is None:
+            self.results.put(function_id, code, language, input_data, output)
+        return output, metrics
+
+    def _execute(self, function_id: int, code: str, language: Language, input_data: Dict[str, Any], runtime: Runtime,
+                 timeout: int, memory_limit: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        self.health.ensure_available(runtime)
+        timeout, memory_limit = timeout or DEFAULT_TIMEOUT, memory_limit or DEFAULT_MEMORY_MB
+        artifact = self.artifacts.get(function_id, code, language, runtime)
+        if self.is_pooled(runtime):
+            output, metrics = self._execute_warm(artifact.key, code, language, input_data, runtime, timeout, memory_limit)
+            telemetry.observe_execution(function_id, language, runtime, metrics)
+            return output, metrics
         try:
-            with tempfile.NamedTemporaryFile(mode='w', suffix=f'.{language}', delete=False) as function_file, \
-                 tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as input_file, \
-                 tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as output_file:
+            # Source, limits and input go in over stdin and the result comes back on stdout,
+            # so nothing is written to or mounted from the host filesystem.
+            request = artifact.source_frame + encode_frame({"timeout": timeout}) + encode_frame(input_data)
+
+            # Durations use the monotonic clock; wall time is only kept to line phases up with
+            # the timestamps the container reports.
+            requested_at, start_clock = time.time(), time.perf_counter()
+            telemetry.observe_start(language, runtime, cold=True)
+            result = self._run_container(request, language, runtime, timeout, memory_limit)
+            elapsed, finished_at = time.perf_counter() - start_clock, time.time()
 
-                json.dump(input_data, input_file)
-                input_file.flush()
+            usage = None
+            if result.timed_out:
+                output, error_type = {"error": f"Function execution timed out after {timeout}s"}, ErrorType.TIMEOUT
+            elif result.oom_killed:
+                output, error_type = {"error": f"Function exceeded its {memory_limit}MB memory limit"}, ErrorType.OOM
+            else:
+                frames = decode_frames(result.stdout, MAX_OUTPUT_BYTES)
+                usage = next((frame["usage"] for frame in frames if is_usage_frame(frame)), None)
+                frames = [frame for frame in frames if not is_usage_frame(frame)]
+                if not frames:
+                    raise Exception("Container produced no output")
+                output, error_type = frames[-1], None
 
-                wrapped_code = self._wrap_code(code, language)
-                function_file.write(wrapped_code)
-                function_file.flush()
+            metrics = self._metrics(elapsed, output, error_type, usage, requested_at, finished_at)
+            telemetry.observe_execution(function_id, language, runtime, metrics)
+            return output, metrics
 
-                start_time = time.time()
-                self._run_container(function_file.name, input_file.name, output_file.name, language, runtime)
-                end_time = time.time()
+        except Exception as e:
+            raise Exception(f"Failed to execute function: {str(e)}")
 
-                with open(output_file.name, 'r') as f:
-                    output = json.load(f)
+    def _acquire(self, language: Language, runtime: Runtime, memory_limit: int, code_key: str) -> WarmContainer:
+        try:
+            return self.pool.acquire(language, runtime, memory_limit, code_key=code_key)
+        except PoolExhaustedError as e:
+            raise Exception(f"Failed to execute function: {str(e)}")
+        except Exception as e:
+            self._record_health(runtime, ok=False)
+            raise Exception(f"Failed to execute function: {str(e)}")
 
-                try:
-                    os.unlink(function_file.name)
-                    os.unlink(input_file.name)
-                    os.unlink(output_file.name)
-                except:
-                    pass
+    def _execute_warm(self, key: str, code: str, language: Language, input_data: Dict[str, Any], runtime: Runtime,
+                      timeout: int, memory_limit: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        requested_at = time.time()
+        container = self._acquire(language, runtime, memory_limit, key)
 
-                execution_time = round(end_time - start_time, 4)
+        failed = True
+        error_type = None
+        usage = None
+        start_clock = time.perf_counter()
+        try:
+            output, usage = container.invoke(key, code, input_data, timeout=timeout)
+            failed = False
+            self._record_health(runtime, ok=True)
+        except ExecutionTimeoutError as e:
+            # The worker is killed and recycled; the limit breach is the function's result.
+            output, error_type = {"error": str(e)}, ErrorType.TIMEOUT
+        except OutOfMemoryError as e:
+            output, error_type = {"error": str(e)}, ErrorType.OOM
+        except Exception as e:
+            raise Exception(f"Failed to execute function: {str(e)}")
+        finally:
+            elapsed, finished_at = time.perf_counter() - start_clock, time.time()
+            self.pool.release(container, failed=failed, code_key=key)
 
-                memory_used = self._get_container_memory_usage()
+        return output, self._metrics(elapsed, output, error_type, usage, requested_at, finished_at)
 
-                metrics = {
-                    "execution_time": execution_time,
-                    "memory_used": memory_used,
-                    "error": output.get("error")
-                }
+    def execute_stream(self, function_id: int, code: str, language: Language, input_data: Dict[str, Any], runtime: Runtime = Runtime.DOCKER,
+                       timeout: int = DEFAULT_TIMEOUT, memory_limit: int = DEFAULT_MEMORY_MB) -> Iterator[Dict[str, Any]]:
+        if self.dispatcher is not None:
+            # Agents answer with the final result only.
+            output, metrics = self.dispatcher.execute(function_id, code, language, input_data, runtime, timeout,
+                                                      memory_limit)
+            yield {"result": output, "metrics": metrics}
+            return
+        self.health.ensure_available(runtime)
+        timeout, memory_limit = timeout or DEFAULT_TIMEOUT, memory_limit or DEFAULT_MEMORY_MB
+        if not self.is_pooled(runtime):
+            # Per-call containers can only hand back the final result.
+            output, metrics = self._execute(function_id, code, language, input_data, runtime, timeout, memory_limit)
+            yield {"result": output, "metrics": metrics}
+            return
 
-                return output, metrics
+        key = self.artifacts.get(function_id, code, language, runtime).key
+        requested_at = time.time()
+        container = self._acquire(language, runtime, memory_limit, key)
 
+        # Stays True if the consumer stops early, so a container still writing output is recycled.
+        failed = True
+        output: Dict[str, Any] = {}
+        error_type = None
+        usage = None
+        start_clock = time.perf_counter()
+        try:
+            for message in container.invoke_stream(key, code, input_data, timeout=timeout):
+                if "chunk" in message:
+                    yield {"chunk": message["chunk"]}
+                elif is_usage_frame(message):
+                    usage = message["usage"]
+                else:
+                    output = message
+            failed = False
+            self._record_health(runtime, ok=True)
+        except ExecutionTimeoutError as e:
+            output, error_type = {"error": str(e)}, ErrorType.TIMEOUT
+        except OutOfMemoryError as e:
+            output, error_type = {"error": str(e)}, ErrorType.OOM
         except Exception as e:
             raise Exception(f"Failed to execute function: {str(e)}")
+        finally:
+            elapsed, finished_at = time.perf_counter() - start_clock, time.time()
+            self.pool.release(container, failed=failed, code_key=key)
+
+        metrics = self._metrics(elapsed, output, error_type, usage, requested_at, finished_at)
+        telemetry.observe_execution(function_id, language, runtime, metrics)
+        yield {"result": output, "metrics": metrics}
+
+    def _metrics(self, elapsed: float, output: Any, error_type: Optional[str] = None, usage: Optional[Dict[str, Any]] = None,
+                 requested_at: Optional[float] = None, finished_at: Optional[float] = None) -> Dict[str, Any]:
+        error = output.get("error") if isinstance(output, dict) else None
+        if error is not None and error_type is None:
+            error_type = output.get("error_type") or ErrorType.ERROR
+        metrics = {
+            "execution_time": round(elapsed, 4),
+            "memory_used": None,
+            "error": error,
+            "error_type": error_type,
+        }
+        if usage and requested_at is not None and finished_at is not None:
+            metrics.update(self._resource_metrics(usage, requested_at, finished_at))
+        return metrics
 
-    def _run_container(self, function_file: str, input_file: str, output_file: str, language: Language, runtime: Runtime) -> None:
+    def _resource_metrics(self, usage: Dict[str, Any], requested_at: float, finished_at: float) -> Dict[str, Any]:
+        # The container reports when user code started and how long it ran; everything before
+        # that is start-up (container or worker acquisition) and everything after is teardown.
+        code_started_at = usage.get("code_started_at", requested_at)
+        code_time = max(usage.get("code_time", 0.0), 0.0)
+        startup_time = min(max(code_started_at - requested_at, 0.0), finished_at - requested_at)
+        metrics = {
+            "memory_used": round(usage.get("peak_memory_bytes", 0) / (1024 * 1024), 2),  # Peak, in MB
+            "startup_time": round(startup_time, 4),
+            "code_time": round(code_time, 4),
+            "teardown_time": round(max(finished_at - requested_at - startup_time - code_time, 0.0), 4),
+        }
+        for field in RESOURCE_COUNTERS:
+            if field in usage:
+                metrics[field] = round(usage[field], 4) if isinstance(usage[field], float) else usage[field]
+        return metrics
+
+    def _record_health(self, runtime: Runtime, ok: bool) -> None:
+        # Host-process runtimes say nothing about the Docker daemon, so they leave its circuit alone.
+        if runtime in LOCAL_RUNTIMES:
+            return
+        if ok:
+            self.health.record_success()
+        else:
+            self.health.record_failure()
+
+    def _run_container(self, request: bytes, language: Language, runtime: Runtime, timeout: int,
+                       memory_limit: int) -> ContainerResult:
         try:
-            subprocess.run(['docker', 'info'], check=True, capture_output=True)
-
-            runtime_arg = '--runtime=runsc' if runtime == Runtime.GVISOR else ''
-            docker_cmd = [
-                'docker', 'run',
-                '--memory', '30m',
-                '--network', 'none',
-            ]
-            if runtime_arg:
-                docker_cmd.append(runtime_arg)
-            docker_cmd += [
-                '-v', f'{function_file}:/app/function.js' if language == Language.JAVASCRIPT else f'{function_file}:/app/function.py',
-                '-v', f'{input_file}:/app/input.json',
-                '-v', f'{output_file}:/app/output.json',
-                f'function-{language}-base',
-                'node' if language == Language.JAVASCRIPT else 'python',
-                '/app/run.js' if language == Language.JAVASCRIPT else '/app/function.py'
-            ]
-
-            result = subprocess.run(docker_cmd, capture_output=True, text=True)
-            if result.returncode != 0:
+            spec = ContainerSpec(
+                image=f'function-{language.value}-base',
+                command=[],
+                memory_mb=memory_limit,
+                runtime='runsc' if runtime == Runtime.GVISOR else None,
+            )
+
+            # The in-container alarm fires at `timeout`; the host kills the container after the grace period.
+            backend = self.backends.get(runtime, self.backend)
+            result = backend.run(spec, stdin=request, timeout=timeout + CONTAINER_TIMEOUT_GRACE)
+            if result.exit_code != 0 and not (result.timed_out or result.oom_killed):
                 raise Exception(f"Container execution failed: {result.stderr}")
+            self._record_health(runtime, ok=True)
+            return result
 
-        except subprocess.CalledProcessError as e:
+        except DockerDaemonError as e:
+            self._record_health(runtime, ok=False)
             raise Exception(f"Docker is not running: {str(e)}")
         except Exception as e:
             raise Exception(f"Failed to execute container: {str(e)}")
-
-    def _get_container_memory_usage(self) -> float:
-        try:
-            # Simulate placeholder for actual memory usage capture
-            # Real implementation would inspect container stats
-            return round(psutil.virtual_memory().used / (1024 * 1024), 2)  # In MB
-        except Exception:
-            return 0.0
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+from sqlalchemy import select
+from app.core.database import SessionLocal, AsyncSessionLocal
+from app.models.function import Function, Language, Runtime
+
+logger = logging.getLogger(__name__)
+
+FUNCTION_CACHE_TTL = float(os.getenv("FUNCTION_CACHE_TTL", "30"))
+FUNCTION_CACHE_MAX_ENTRIES = int(os.getenv("FUNCTION_CACHE_MAX_ENTRIES", "1024"))
+# Optional Redis URL; updates and deletes are published so every API process drops its copy.
+FUNCTION_CACHE_CHANNEL_URL = os.getenv("FUNCTION_CACHE_CHANNEL_URL", "")
+FUNCTION_CACHE_CHANNEL_NAME = os.getenv("FUNCTION_CACHE_CHANNEL_NAME", "function-invalidations")
+
+
+@dataclass(frozen=True)
+class FunctionDefinition:
+    # Detached copy of the columns needed to execute a function, safe to share across
+    # requests and threads (unlike an ORM instance, which is bound to its session).
+    id: int
+    name: str
+    code: str
+    language: Language
+    runtime: Runtime
+    timeout: int
+    memory_limit: int
+    cacheable: bool
+
+    @classmethod
+    def from_model(cls, function: Function) -> "FunctionDefinition":
+        return cls(function.id, function.name, function.code, function.language, function.runtime,
+                   function.timeout, function.memory_limit, bool(function.cacheable))
+
+
+class RedisInvalidationChannel:
+    # Pub/sub fan-out of invalidations between API processes. redis is only imported when a
+    # channel URL is configured, so it stays an optional dependency.
+
+    def __init__(self, url: str, name: str = FUNCTION_CACHE_CHANNEL_NAME):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self.name = name
+
+    def publish(self, function_id: int) -> None:
+        self._client.publish(self.name, json.dumps({"function_id": function_id}))
+
+    def listen(self, callback: Callable[[int], None], stopped: threading.Event) -> None:
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.name)
+        try:
+            while not stopped.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    callback(json.loads(message["data"])["function_id"])
+        finally:
+            pubsub.close()
+
+
+class FunctionCache:
+    # Read-through TTL/LRU cache of function definitions keyed by id. Local updates and
+    # deletes invalidate immediately; other processes learn of them through the channel if
+    # one is configured, or after at most FUNCTION_CACHE_TTL seconds otherwise.
+
+    def __init__(self, session_factory: Callable = SessionLocal, async_session_factory: Callable = AsyncSessionLocal,
+                 ttl: float = FUNCTION_CACHE_TTL, max_entries: int = FUNCTION_CACHE_MAX_ENTRIES,
+                 channel_url: str = FUNCTION_CACHE_CHANNEL_URL):
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 1)
+        self.channel_url = channel_url
+        self._channel: Optional[RedisInvalidationChannel] = None
+        self._entries: "OrderedDict[int, Tuple[float, FunctionDefinition]]" = OrderedDict()
+        # Bumped on every invalidation; a load that raced with one is not cached.
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if not self.channel_url or self._listener is not None:
+            return
+        try:
+            self._channel = RedisInvalidationChannel(self.channel_url)
+        except Exception as e:
+            logger.error("Function cache invalidation channel unavailable, relying on TTL: %s", e)
+            return
+        self._stopped.clear()
+        self._listener = threading.Thread(target=self._listen, name="function-cache-listener", daemon=True)
+        self._listener.start()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+
+    def get(self, function_id: int) -> Optional[FunctionDefinition]:
+        definition, generation = self._lookup(function_id)
+        if definition is not None:
+            return definition
+        db = self.session_factory()
+        try:
+            function = db.query(Function).filter(Function.id == function_id).first()
+            return self._store(function, generation)
+        finally:
+            db.close()
+
+    async def aget(self, function_id: int) -> Optional[FunctionDefinition]:
+        # Same as get, but a miss is loaded through the async engine instead of blocking a thread.
+        definition, generation = self._lookup(function_id)
+        if definition is not None:
+            return definition
+        async with self.async_session_factory() as db:
+            function = (await db.execute(select(Function).where(Function.id == function_id))).scalars().first()
+            return self._store(function, generation)
+
+    def invalidate(self, function_id: int) -> None:
+        self._drop(function_id)
+        if self._channel is not None:
+            try:
+                self._channel.publish(function_id)
+            except Exception as e:
+                logger.warning("Failed to publish invalidation of function %s: %s", function_id, e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "channel": self._listener is not None,
+            }
+
+    def _lookup(self, function_id: int) -> Tuple[Optional[FunctionDefinition], int]:
+        with self._lock:
+            entry = self._entries.get(function_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(function_id)
+                self._hits += 1
+                return entry[1], self._generation
+            self._misses += 1
+            return None, self._generation
+
+    def _store(self, function: Optional[Function], generation: int) -> Optional[FunctionDefinition]:
+        if function is None:
+            return None
+        definition = FunctionDefinition.from_model(function)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[definition.id] = (time.monotonic() + self.ttl, definition)
+                self._entries.move_to_end(definition.id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return definition
+
+    def _drop(self, function_id: int) -> None:
+        with self._lock:
+            self._entries.pop(function_id, None)
+            self._generation += 1
+
+    def _listen(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._channel.listen(self._drop, self._stopped)
+            except Exception as e:
+                # Messages may have been missed while disconnected, so start from an empty cache.
+                logger.warning("Function cache invalidation channel failed, reconnecting: %s", e)
+                self.clear()
+                self._stopped.wait(1)
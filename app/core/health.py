@@ -0,0 +1,136 @@
+import os
+import threading
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+from app.models.function import Runtime
+from app.core.backends import ContainerBackend, get_backend
+from app.core.sandbox import ALLOW_LOCAL_RUNTIMES, LOCAL_RUNTIMES
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "15"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+
+class DockerUnavailableError(Exception):
+    pass
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class DockerHealthMonitor:
+    def __init__(self, backend: Optional[ContainerBackend] = None, interval: float = HEALTH_CHECK_INTERVAL,
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.backend = backend or get_backend()
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.daemon_available = False
+        self.gvisor_available = False
+        self.server_version: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.last_checked: Optional[datetime] = None
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self.check()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._check_loop, daemon=True)
+            self._thread.start()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+
+    def check(self) -> bool:
+        try:
+            info = self.backend.info()
+            runtimes = info.get("Runtimes") or {}
+            with self._lock:
+                self.daemon_available = True
+                self.gvisor_available = "runsc" in runtimes
+                self.server_version = info.get("ServerVersion")
+                self.last_error = None
+                self.last_checked = datetime.utcnow()
+            self.record_success()
+            return True
+        except Exception as e:
+            with self._lock:
+                self.daemon_available = False
+                self.gvisor_available = False
+                self.last_error = str(e)
+                self.last_checked = datetime.utcnow()
+            logger.warning("Docker daemon health check failed: %s", e)
+            self.record_failure(trip=True)
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._state = CircuitState.CLOSED
+
+    def record_failure(self, trip: bool = False) -> None:
+        with self._lock:
+            self._failures += 1
+            if trip or self._failures >= self.failure_threshold or self._state == CircuitState.HALF_OPEN:
+                if self._state != CircuitState.OPEN:
+                    logger.error("Docker circuit breaker opened after %d failure(s)", self._failures)
+                self._state = CircuitState.OPEN
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = CircuitState.HALF_OPEN
+            return self._state
+
+    def ensure_available(self, runtime: Runtime) -> None:
+        # Host-process runtimes do not need the daemon, but must be enabled explicitly.
+        if runtime in LOCAL_RUNTIMES:
+            if not ALLOW_LOCAL_RUNTIMES:
+                raise DockerUnavailableError(f"The {runtime.value} runtime is disabled; "
+                                             f"set ALLOW_LOCAL_RUNTIMES=true to enable it")
+            return
+        if self.state == CircuitState.OPEN:
+            raise DockerUnavailableError(f"Docker is not running: {self.last_error or 'circuit breaker open'}")
+        if runtime == Runtime.GVISOR and self.daemon_available and not self.gvisor_available:
+            raise DockerUnavailableError("gVisor runtime (runsc) is not registered with the Docker daemon")
+
+    def status(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {
+                "docker": {
+                    "available": self.daemon_available,
+                    "backend": self.backend.name,
+                    "version": self.server_version,
+                    "error": self.last_error,
+                },
+                "runtimes": {
+                    Runtime.DOCKER.value: self.daemon_available,
+                    Runtime.GVISOR.value: self.gvisor_available,
+                    **{runtime.value: ALLOW_LOCAL_RUNTIMES for runtime in LOCAL_RUNTIMES},
+                },
+                "circuit_breaker": {
+                    "state": state,
+                    "consecutive_failures": self._failures,
+                },
+                "last_checked": self.last_checked.isoformat() if self.last_checked else None,
+            }
+
+    def _check_loop(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.check()
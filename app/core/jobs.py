@@ -0,0 +1,199 @@
+import os
+import socket
+import threading
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+from sqlalchemy import or_, and_
+from app.core.database import SessionLocal
+from app.models.function import Function as FunctionModel
+from app.models.job import ExecutionJob, JobStatus
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_MARGIN = int(os.getenv("JOB_LEASE_MARGIN", "60"))
+# Longer messages are cut to fit the column; strict MySQL rejects the update otherwise.
+JOB_ERROR_MAX_LENGTH = ExecutionJob.error.type.length
+
+
+def truncate_error(error: Optional[str]) -> Optional[str]:
+    if error is None or len(error) <= JOB_ERROR_MAX_LENGTH:
+        return error
+    return error[:JOB_ERROR_MAX_LENGTH - 3] + "..."
+
+
+class JobWorkerPool:
+    def __init__(self, execution_engine, metric_recorder, session_factory=SessionLocal, workers: int = JOB_WORKERS,
+                 poll_interval: float = JOB_POLL_INTERVAL, function_cache=None):
+        self.execution_engine = execution_engine
+        self.metric_recorder = metric_recorder
+        self.function_cache = function_cache
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, db, function_id: int, input_data: Any, max_attempts: int = JOB_MAX_ATTEMPTS) -> ExecutionJob:
+        job = self._new_job(function_id, input_data, max_attempts)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._wakeup.set()
+        return job
+
+    async def submit_async(self, db, function_id: int, input_data: Any,
+                           max_attempts: int = JOB_MAX_ATTEMPTS) -> ExecutionJob:
+        # For AsyncSession callers; the session does not expire on commit, so no refresh is needed.
+        job = self._new_job(function_id, input_data, max_attempts)
+        db.add(job)
+        await db.commit()
+        self._wakeup.set()
+        return job
+
+    def _new_job(self, function_id: int, input_data: Any, max_attempts: int) -> ExecutionJob:
+        return ExecutionJob(
+            id=str(uuid.uuid4()),
+            function_id=function_id,
+            status=JobStatus.QUEUED,
+            input=input_data,
+            max_attempts=max_attempts,
+            created_at=datetime.utcnow()
+        )
+
+    def start(self) -> None:
+        self._stopped.clear()
+        for index in range(self.workers - len(self._threads)):
+            worker_id = f"{socket.gethostname()}-{os.getpid()}-{len(self._threads)}"
+            thread = threading.Thread(target=self._run, args=(worker_id,), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _run(self, worker_id: str) -> None:
+        while not self._stopped.is_set():
+            try:
+                processed = self._process_next(worker_id)
+            except Exception as e:
+                logger.error("Job worker %s failed: %s", worker_id, e)
+                processed = False
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self, db, worker_id: str) -> Optional[ExecutionJob]:
+        now = datetime.utcnow()
+        claimable = or_(
+            ExecutionJob.status == JobStatus.QUEUED,
+            and_(ExecutionJob.status == JobStatus.RUNNING, ExecutionJob.lease_expires_at < now)
+        )
+        candidates = (
+            db.query(ExecutionJob.id, ExecutionJob.attempts, ExecutionJob.max_attempts, FunctionModel.timeout)
+            .join(FunctionModel, FunctionModel.id == ExecutionJob.function_id)
+            .filter(claimable)
+            .order_by(ExecutionJob.created_at)
+            .limit(self.workers)
+            .all()
+        )
+        for job_id, attempts, max_attempts, timeout in candidates:
+            if attempts >= max_attempts:
+                # Out of attempts, typically a worker that died or hung on its last one: fail the
+                # job for good instead of running it again.
+                failed = (
+                    db.query(ExecutionJob)
+                    .filter(ExecutionJob.id == job_id, claimable)
+                    .update({
+                        ExecutionJob.status: JobStatus.FAILED,
+                        ExecutionJob.error: f"Gave up after {attempts} of {max_attempts} attempts",
+                        ExecutionJob.lease_expires_at: None,
+                        ExecutionJob.finished_at: now,
+                    }, synchronize_session=False)
+                )
+                db.commit()
+                if failed:
+                    logger.warning("Job %s failed after %d of %d attempts", job_id, attempts, max_attempts)
+                continue
+            # Conditional update so only one worker (in any process) wins each job.
+            claimed = (
+                db.query(ExecutionJob)
+                .filter(ExecutionJob.id == job_id, claimable)
+                .update({
+                    ExecutionJob.status: JobStatus.RUNNING,
+                    ExecutionJob.worker_id: worker_id,
+                    ExecutionJob.attempts: ExecutionJob.attempts + 1,
+                    ExecutionJob.started_at: now,
+                    ExecutionJob.lease_expires_at: now + timedelta(seconds=(timeout or 30) + JOB_LEASE_MARGIN),
+                }, synchronize_session=False)
+            )
+            db.commit()
+            if claimed:
+                return db.query(ExecutionJob).filter(ExecutionJob.id == job_id).first()
+        return None
+
+    def _process_next(self, worker_id: str) -> bool:
+        db = self.session_factory()
+        try:
+            job = self._claim(db, worker_id)
+            if job is None:
+                return False
+
+            if self.function_cache is not None:
+                function = self.function_cache.get(job.function_id)
+            else:
+                function = db.query(FunctionModel).filter(FunctionModel.id == job.function_id).first()
+            if function is None:
+                self._finish(db, job, JobStatus.FAILED, error="Function not found")
+                return True
+
+            try:
+                hit = function.cacheable and self.execution_engine.cached(
+                    function.id, function.code, function.language, job.input)
+                result, metrics = hit or self.execution_engine.execute(
+                    function_id=function.id,
+                    code=function.code,
+                    language=function.language,
+                    runtime=function.runtime,
+                    timeout=function.timeout,
+                    memory_limit=function.memory_limit,
+                    input_data=job.input,
+                    cacheable=bool(function.cacheable)
+                )
+            except Exception as e:
+                if job.attempts < job.max_attempts:
+                    logger.warning("Job %s attempt %d failed, requeueing: %s", job.id, job.attempts, e)
+                    job.status = JobStatus.QUEUED
+                    job.worker_id = None
+                    job.lease_expires_at = None
+                    job.error = truncate_error(str(e))
+                    db.commit()
+                else:
+                    self._finish(db, job, JobStatus.FAILED, error=str(e))
+                return True
+
+            job.result = result
+            job.execution_time = metrics["execution_time"]
+            job.memory_used = metrics["memory_used"]
+            self.metric_recorder.record(function.id, metrics, function.runtime)
+            status = JobStatus.SUCCEEDED if metrics.get("error") is None else JobStatus.FAILED
+            self._finish(db, job, status, error=metrics.get("error"))
+            return True
+        finally:
+            db.close()
+
+    def _finish(self, db, job: ExecutionJob, status: JobStatus, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = truncate_error(error)
+        job.lease_expires_at = None
+        job.finished_at = datetime.utcnow()
+        db.commit()
@@ -0,0 +1,84 @@
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Daily partitions are named after the day they hold; the last one catches everything newer.
+FUTURE_PARTITION = "pmax"
+
+
+def is_supported(engine: Engine) -> bool:
+    # Range partitioning is MySQL only; other databases fall back to batched deletes.
+    return engine.dialect.name == "mysql"
+
+
+def _name(day: date) -> str:
+    return f"p{day:%Y%m%d}"
+
+
+def _day(name: str) -> Optional[date]:
+    try:
+        return datetime.strptime(name[1:], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def _definition(day: date) -> str:
+    return f"PARTITION {_name(day)} VALUES LESS THAN (TO_DAYS('{day + timedelta(days=1):%Y-%m-%d}'))"
+
+
+def partitions(engine: Engine, table: str) -> Dict[str, Optional[date]]:
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL"
+        ), {"table": table}).fetchall()
+    return {row[0]: _day(row[0]) for row in rows}
+
+
+def enable(engine: Engine, table: str, today: date, days_ahead: int) -> bool:
+    # One-off conversion of the table to daily RANGE partitions on created_at. MySQL requires
+    # the partitioning column in the primary key and does not allow foreign keys on
+    # partitioned tables, so both are adjusted first. Rows from before today land in a
+    # single partition named after yesterday, which ages out like any other day.
+    if partitions(engine, table):
+        return False
+    with engine.begin() as conn:
+        foreign_keys = conn.execute(text(
+            "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+            "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ), {"table": table}).fetchall()
+        for (name,) in foreign_keys:
+            conn.execute(text(f"ALTER TABLE {table} DROP FOREIGN KEY {name}"))
+        conn.execute(text(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)"))
+        days = [today - timedelta(days=1)] + [today + timedelta(days=offset) for offset in range(days_ahead + 1)]
+        definitions = [_definition(day) for day in days] + [f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE"]
+        conn.execute(text(
+            f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(created_at)) ({', '.join(definitions)})"
+        ))
+    logger.info("Partitioned %s by day", table)
+    return True
+
+
+def rotate(engine: Engine, table: str, today: date, retain_from: date, days_ahead: int) -> List[str]:
+    # Creates partitions for the coming days and drops whole days older than retain_from.
+    # Both are metadata operations, so concurrent inserts into today's partition are not blocked
+    # the way a large DELETE would block them.
+    existing = partitions(engine, table)
+    days = [day for day in existing.values() if day is not None]
+    latest = max(days) if days else today - timedelta(days=1)
+    upcoming = [latest + timedelta(days=offset) for offset in range(1, (today - latest).days + days_ahead + 1)]
+    expired = sorted(name for name, day in existing.items() if day is not None and day < retain_from)
+    with engine.begin() as conn:
+        if upcoming:
+            definitions = [_definition(day) for day in upcoming]
+            definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+            conn.execute(text(
+                f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO ({', '.join(definitions)})"
+            ))
+        if expired:
+            conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}"))
+    return expired
@@ -0,0 +1,443 @@
+import os
+import queue
+import signal
+import subprocess
+import threading
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from app.models.function import Language, Runtime
+from app.core.protocol import OutputLimitExceededError, encode_frame, is_usage_frame, read_frame
+from app.core.backends import FUNCTION_CPUS, FUNCTION_PIDS_LIMIT, SIGKILL_EXIT_CODE
+from app.core import sandbox, telemetry
+
+logger = logging.getLogger(__name__)
+
+POOL_ENABLED = os.getenv("POOL_ENABLED", "true").lower() == "true"
+POOL_MIN_SIZE = int(os.getenv("POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("POOL_MAX_SIZE", "4"))
+POOL_IDLE_TIMEOUT = float(os.getenv("POOL_IDLE_TIMEOUT", "300"))
+POOL_MAX_INVOCATIONS = int(os.getenv("POOL_MAX_INVOCATIONS", "100"))
+# Memory limit of containers pre-warmed at startup; matches the default function memory_limit.
+POOL_DEFAULT_MEMORY_MB = int(os.getenv("POOL_DEFAULT_MEMORY_MB", "128"))
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("POOL_ACQUIRE_TIMEOUT", "30"))
+POOL_REAP_INTERVAL = float(os.getenv("POOL_REAP_INTERVAL", "10"))
+# Python workers fork a child per invocation from a pre-initialised interpreter.
+POOL_FORK_SERVER = os.getenv("POOL_FORK_SERVER", "true").lower() == "true"
+# Extra time a warm worker gets past the function timeout before the host kills it.
+POOL_TIMEOUT_GRACE = float(os.getenv("POOL_TIMEOUT_GRACE", "5"))
+# Frames buffered per container; a slow consumer stalls the worker instead of growing memory.
+POOL_RESPONSE_BUFFER = int(os.getenv("POOL_RESPONSE_BUFFER", "64"))
+# Send each invocation to an idle worker that recently ran the same code, whose compiled handler
+# is still cached, before falling back to any idle worker.
+POOL_AFFINITY = os.getenv("POOL_AFFINITY", "true").lower() == "true"
+# Seconds an invocation waits for a busy worker holding its code instead of taking another idle
+# worker or starting a new one; 0 only prefers such workers when they are already idle.
+POOL_AFFINITY_STICKINESS = float(os.getenv("POOL_AFFINITY_STICKINESS", "0"))
+# Code keys remembered per worker; matches HANDLER_CACHE_SIZE in worker.py / worker.js.
+POOL_AFFINITY_KEYS = int(os.getenv("POOL_AFFINITY_KEYS", "64"))
+MAX_OUTPUT_BYTES = int(os.getenv("MAX_OUTPUT_BYTES", str(16 * 1024 * 1024)))
+MAX_STREAM_OUTPUT_BYTES = int(os.getenv("MAX_STREAM_OUTPUT_BYTES", str(256 * 1024 * 1024)))
+
+_OVERSIZED = object()
+
+# Containers are pooled per memory limit, since the cgroup limit is fixed when they start.
+PoolKey = Tuple[Language, Runtime, int]
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+class ExecutionTimeoutError(Exception):
+    pass
+
+
+class OutOfMemoryError(Exception):
+    pass
+
+
+class WarmContainer:
+    def __init__(self, language: Language, runtime: Runtime, memory_mb: int = POOL_DEFAULT_MEMORY_MB):
+        self.language = language
+        self.runtime = runtime
+        self.memory_mb = memory_mb
+        self.name = f"fn-pool-{language.value}-{uuid.uuid4().hex[:12]}"
+        self.invocations = 0
+        self.last_used = time.monotonic()
+        # Code keys this worker has run, least recent first; mirrored in the pool's affinity map.
+        self.code_keys: "OrderedDict[str, None]" = OrderedDict()
+        self._responses: "queue.Queue[Any]" = queue.Queue(maxsize=POOL_RESPONSE_BUFFER)
+        self.local = runtime in sandbox.LOCAL_RUNTIMES
+        if self.local:
+            # A worker process on the host instead of a container; see app/core/sandbox.py.
+            command = sandbox.worker_command(language, memory_mb)
+            options = sandbox.process_options(language, memory_mb,
+                                              env={"WORKER_FORK": "1"} if POOL_FORK_SERVER else None)
+        else:
+            command, options = self._docker_cmd(), {}
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            **options
+        )
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+
+    def _docker_cmd(self) -> List[str]:
+        docker_cmd = [
+            'docker', 'run', '-i', '--rm',
+            '--name', self.name,
+            '--memory', f'{self.memory_mb}m',
+            '--memory-swap', f'{self.memory_mb}m',
+            '--cpus', str(FUNCTION_CPUS),
+            '--pids-limit', str(FUNCTION_PIDS_LIMIT),
+            '--network', 'none',
+        ]
+        if self.runtime == Runtime.GVISOR:
+            docker_cmd.append('--runtime=runsc')
+        if POOL_FORK_SERVER:
+            docker_cmd += ['-e', 'WORKER_FORK=1']
+        if self.language == Language.JAVASCRIPT:
+            docker_cmd += ['--entrypoint', 'node', f'function-{self.language.value}-base', '/app/worker.js']
+        else:
+            docker_cmd += ['--entrypoint', 'python', f'function-{self.language.value}-base', '/app/worker.py']
+        return docker_cmd
+
+    def _read_responses(self) -> None:
+        while True:
+            try:
+                frame = read_frame(self._process.stdout, MAX_OUTPUT_BYTES)
+            except OutputLimitExceededError:
+                # Stop reading; the container is recycled once the caller sees this.
+                self._responses.put(_OVERSIZED)
+                return
+            except Exception:
+                break
+            if frame is None:
+                break
+            self._responses.put(frame)
+        self._responses.put(None)
+
+    @property
+    def key(self) -> PoolKey:
+        return (self.language, self.runtime, self.memory_mb)
+
+    @property
+    def alive(self) -> bool:
+        return self._process.poll() is None
+
+    def _send(self, request: Dict[str, Any]) -> None:
+        try:
+            self._process.stdin.write(encode_frame(request))
+            self._process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise Exception(f"Warm container {self.name} is not accepting input: {str(e)}")
+
+    def _next_message(self, deadline: float, timeout: float) -> Tuple[Dict[str, Any], int]:
+        try:
+            frame = self._responses.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            raise ExecutionTimeoutError(f"Function execution timed out after {timeout}s")
+        if frame is None:
+            try:
+                exit_code = self._process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                exit_code = None
+            # node aborts when it reaches the --max-old-space-size a host worker is started with.
+            heap_exhausted = self.local and self.language == Language.JAVASCRIPT and exit_code == -signal.SIGABRT
+            if exit_code in (SIGKILL_EXIT_CODE, -signal.SIGKILL) or heap_exhausted:
+                raise OutOfMemoryError(f"Function exceeded its {self.memory_mb}MB memory limit")
+            raise Exception(f"Warm container {self.name} exited unexpectedly")
+        if frame is _OVERSIZED:
+            raise OutputLimitExceededError(f"Function output exceeds {MAX_OUTPUT_BYTES} bytes")
+        return frame
+
+    def invoke(self, key: str, code: str, input_data: Any,
+               timeout: float) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        self._send({"key": key, "code": code, "input": input_data, "timeout": timeout})
+        deadline = time.monotonic() + timeout + POOL_TIMEOUT_GRACE
+        usage = None
+        message, _ = self._next_message(deadline, timeout)
+        # The worker reports the invocation's resource usage just before its result.
+        while is_usage_frame(message):
+            usage = message["usage"]
+            message, _ = self._next_message(deadline, timeout)
+
+        self.invocations += 1
+        self.last_used = time.monotonic()
+        return message, usage
+
+    def invoke_stream(self, key: str, code: str, input_data: Any, timeout: float) -> Iterator[Dict[str, Any]]:
+        self._send({"key": key, "code": code, "input": input_data, "timeout": timeout, "stream": True})
+        deadline = time.monotonic() + timeout + POOL_TIMEOUT_GRACE
+        streamed = 0
+        while True:
+            message, size = self._next_message(deadline, timeout)
+            if "chunk" not in message and not is_usage_frame(message):
+                self.invocations += 1
+                self.last_used = time.monotonic()
+                yield message
+                return
+            streamed += size
+            if streamed > MAX_STREAM_OUTPUT_BYTES:
+                raise OutputLimitExceededError(f"Streamed output exceeds {MAX_STREAM_OUTPUT_BYTES} bytes")
+            yield message
+
+    def stop(self) -> None:
+        if self.local:
+            # Also takes down a forked invocation that is still running.
+            sandbox.kill_group(self._process)
+        else:
+            try:
+                subprocess.run(['docker', 'kill', self.name], capture_output=True, timeout=10)
+            except Exception:
+                pass
+        if self.alive:
+            self._process.kill()
+        # Unblock the reader thread if it is waiting on a full response buffer.
+        deadline = time.monotonic() + 5
+        while self._reader.is_alive() and time.monotonic() < deadline:
+            try:
+                self._responses.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+class ContainerPool:
+    def __init__(self, min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT, max_invocations: int = POOL_MAX_INVOCATIONS,
+                 affinity: bool = POOL_AFFINITY, stickiness: float = POOL_AFFINITY_STICKINESS,
+                 affinity_keys: int = POOL_AFFINITY_KEYS):
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.max_invocations = max_invocations
+        self.affinity = affinity
+        self.stickiness = stickiness
+        self.affinity_keys = max(affinity_keys, 1)
+        self._idle: Dict[PoolKey, List[WarmContainer]] = {}
+        # Affinity map: code key (artifact hash) -> live workers that recently ran it.
+        self._affinity: Dict[str, Set[WarmContainer]] = {}
+        self._total: Dict[PoolKey, int] = {}
+        # Only the keys given to start() are kept at min_size; other memory limits scale to zero.
+        self._prewarm: List[PoolKey] = []
+        # Set by scale(): per-key warm targets that replace the static min_size floor.
+        self._targets: Dict[PoolKey, int] = {}
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+        self._can_prewarm: Callable[[PoolKey], bool] = lambda key: True
+
+    def start(self, keys: Optional[List[PoolKey]] = None,
+              can_prewarm: Optional[Callable[[PoolKey], bool]] = None) -> None:
+        self._stopped.clear()
+        if can_prewarm is not None:
+            self._can_prewarm = can_prewarm
+        if keys is None:
+            keys = [(language, runtime, POOL_DEFAULT_MEMORY_MB) for language in Language for runtime in Runtime]
+        for key in keys:
+            self._idle.setdefault(key, [])
+            self._total.setdefault(key, 0)
+        self._prewarm = list(keys)
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+            self._reaper.start()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        with self._cond:
+            containers = [c for idle in self._idle.values() for c in idle]
+            for key in self._idle:
+                self._total[key] -= len(self._idle[key])
+                self._idle[key] = []
+            for container in containers:
+                self._forget(container)
+            self._cond.notify_all()
+        for container in containers:
+            container.stop()
+
+    def acquire(self, language: Language, runtime: Runtime, memory_mb: int = POOL_DEFAULT_MEMORY_MB,
+                timeout: float = POOL_ACQUIRE_TIMEOUT, code_key: Optional[str] = None) -> WarmContainer:
+        # With code_key, a worker that recently ran that code is preferred (see POOL_AFFINITY).
+        key = (language, runtime, memory_mb)
+        now = time.monotonic()
+        deadline = now + timeout
+        sticky_until = now + self.stickiness if self.affinity and code_key else now
+        with self._cond:
+            while True:
+                if self._stopped.is_set():
+                    raise Exception("Container pool is shut down")
+                # Until the stickiness runs out, hold out for a busy worker that has the code.
+                holding = time.monotonic() < sticky_until and self._busy_with(key, code_key)
+                container = self._pop_idle(key, code_key, affine_only=holding)
+                if container is not None:
+                    telemetry.observe_start(language, runtime, cold=False)
+                    if code_key:
+                        telemetry.observe_affinity(language, runtime, hit=container in self._affinity.get(code_key, ()))
+                    return container
+                if holding:
+                    self._cond.wait(max(min(sticky_until, deadline) - time.monotonic(), 0))
+                    continue
+                if self._total.get(key, 0) < self.max_size:
+                    self._total[key] = self._total.get(key, 0) + 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"No warm {language.value}/{runtime.value} {memory_mb}MB container available")
+                self._cond.wait(remaining)
+
+        telemetry.observe_start(language, runtime, cold=True)
+        if code_key:
+            telemetry.observe_affinity(language, runtime, hit=False)
+        try:
+            return WarmContainer(language, runtime, memory_mb)
+        except Exception:
+            with self._cond:
+                self._total[key] -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, container: WarmContainer, failed: bool = False, code_key: Optional[str] = None) -> None:
+        key = container.key
+        recycle = failed or not container.alive or container.invocations >= self.max_invocations
+        with self._cond:
+            if recycle or self._stopped.is_set():
+                self._total[key] -= 1
+                self._forget(container)
+            else:
+                if code_key:
+                    self._remember(container, code_key)
+                self._idle.setdefault(key, []).append(container)
+            # Every waiter re-checks, since one holding out for this worker's code may be among them.
+            self._cond.notify_all()
+        if recycle or self._stopped.is_set():
+            logger.info("Recycling warm container %s after %d invocations", container.name, container.invocations)
+            container.stop()
+
+    def _pop_idle(self, key: PoolKey, code_key: Optional[str], affine_only: bool) -> Optional[WarmContainer]:
+        # The most recently used idle worker that ran the code, else (unless affine_only) the most
+        # recently used idle worker. Dead workers found on the way are dropped.
+        idle = self._idle.setdefault(key, [])
+        affine = self._affinity.get(code_key, set()) if self.affinity and code_key else set()
+        while True:
+            candidates = [container for container in idle if container in affine] or ([] if affine_only else idle)
+            if not candidates:
+                return None
+            container = candidates[-1]
+            idle.remove(container)
+            if container.alive:
+                return container
+            self._total[key] -= 1
+            self._forget(container)
+
+    def _busy_with(self, key: PoolKey, code_key: Optional[str]) -> bool:
+        idle = self._idle.get(key, [])
+        return any(container.key == key and container not in idle for container in self._affinity.get(code_key, ()))
+
+    def _remember(self, container: WarmContainer, code_key: str) -> None:
+        container.code_keys[code_key] = None
+        container.code_keys.move_to_end(code_key)
+        self._affinity.setdefault(code_key, set()).add(container)
+        # The worker's own handler cache is LRU too; forget what it has evicted.
+        while len(container.code_keys) > self.affinity_keys:
+            dropped, _ = container.code_keys.popitem(last=False)
+            self._discard(dropped, container)
+
+    def _forget(self, container: WarmContainer) -> None:
+        for code_key in container.code_keys:
+            self._discard(code_key, container)
+
+    def _discard(self, code_key: str, container: WarmContainer) -> None:
+        containers = self._affinity.get(code_key)
+        if containers is not None:
+            containers.discard(container)
+            if not containers:
+                del self._affinity[code_key]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._cond:
+            return {
+                f"{language.value}/{runtime.value}/{memory_mb}m": {
+                    "idle": len(self._idle.get((language, runtime, memory_mb), [])),
+                    "total": total,
+                }
+                for (language, runtime, memory_mb), total in self._total.items()
+            }
+
+    def keys(self) -> List[PoolKey]:
+        with self._cond:
+            return list(self._idle)
+
+    def scale(self, targets: Dict[PoolKey, int]) -> None:
+        # Keeps targets[key] workers per key from now on, in place of min_size; keys left out keep
+        # the static floor. Workers are started right away, surplus idle ones retire as they
+        # expire, and a key targeted at zero stops its idle workers at once.
+        with self._cond:
+            self._targets = {key: min(max(target, 0), self.max_size) for key, target in targets.items()}
+            for key in self._targets:
+                self._idle.setdefault(key, [])
+                self._total.setdefault(key, 0)
+        self._evict_idle()
+        self._fill_to_min()
+
+    def _floor(self, key: PoolKey) -> int:
+        if key in self._targets:
+            return self._targets[key]
+        return min(self.min_size, self.max_size) if key in self._prewarm else 0
+
+    def _reap_loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._evict_idle()
+                self._fill_to_min()
+            except Exception as e:
+                logger.warning("Container pool maintenance failed: %s", e)
+            self._stopped.wait(POOL_REAP_INTERVAL)
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        evicted = []
+        with self._cond:
+            for key, idle in self._idle.items():
+                keep = []
+                floor = self._floor(key)
+                # A key the autoscaler scaled to zero has been idle long enough; do not wait for idle_timeout.
+                scaled_to_zero = self._targets.get(key) == 0
+                for container in idle:
+                    expired = scaled_to_zero or now - container.last_used > self.idle_timeout
+                    if not container.alive or (expired and self._total[key] > floor):
+                        evicted.append(container)
+                        self._total[key] -= 1
+                        self._forget(container)
+                    else:
+                        keep.append(container)
+                self._idle[key] = keep
+        for container in evicted:
+            container.stop()
+
+    def _fill_to_min(self) -> None:
+        with self._cond:
+            keys = list(dict.fromkeys(self._prewarm + list(self._targets)))
+        for key in keys:
+            if not self._can_prewarm(key):
+                continue
+            while True:
+                with self._cond:
+                    if self._stopped.is_set() or self._total[key] >= self._floor(key):
+                        break
+                    self._total[key] += 1
+                try:
+                    container = WarmContainer(*key)
+                except Exception:
+                    with self._cond:
+                        self._total[key] -= 1
+                    raise
+                with self._cond:
+                    self._idle[key].append(container)
+                    self._cond.notify()
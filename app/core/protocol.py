@@ -0,0 +1,57 @@
+import json
+import struct
+from typing import Any, BinaryIO, List, Optional, Tuple
+
+# Every message between the host and a function container is a 4-byte big-endian
+# length followed by that many bytes of UTF-8 JSON.
+HEADER = struct.Struct(">I")
+
+
+class OutputLimitExceededError(Exception):
+    pass
+
+
+def encode_frame(message: Any) -> bytes:
+    payload = json.dumps(message).encode("utf-8")
+    return HEADER.pack(len(payload)) + payload
+
+
+def is_usage_frame(message: Any) -> bool:
+    # Sent by the container alongside the result with the invocation's resource usage.
+    return isinstance(message, dict) and set(message) == {"usage"}
+
+
+def _read_exact(stream: BinaryIO, size: int) -> Optional[bytes]:
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def read_frame(stream: BinaryIO, max_size: int) -> Optional[Tuple[Any, int]]:
+    header = _read_exact(stream, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > max_size:
+        raise OutputLimitExceededError(f"Function output exceeds {max_size} bytes")
+    payload = _read_exact(stream, size)
+    if payload is None:
+        return None
+    return json.loads(payload), size
+
+
+def decode_frames(data: bytes, max_size: int) -> List[Any]:
+    messages = []
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        (size,) = HEADER.unpack_from(data, offset)
+        if size > max_size:
+            raise OutputLimitExceededError(f"Function output exceeds {max_size} bytes")
+        offset += HEADER.size
+        messages.append(json.loads(data[offset:offset + size]))
+        offset += size
+    return messages
@@ -0,0 +1,221 @@
+import os
+import json
+import hashlib
+import queue
+import threading
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from sqlalchemy.exc import IntegrityError
+from app.core.database import SessionLocal
+from app.core.rollups import apply_rollups
+from app.models.function import Runtime
+from app.models.metrics import ExecutionError, ExecutionMetric, RESOURCE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+METRICS_QUEUE_SIZE = int(os.getenv("METRICS_QUEUE_SIZE", "10000"))
+METRICS_FLUSH_SIZE = int(os.getenv("METRICS_FLUSH_SIZE", "500"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+METRICS_SPILL_PATH = os.getenv("METRICS_SPILL_PATH", "metrics_spill.jsonl")
+
+_FLUSH = object()
+
+
+def error_digest(message: str) -> str:
+    return hashlib.sha256(message.encode("utf-8", "replace")).hexdigest()
+
+
+def intern_errors(db, messages: Iterable[str]) -> Dict[str, int]:
+    # Maps each message to its id in the error dictionary, adding the ones not seen before.
+    digests = {error_digest(message): message for message in set(messages)}
+    if not digests:
+        return {}
+    known = dict(db.query(ExecutionError.digest, ExecutionError.id).filter(ExecutionError.digest.in_(digests)).all())
+    missing = [ExecutionError(digest=digest, message=message)
+               for digest, message in digests.items() if digest not in known]
+    if missing:
+        db.add_all(missing)
+        db.flush()
+        known.update((error.digest, error.id) for error in missing)
+    return {message: known[digest] for digest, message in digests.items()}
+
+
+def metric_row(function_id: int, metrics: Dict[str, Any], runtime: Optional[Runtime] = None) -> Dict[str, Any]:
+    return {
+        "function_id": function_id,
+        "runtime": runtime,
+        "execution_time": metrics["execution_time"],
+        "memory_used": metrics["memory_used"],
+        "success": metrics.get("error") is None,  # If no error, success is True
+        "error": metrics.get("error"),
+        "error_type": metrics.get("error_type"),
+        "cache_hit": bool(metrics.get("cache_hit")),
+        "created_at": metrics.get("created_at") or datetime.utcnow(),
+        **{field: metrics.get(field) for field in RESOURCE_FIELDS},
+    }
+
+
+class MetricRecorder:
+    # Execution metrics are queued in process and written by one background thread with a
+    # bulk insert per batch, so responses never wait on the database. Rows that cannot be
+    # queued or written go to a JSON-lines spill file that is replayed on the next good flush.
+
+    def __init__(self, session_factory: Callable = SessionLocal, queue_size: int = METRICS_QUEUE_SIZE,
+                 flush_size: int = METRICS_FLUSH_SIZE, flush_interval: float = METRICS_FLUSH_INTERVAL,
+                 spill_path: Optional[str] = METRICS_SPILL_PATH):
+        self.session_factory = session_factory
+        self.flush_size = max(flush_size, 1)
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._spill_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._written = 0
+        self._spilled = 0
+
+    def start(self) -> None:
+        self._stopped.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="metric-recorder", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 10) -> None:
+        self._stopped.set()
+        try:
+            self._queue.put(_FLUSH, timeout=1)
+        except queue.Full:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        # Anything the thread did not get to (or everything, if it was never started).
+        while True:
+            rows = self._drain(block=False)
+            if rows:
+                self._write(rows)
+            elif self._queue.empty():
+                break
+
+    def record(self, function_id: int, metrics: Dict[str, Any], runtime: Optional[Runtime] = None) -> None:
+        self.record_many(function_id, [metrics], runtime)
+
+    def record_many(self, function_id: int, metrics_list: List[Dict[str, Any]],
+                    runtime: Optional[Runtime] = None) -> None:
+        rows = [metric_row(function_id, metrics, runtime) for metrics in metrics_list]
+        for index, row in enumerate(rows):
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                # Backpressure: the writer is behind, so keep the rest on disk instead of blocking the caller.
+                logger.warning("Metric queue is full; spilling %d row(s) to %s", len(rows) - index, self.spill_path)
+                self._spill(rows[index:])
+                return
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self._written,
+            "spilled": self._spilled,
+        }
+
+    def _run(self) -> None:
+        # Rows spilled before a restart are written as soon as the database is reachable.
+        try:
+            self._replay_spill()
+        except Exception as e:
+            logger.error("Failed to replay spilled metrics: %s", e)
+        while not self._stopped.is_set():
+            rows = self._drain(block=True)
+            if rows:
+                self._write(rows)
+
+    def _drain(self, block: bool) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(rows) < self.flush_size:
+            try:
+                if block:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _FLUSH:
+                break
+            rows.append(item)
+        return rows
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        try:
+            self._insert(rows)
+        except Exception as e:
+            logger.error("Failed to write %d metric row(s), spilling to %s: %s", len(rows), self.spill_path, e)
+            self._spill(rows)
+            return
+        self._written += len(rows)
+        self._replay_spill()
+
+    def _insert(self, rows: List[Dict[str, Any]], attempts: int = 2) -> None:
+        db = self.session_factory()
+        try:
+            for attempt in range(attempts):
+                try:
+                    error_ids = intern_errors(db, (row["error"] for row in rows if row.get("error")))
+                    db.bulk_insert_mappings(ExecutionMetric, [
+                        {**{key: value for key, value in row.items() if key != "error"},
+                         "error_id": error_ids.get(row.get("error"))}
+                        for row in rows
+                    ])
+                    # Same transaction, so rollups never count rows that were not stored.
+                    apply_rollups(db, rows)
+                    db.commit()
+                    return
+                except IntegrityError:
+                    # Another process created one of the same rollup buckets or error entries first;
+                    # retrying merges into them.
+                    db.rollback()
+                    if attempt == attempts - 1:
+                        raise
+        finally:
+            db.close()
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        if not self.spill_path:
+            logger.error("Dropping %d metric row(s): no spill file configured", len(rows))
+            return
+        with self._spill_lock:
+            with open(self.spill_path, "a") as spill:
+                for row in rows:
+                    spill.write(json.dumps({**row, "created_at": row["created_at"].isoformat()}) + "\n")
+            self._spilled += len(rows)
+
+    def _replay_spill(self) -> None:
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        # Move the file aside first so rows spilled while replaying are not lost or duplicated.
+        replaying = f"{self.spill_path}.replay"
+        with self._spill_lock:
+            if not os.path.exists(replaying):
+                os.replace(self.spill_path, replaying)
+        with open(replaying) as spill:
+            rows = [json.loads(line) for line in spill if line.strip()]
+        for row in rows:
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+            if row.get("runtime") is not None:
+                row["runtime"] = Runtime(row["runtime"])
+        replayed = 0
+        for start in range(0, len(rows), self.flush_size):
+            batch = rows[start:start + self.flush_size]
+            try:
+                self._insert(batch)
+            except Exception as e:
+                logger.error("Failed to replay spilled metrics: %s", e)
+                self._spill(rows[start:])
+                break
+            replayed += len(batch)
+        os.remove(replaying)
+        self._written += replayed
+        logger.info("Replayed %d spilled metric row(s)", replayed)
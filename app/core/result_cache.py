@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+from app.models.function import Language
+
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Larger results are returned but not cached, so one big output cannot flush the cache.
+RESULT_CACHE_MAX_ITEM_BYTES = int(os.getenv("RESULT_CACHE_MAX_ITEM_BYTES", str(1024 * 1024)))
+
+ResultKey = Tuple[str, str]
+
+
+@dataclass
+class CachedResult:
+    expires_at: float
+    # Stored as JSON text: callers get a fresh copy on every hit, and its length is the entry's size.
+    payload: str
+
+    @property
+    def size(self) -> int:
+        return len(self.payload)
+
+
+def code_digest(code: str, language: Language) -> str:
+    return hashlib.sha256(f"{language.value}\0{code}".encode("utf-8")).hexdigest()
+
+
+def input_digest(input_data: Any) -> Optional[str]:
+    # Canonical JSON, so {"a": 1, "b": 2} and {"b": 2, "a": 1} share an entry.
+    try:
+        canonical = json.dumps(input_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    # Memoized outputs of functions marked cacheable, keyed by (code hash, input hash).
+    # Entries expire after a TTL and the least recently used are evicted past the entry or
+    # byte budget. Keying on the code hash means an updated function can never be served
+    # a result of its old code; invalidate() additionally frees those entries right away.
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES, max_item_bytes: int = RESULT_CACHE_MAX_ITEM_BYTES):
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 1)
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._entries: "OrderedDict[ResultKey, CachedResult]" = OrderedDict()
+        self._by_code: Dict[str, Set[ResultKey]] = {}
+        self._functions: Dict[int, str] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, function_id: int, code: str, language: Language, input_data: Any) -> Optional[Any]:
+        key = self._key(code, language, input_data)
+        if key is None:
+            return None
+        with self._lock:
+            self._functions[function_id] = key[0]
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._discard(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            payload = entry.payload
+        return json.loads(payload)
+
+    def put(self, function_id: int, code: str, language: Language, input_data: Any, output: Any) -> None:
+        key = self._key(code, language, input_data)
+        if key is None:
+            return
+        try:
+            entry = CachedResult(time.monotonic() + self.ttl, json.dumps(output))
+        except (TypeError, ValueError):
+            return
+        if entry.size > self.max_item_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = entry
+            self._by_code.setdefault(key[0], set()).add(key)
+            self._functions[function_id] = key[0]
+            self._bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, function_id: int) -> None:
+        with self._lock:
+            digest = self._functions.pop(function_id, None)
+            # Identical code may be shared by other functions; keep its results if so.
+            if digest is None or digest in self._functions.values():
+                return
+            for key in list(self._by_code.get(digest, ())):
+                self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_code.clear()
+            self._functions.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def _key(self, code: str, language: Language, input_data: Any) -> Optional[ResultKey]:
+        digest = input_digest(input_data)
+        return (code_digest(code, language), digest) if digest is not None else None
+
+    def _discard(self, key: ResultKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        keys = self._by_code.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_code[key[0]]
@@ -0,0 +1,123 @@
+import os
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from app.core import partitions
+from app.core.database import SessionLocal, engine as default_engine
+from app.core.rollups import bucket_start
+from app.models.function import Function
+from app.models.metrics import ExecutionMetric
+from app.models.rollup import MetricRollup
+
+logger = logging.getLogger(__name__)
+
+# Raw rows are already folded into rollups when they are written, so expiring them only
+# drops per-call detail; success rates and percentiles stay available from the rollups.
+# Off by default: metrics written before rollups existed are only counted once
+# `python -m app.core.rollups` has backfilled them, so enable it after that has run.
+METRICS_RAW_TTL_DAYS = int(os.getenv("METRICS_RAW_TTL_DAYS", "0"))  # 0 keeps raw metrics forever
+ROLLUP_MINUTE_TTL_DAYS = int(os.getenv("ROLLUP_MINUTE_TTL_DAYS", "3"))
+ROLLUP_HOUR_TTL_DAYS = int(os.getenv("ROLLUP_HOUR_TTL_DAYS", "90"))
+ROLLUP_DAY_TTL_DAYS = int(os.getenv("ROLLUP_DAY_TTL_DAYS", "0"))  # 0 keeps day rollups forever
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+METRICS_PARTITIONING = os.getenv("METRICS_PARTITIONING", "false").lower() == "true"
+METRICS_PARTITION_DAYS_AHEAD = int(os.getenv("METRICS_PARTITION_DAYS_AHEAD", "3"))
+
+
+class RetentionWorker:
+    # Periodically expires raw metrics and fine-grained rollups. With partitioning on (MySQL),
+    # raw metrics live in daily partitions that are dropped whole; otherwise they are deleted
+    # in small primary-key batches, each its own short transaction, so the recorder's inserts
+    # never wait behind one long-running delete.
+
+    def __init__(self, session_factory: Callable = SessionLocal, engine: Engine = default_engine,
+                 interval: float = RETENTION_INTERVAL, batch_size: int = RETENTION_BATCH_SIZE,
+                 raw_ttl_days: int = METRICS_RAW_TTL_DAYS, partitioning: bool = METRICS_PARTITIONING):
+        self.session_factory = session_factory
+        self.engine = engine
+        self.interval = interval
+        self.batch_size = max(batch_size, 1)
+        self.raw_ttl_days = raw_ttl_days
+        self.partitioning = partitioning and partitions.is_supported(engine)
+        self.rollup_ttl_days = {"minute": ROLLUP_MINUTE_TTL_DAYS, "hour": ROLLUP_HOUR_TTL_DAYS,
+                                "day": ROLLUP_DAY_TTL_DAYS}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_run: Optional[datetime] = None
+        self._last_result: Dict[str, Any] = {}
+
+    def start(self) -> None:
+        if self.partitioning:
+            partitions.enable(self.engine, ExecutionMetric.__tablename__, datetime.utcnow().date(),
+                              METRICS_PARTITION_DAYS_AHEAD)
+        self._stopped.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="metric-retention", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 10) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "partitioning": self.partitioning,
+            "last_run": self._last_run.isoformat() if self._last_run else None,
+            **self._last_result,
+        }
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("Metric retention failed: %s", e)
+            self._stopped.wait(self.interval)
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        now = now or datetime.utcnow()
+        result: Dict[str, Any] = {}
+        if self.raw_ttl_days > 0:
+            # Whole days only, so a day is never left with half of its raw rows.
+            cutoff = bucket_start(now - timedelta(days=self.raw_ttl_days), "day")
+            if self.partitioning:
+                dropped = partitions.rotate(self.engine, ExecutionMetric.__tablename__, now.date(), cutoff.date(),
+                                            METRICS_PARTITION_DAYS_AHEAD)
+                result["raw_partitions_dropped"] = len(dropped)
+            else:
+                result["raw_deleted"] = self._delete_batches(ExecutionMetric, ExecutionMetric.created_at < cutoff)
+        if self.partitioning:
+            # Partitioned tables have no foreign keys, so metrics of deleted functions are removed here.
+            result["orphans_deleted"] = self._delete_batches(
+                ExecutionMetric, ~ExecutionMetric.function_id.in_(select(Function.id)))
+        for granularity, ttl_days in self.rollup_ttl_days.items():
+            if ttl_days > 0:
+                cutoff = bucket_start(now - timedelta(days=ttl_days), "day")
+                result[f"{granularity}_rollups_deleted"] = self._delete_batches(
+                    MetricRollup, MetricRollup.granularity == granularity, MetricRollup.bucket_start < cutoff)
+        self._last_run = now
+        self._last_result = result
+        logger.info("Metric retention finished: %s", result)
+        return result
+
+    def _delete_batches(self, model, *criteria) -> int:
+        deleted = 0
+        while not self._stopped.is_set():
+            db = self.session_factory()
+            try:
+                ids = [row[0] for row in db.query(model.id).filter(*criteria).order_by(model.id)
+                       .limit(self.batch_size).all()]
+                if not ids:
+                    break
+                db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+            deleted += len(ids)
+        return deleted
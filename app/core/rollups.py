@@ -0,0 +1,287 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.sql import Select
+from sqlalchemy.orm import Session
+from app.core.sketch import LatencySketch
+from app.models.function import Runtime
+from app.models.metrics import ExecutionMetric
+from app.models.rollup import MetricRollup
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("minute", "hour", "day")
+GRANULARITY_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+
+RollupKey = Tuple[int, Optional[Runtime], str, datetime]
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+class RollupAggregate:
+    # In-memory counterpart of a MetricRollup row. Both raw metric rows and stored rollups
+    # fold into it, so the writer and the query API share the same merge rules.
+
+    def __init__(self):
+        self.count = 0
+        self.success_count = 0
+        self.timeout_count = 0
+        self.oom_count = 0
+        self.cache_hit_count = 0
+        self.time_sum = 0.0
+        self.time_min: Optional[float] = None
+        self.time_max: Optional[float] = None
+        self.memory_count = 0
+        self.memory_sum = 0.0
+        self.memory_min: Optional[float] = None
+        self.memory_max: Optional[float] = None
+        self.sketch = LatencySketch()
+
+    def add_metric(self, row: Dict[str, Any]) -> None:
+        self.count += 1
+        if row.get("success"):
+            self.success_count += 1
+        if row.get("error_type") == "timeout":
+            self.timeout_count += 1
+        elif row.get("error_type") == "oom":
+            self.oom_count += 1
+        if row.get("cache_hit"):
+            self.cache_hit_count += 1
+        execution_time = row.get("execution_time")
+        if execution_time is not None:
+            self.time_sum += execution_time
+            self.time_min = _min(self.time_min, execution_time)
+            self.time_max = _max(self.time_max, execution_time)
+            self.sketch.add(execution_time)
+        memory_used = row.get("memory_used")
+        if memory_used is not None:
+            self.memory_count += 1
+            self.memory_sum += memory_used
+            self.memory_min = _min(self.memory_min, memory_used)
+            self.memory_max = _max(self.memory_max, memory_used)
+
+    def add_rollup(self, rollup: MetricRollup) -> None:
+        self.count += rollup.count
+        self.success_count += rollup.success_count
+        self.timeout_count += rollup.timeout_count
+        self.oom_count += rollup.oom_count
+        self.cache_hit_count += rollup.cache_hit_count or 0
+        self.time_sum += rollup.time_sum
+        self.time_min = _min(self.time_min, rollup.time_min)
+        self.time_max = _max(self.time_max, rollup.time_max)
+        self.memory_count += rollup.memory_count
+        self.memory_sum += rollup.memory_sum
+        self.memory_min = _min(self.memory_min, rollup.memory_min)
+        self.memory_max = _max(self.memory_max, rollup.memory_max)
+        self.sketch.merge(LatencySketch.from_dict(rollup.time_sketch))
+
+    def apply_to(self, rollup: MetricRollup) -> None:
+        merged = RollupAggregate()
+        merged.add_rollup(rollup)
+        merged.merge(self)
+        rollup.count = merged.count
+        rollup.success_count = merged.success_count
+        rollup.timeout_count = merged.timeout_count
+        rollup.oom_count = merged.oom_count
+        rollup.cache_hit_count = merged.cache_hit_count
+        rollup.time_sum = merged.time_sum
+        rollup.time_min = merged.time_min
+        rollup.time_max = merged.time_max
+        rollup.memory_count = merged.memory_count
+        rollup.memory_sum = merged.memory_sum
+        rollup.memory_min = merged.memory_min
+        rollup.memory_max = merged.memory_max
+        rollup.time_sketch = merged.sketch.to_dict()
+
+    def merge(self, other: "RollupAggregate") -> None:
+        self.count += other.count
+        self.success_count += other.success_count
+        self.timeout_count += other.timeout_count
+        self.oom_count += other.oom_count
+        self.cache_hit_count += other.cache_hit_count
+        self.time_sum += other.time_sum
+        self.time_min = _min(self.time_min, other.time_min)
+        self.time_max = _max(self.time_max, other.time_max)
+        self.memory_count += other.memory_count
+        self.memory_sum += other.memory_sum
+        self.memory_min = _min(self.memory_min, other.memory_min)
+        self.memory_max = _max(self.memory_max, other.memory_max)
+        self.sketch.merge(other.sketch)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "success_count": self.success_count,
+            "success_rate": self.success_count / self.count if self.count else None,
+            "timeout_count": self.timeout_count,
+            "oom_count": self.oom_count,
+            "cache_hit_count": self.cache_hit_count,
+            "cache_hit_rate": self.cache_hit_count / self.count if self.count else None,
+            "avg_execution_time": self.time_sum / self.count if self.count else None,
+            "min_execution_time": self.time_min,
+            "max_execution_time": self.time_max,
+            "p50_execution_time": self.sketch.quantile(0.5),
+            "p90_execution_time": self.sketch.quantile(0.9),
+            "p99_execution_time": self.sketch.quantile(0.99),
+            "avg_memory_used": self.memory_sum / self.memory_count if self.memory_count else None,
+            "min_memory_used": self.memory_min,
+            "max_memory_used": self.memory_max,
+        }
+
+
+def _min(current: Optional[float], value: Optional[float]) -> Optional[float]:
+    if value is None:
+        return current
+    return value if current is None else min(current, value)
+
+
+def _max(current: Optional[float], value: Optional[float]) -> Optional[float]:
+    if value is None:
+        return current
+    return value if current is None else max(current, value)
+
+
+def aggregate_rows(rows: Iterable[Dict[str, Any]]) -> Dict[RollupKey, RollupAggregate]:
+    aggregates: Dict[RollupKey, RollupAggregate] = {}
+    for row in rows:
+        for granularity in GRANULARITIES:
+            key = (row["function_id"], row.get("runtime"), granularity,
+                   bucket_start(row["created_at"], granularity))
+            aggregate = aggregates.get(key)
+            if aggregate is None:
+                aggregate = aggregates[key] = RollupAggregate()
+            aggregate.add_metric(row)
+    return aggregates
+
+
+def apply_rollups(db: Session, rows: List[Dict[str, Any]]) -> None:
+    # Folds a batch of metric rows into the rollup tables inside the caller's transaction,
+    # so a batch and its rollups commit (or roll back) together. Rows are aggregated in
+    # memory first, making this one read-modify-write per touched bucket, not per row.
+    for (function_id, runtime, granularity, start), aggregate in aggregate_rows(rows).items():
+        rollup = (
+            db.query(MetricRollup)
+            .filter(
+                MetricRollup.function_id == function_id,
+                MetricRollup.runtime == runtime if runtime is not None else MetricRollup.runtime.is_(None),
+                MetricRollup.granularity == granularity,
+                MetricRollup.bucket_start == start,
+            )
+            .with_for_update()
+            .first()
+        )
+        if rollup is None:
+            rollup = MetricRollup(function_id=function_id, runtime=runtime, granularity=granularity,
+                                  bucket_start=start, count=0, success_count=0, timeout_count=0, oom_count=0,
+                                  cache_hit_count=0,
+                                  time_sum=0.0, memory_count=0, memory_sum=0.0)
+            db.add(rollup)
+        aggregate.apply_to(rollup)
+        # Flush per bucket so a second row for the same key in this batch finds the pending insert.
+        db.flush()
+
+
+def rebuild_rollups(db: Session, since: Optional[datetime] = None, batch_size: int = 5000) -> int:
+    # Recomputes rollups from raw metrics, e.g. for rows written before rollups existed.
+    # Whole days are rebuilt so no bucket is left half-counted, and never further back than
+    # the oldest raw row, so rollups of days whose raw rows have expired are kept.
+    oldest = db.query(func.min(ExecutionMetric.created_at)).scalar()
+    if oldest is None:
+        return 0
+    since = bucket_start(max(since or oldest, oldest), "day")
+    query = db.query(MetricRollup).filter(MetricRollup.bucket_start >= since)
+    metrics = db.query(ExecutionMetric).filter(ExecutionMetric.created_at >= since)
+    query.delete(synchronize_session=False)
+    rebuilt = 0
+    last_id = 0
+    while True:
+        batch = metrics.filter(ExecutionMetric.id > last_id).order_by(ExecutionMetric.id).limit(batch_size).all()
+        if not batch:
+            break
+        apply_rollups(db, [
+            {
+                "function_id": metric.function_id,
+                "runtime": metric.runtime,
+                "created_at": metric.created_at,
+                "execution_time": metric.execution_time,
+                "memory_used": metric.memory_used,
+                "success": metric.success,
+                "error_type": metric.error_type,
+                "cache_hit": metric.cache_hit,
+            }
+            for metric in batch
+        ])
+        rebuilt += len(batch)
+        last_id = batch[-1].id
+    db.commit()
+    return rebuilt
+
+
+def query_rollups(db: Session, granularity: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  function_id: Optional[int] = None, runtime: Optional[Runtime] = None) -> List[MetricRollup]:
+    query = db.query(MetricRollup).filter(MetricRollup.granularity == granularity)
+    if function_id is not None:
+        query = query.filter(MetricRollup.function_id == function_id)
+    if runtime is not None:
+        query = query.filter(MetricRollup.runtime == runtime)
+    if since is not None:
+        query = query.filter(MetricRollup.bucket_start >= bucket_start(since, granularity))
+    if until is not None:
+        query = query.filter(MetricRollup.bucket_start < until)
+    return query.order_by(MetricRollup.bucket_start).all()
+
+
+def function_totals_statement(function_ids: List[int]) -> Select:
+    # Lifetime totals for many functions in one grouped query over the day rollups. Returned
+    # as a statement so both sync and async sessions can execute it.
+    return (
+        select(
+            MetricRollup.function_id,
+            func.sum(MetricRollup.count),
+            func.sum(MetricRollup.success_count),
+            func.sum(MetricRollup.time_sum),
+            func.max(MetricRollup.time_max),
+        )
+        .where(MetricRollup.granularity == "day", MetricRollup.function_id.in_(function_ids))
+        .group_by(MetricRollup.function_id)
+    )
+
+
+def function_totals(rows: Iterable[Tuple]) -> Dict[int, Dict[str, Any]]:
+    totals = {}
+    for function_id, count, success_count, time_sum, time_max in rows:
+        count, success_count = int(count or 0), int(success_count or 0)
+        totals[function_id] = {
+            "count": count,
+            "success_count": success_count,
+            "success_rate": success_count / count if count else None,
+            "avg_execution_time": time_sum / count if count else None,
+            "max_execution_time": time_max,
+        }
+    return totals
+
+
+def combine(rollups: Iterable[MetricRollup]) -> RollupAggregate:
+    aggregate = RollupAggregate()
+    for rollup in rollups:
+        aggregate.add_rollup(rollup)
+    return aggregate
+
+
+if __name__ == "__main__":
+    from app.core.database import SessionLocal
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        logger.info("Rebuilt rollups from %d metric row(s)", rebuild_rollups(session))
+    finally:
+        session.close()
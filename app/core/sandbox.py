@@ -0,0 +1,197 @@
+import os
+import pwd
+import sys
+import atexit
+import ctypes
+import shutil
+import signal
+import functools
+import logging
+import resource
+import subprocess
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.models.function import Language, Runtime
+from app.core.backends import ContainerBackend, ContainerResult, ContainerSpec
+
+logger = logging.getLogger(__name__)
+
+# The runtimes below run the images' entrypoints (run.* per call, worker.* for the pool) as
+# host processes, so functions keep the same wrapping and frame protocol as in containers.
+# They are much cheaper but only as isolated as rlimits and namespaces make them: meant for
+# trusted functions and local testing, not for untrusted code.
+LOCAL_RUNTIMES = (Runtime.SUBPROCESS, Runtime.PROCESS)
+# Off by default: until set, functions cannot be created with, run on or prewarmed for these runtimes.
+ALLOW_LOCAL_RUNTIMES = os.getenv("ALLOW_LOCAL_RUNTIMES", "false").lower() == "true"
+
+SANDBOX_SCRIPTS_DIR = os.getenv("SANDBOX_SCRIPTS_DIR",
+                                os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+                                    os.path.abspath(__file__)))), "docker"))
+SANDBOX_PYTHON = os.getenv("SANDBOX_PYTHON", sys.executable)
+SANDBOX_NODE = os.getenv("SANDBOX_NODE", "node")
+# auto: use new user/network/IPC namespaces when unshare works on this host; false: never.
+SANDBOX_UNSHARE = os.getenv("SANDBOX_UNSHARE", "auto").lower()
+SANDBOX_MAX_FILE_BYTES = int(os.getenv("SANDBOX_MAX_FILE_BYTES", str(16 * 1024 * 1024)))
+# When the API runs as root, sandboxed processes switch to this user before exec so they never
+# hold root on the host. It must be able to run SANDBOX_PYTHON and SANDBOX_NODE.
+SANDBOX_USER = os.getenv("SANDBOX_USER", "nobody")
+
+PR_SET_NO_NEW_PRIVS = 38
+
+# Loaded up front: preexec functions run between fork and exec and must not call dlopen.
+try:
+    _libc: Optional[ctypes.CDLL] = ctypes.CDLL(None, use_errno=True)
+except OSError:
+    _libc = None
+
+_unshare_prefix: Optional[List[str]] = None
+_credentials: Optional[Tuple[int, int]] = None
+_scripts_dir: Optional[str] = None
+_unshare_lock = threading.Lock()
+
+LANGUAGE_IMAGES = {f"function-{language.value}-base": language for language in Language}
+
+
+def credentials() -> Optional[Tuple[int, int]]:
+    # (uid, gid) sandboxed processes switch to, or None when the API is not root. Looked up
+    # here rather than in the preexec function, which must not touch the user database.
+    global _credentials
+    if os.geteuid() != 0:
+        return None
+    with _unshare_lock:
+        if _credentials is None:
+            try:
+                user = pwd.getpwnam(SANDBOX_USER)
+            except KeyError:
+                raise RuntimeError(f"SANDBOX_USER {SANDBOX_USER!r} does not exist; host-process "
+                                   f"runtimes will not run functions as root") from None
+            if user.pw_uid == 0:
+                raise RuntimeError("SANDBOX_USER must not be root")
+            _credentials = (user.pw_uid, user.pw_gid)
+        return _credentials
+
+
+def _drop_privileges(ids: Optional[Tuple[int, int]]) -> None:
+    if ids is not None:
+        uid, gid = ids
+        os.setgroups([])
+        os.setgid(gid)
+        os.setuid(uid)
+
+
+def unshare_prefix() -> List[str]:
+    # Probed once, as the user functions run as: unprivileged user namespaces are disabled on
+    # some hosts. The user namespace is kept when the API is root, since the processes are not.
+    global _unshare_prefix
+    ids = credentials()
+    with _unshare_lock:
+        if _unshare_prefix is None:
+            _unshare_prefix = []
+            if SANDBOX_UNSHARE != "false":
+                prefix = ["unshare", "--user", "--map-root-user", "--net", "--ipc", "--uts"]
+                try:
+                    subprocess.run(prefix + ["true"], capture_output=True, timeout=5, check=True,
+                                   preexec_fn=functools.partial(_drop_privileges, ids))
+                    _unshare_prefix = prefix
+                except Exception as e:
+                    logger.warning("Namespaces unavailable, host sandboxes run without them: %s", e)
+        return _unshare_prefix
+
+
+def scripts_dir() -> str:
+    # The sandbox user may not be able to read SANDBOX_SCRIPTS_DIR (e.g. a checkout under /root),
+    # so when privileges are dropped the entrypoints are copied once to a read-only directory.
+    global _scripts_dir
+    if credentials() is None:
+        return SANDBOX_SCRIPTS_DIR
+    with _unshare_lock:
+        if _scripts_dir is None:
+            staged = tempfile.mkdtemp(prefix="sandbox-scripts-")
+            atexit.register(shutil.rmtree, staged, True)
+            for language in ("python", "node"):
+                shutil.copytree(os.path.join(SANDBOX_SCRIPTS_DIR, language), os.path.join(staged, language),
+                                ignore=shutil.ignore_patterns("__pycache__", "node_modules"))
+            for root, dirs, files in os.walk(staged):
+                os.chmod(root, 0o755)
+                for name in files:
+                    os.chmod(os.path.join(root, name), 0o644)
+            _scripts_dir = staged
+        return _scripts_dir
+
+
+def script_command(language: Language, entrypoint: str, memory_mb: Optional[int] = None) -> List[str]:
+    if language == Language.JAVASCRIPT:
+        # V8 reserves far more address space than it uses, so node is limited through its heap size.
+        heap = [f"--max-old-space-size={memory_mb}"] if memory_mb else []
+        return [SANDBOX_NODE] + heap + [os.path.join(scripts_dir(), "node", f"{entrypoint}.js")]
+    return [SANDBOX_PYTHON, "-E", "-s", os.path.join(scripts_dir(), "python", f"{entrypoint}.py")]
+
+
+def _limits(language: Language, memory_mb: Optional[int], cpu_seconds: Optional[int]) -> Callable[[], None]:
+    ids = credentials()
+
+    def apply() -> None:
+        if language == Language.PYTHON and memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        if cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (SANDBOX_MAX_FILE_BYTES, SANDBOX_MAX_FILE_BYTES))
+        _drop_privileges(ids)
+        if _libc is not None:
+            _libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0)
+    return apply
+
+
+def process_options(language: Language, memory_mb: Optional[int] = None, cpu_seconds: Optional[int] = None,
+                    env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    # Keyword arguments for subprocess.Popen. The function gets a minimal environment (none of the
+    # API's settings or credentials), its own session so the whole process group can be killed,
+    # and a scratch working directory.
+    return {
+        "env": {"PATH": os.environ.get("PATH", os.defpath), "LANG": "C.UTF-8", "USAGE_CGROUP": "0", **(env or {})},
+        "cwd": tempfile.gettempdir(),
+        "start_new_session": True,
+        "preexec_fn": _limits(language, memory_mb, cpu_seconds),
+    }
+
+
+def worker_command(language: Language, memory_mb: int) -> List[str]:
+    return unshare_prefix() + script_command(language, "worker", memory_mb)
+
+
+def kill_group(process: subprocess.Popen) -> None:
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class SubprocessBackend(ContainerBackend):
+    # Per-call host process with the container's stdin/stdout contract: the engine's
+    # ContainerSpec and request frames are used unchanged.
+    name = "subprocess"
+
+    def info(self) -> Dict[str, Any]:
+        return {"Runtimes": {}, "Namespaces": bool(unshare_prefix())}
+
+    def run(self, spec: ContainerSpec, stdin: Optional[bytes] = None, timeout: Optional[float] = None) -> ContainerResult:
+        language = LANGUAGE_IMAGES[spec.image]
+        cpu_seconds = int(timeout) + 1 if timeout else None
+        process = subprocess.Popen(unshare_prefix() + script_command(language, "run", spec.memory_mb),
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   **process_options(language, spec.memory_mb, cpu_seconds))
+        try:
+            stdout, stderr = process.communicate(stdin or b"", timeout=timeout)
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            kill_group(process)
+            stdout, stderr = process.communicate()
+            timed_out = True
+        stderr_text = stderr.decode(errors="replace")
+        # Report signals the way docker does (128 + signal) so callers see one convention.
+        exit_code = 128 - process.returncode if process.returncode < 0 else process.returncode
+        oom_killed = not timed_out and "JavaScript heap out of memory" in stderr_text
+        return ContainerResult(exit_code, stdout, stderr_text, timed_out=timed_out, oom_killed=oom_killed)
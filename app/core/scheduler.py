@@ -0,0 +1,135 @@
+import os
+import math
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from app.models.function import Runtime
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_RUNTIME_LIMITS = {
+    Runtime.DOCKER: int(os.getenv("SCHEDULER_MAX_CONCURRENCY_DOCKER", "8")),
+    Runtime.GVISOR: int(os.getenv("SCHEDULER_MAX_CONCURRENCY_GVISOR", "4")),
+    Runtime.SUBPROCESS: int(os.getenv("SCHEDULER_MAX_CONCURRENCY_SUBPROCESS", "8")),
+    Runtime.PROCESS: int(os.getenv("SCHEDULER_MAX_CONCURRENCY_PROCESS", "4")),
+}
+SCHEDULER_MAX_PER_FUNCTION = int(os.getenv("SCHEDULER_MAX_PER_FUNCTION", "4"))
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "100"))
+SCHEDULER_MAX_FUNCTION_QUEUE = int(os.getenv("SCHEDULER_MAX_FUNCTION_QUEUE", "20"))
+SCHEDULER_QUEUE_TIMEOUT = float(os.getenv("SCHEDULER_QUEUE_TIMEOUT", "30"))
+
+
+class SchedulerSaturatedError(Exception):
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ExecutionScheduler:
+    def __init__(self, runtime_limits: Optional[Dict[Runtime, int]] = None,
+                 max_per_function: int = SCHEDULER_MAX_PER_FUNCTION, max_queue: int = SCHEDULER_MAX_QUEUE,
+                 max_function_queue: int = SCHEDULER_MAX_FUNCTION_QUEUE, queue_timeout: float = SCHEDULER_QUEUE_TIMEOUT):
+        self.runtime_limits = dict(runtime_limits or SCHEDULER_RUNTIME_LIMITS)
+        self.max_per_function = max_per_function
+        self.max_queue = max_queue
+        self.max_function_queue = max_function_queue
+        self.queue_timeout = queue_timeout
+        # Container runs get their own threads so they never starve FastAPI's threadpool.
+        self._executor = ThreadPoolExecutor(max_workers=sum(self.runtime_limits.values()),
+                                            thread_name_prefix="execution")
+        self._runtime_slots: Dict[Runtime, asyncio.Semaphore] = {}
+        self._function_slots: Dict[int, asyncio.Semaphore] = {}
+        self._function_waiting: Dict[int, int] = {}
+        self._waiting = 0
+        self._running = 0
+        self._avg_duration = 1.0
+
+    def _slots(self, function_id: int, runtime: Runtime) -> List[asyncio.Semaphore]:
+        if runtime not in self._runtime_slots:
+            self._runtime_slots[runtime] = asyncio.Semaphore(self.runtime_limits.get(runtime, 1))
+        if function_id not in self._function_slots:
+            self._function_slots[function_id] = asyncio.Semaphore(self.max_per_function)
+        return [self._function_slots[function_id], self._runtime_slots[runtime]]
+
+    def retry_after(self) -> int:
+        concurrency = max(sum(self.runtime_limits.values()), 1)
+        return max(1, math.ceil(self._avg_duration * (self._waiting + 1) / concurrency))
+
+    async def _acquire(self, slots: List[asyncio.Semaphore], acquired: List[asyncio.Semaphore]) -> None:
+        for slot in slots:
+            await slot.acquire()
+            acquired.append(slot)
+
+    async def _wait_for_slots(self, function_id: int, slots: List[asyncio.Semaphore],
+                              acquired: List[asyncio.Semaphore]) -> None:
+        if self._waiting >= self.max_queue:
+            raise SchedulerSaturatedError("Execution queue is full", 503, self.retry_after())
+        if self._function_waiting.get(function_id, 0) >= self.max_function_queue:
+            raise SchedulerSaturatedError(f"Too many queued executions for function {function_id}", 429,
+                                          self.retry_after())
+
+        self._waiting += 1
+        self._function_waiting[function_id] = self._function_waiting.get(function_id, 0) + 1
+        try:
+            await asyncio.wait_for(self._acquire(slots, acquired), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._release(acquired)
+            raise SchedulerSaturatedError("Timed out waiting for an execution slot", 503, self.retry_after())
+        except BaseException:
+            self._release(acquired)
+            raise
+        finally:
+            self._waiting -= 1
+            self._function_waiting[function_id] -= 1
+            if not self._function_waiting[function_id]:
+                del self._function_waiting[function_id]
+
+    async def submit(self, function_id: int, runtime: Runtime, func: Callable[..., Any], /, *args, **kwargs) -> Any:
+        slots = self._slots(function_id, runtime)
+        acquired: List[asyncio.Semaphore] = []
+        if not any(slot.locked() for slot in slots):
+            # Fast path: free slots are taken without ever entering the admission queue.
+            await self._acquire(slots, acquired)
+        else:
+            await self._wait_for_slots(function_id, slots, acquired)
+
+        loop = asyncio.get_event_loop()
+        start_time = time.monotonic()
+        self._running += 1
+
+        def on_done(_):
+            loop.call_soon_threadsafe(self._finish, acquired, time.monotonic() - start_time)
+
+        try:
+            future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._finish(acquired, 0.0)
+            raise
+        # Slots are released when the thread finishes, even if the client disconnects first.
+        future.add_done_callback(on_done)
+        return await asyncio.wrap_future(future)
+
+    def _finish(self, acquired: List[asyncio.Semaphore], duration: float) -> None:
+        self._running -= 1
+        self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+        self._release(acquired)
+
+    def _release(self, acquired: List[asyncio.Semaphore]) -> None:
+        while acquired:
+            acquired.pop().release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "waiting": self._waiting,
+            "max_queue": self.max_queue,
+            "runtime_limits": {runtime.value: limit for runtime, limit in self.runtime_limits.items()},
+            "avg_duration": round(self._avg_duration, 4),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,84 @@
+import os
+import asyncio
+import threading
+import concurrent.futures
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+STREAM_BUFFER_EVENTS = int(os.getenv("STREAM_BUFFER_EVENTS", "16"))
+
+_END = object()
+
+
+class ThreadEventStream:
+    # Bridges a blocking event generator running on a scheduler thread to an async consumer.
+    # The queue between them is bounded, so a slow client stalls the producer (and through
+    # the warm container's pipe, the function itself) instead of buffering output in memory.
+
+    def __init__(self, produce: Callable[[], Iterator[Dict[str, Any]]], buffer_size: int = STREAM_BUFFER_EVENTS):
+        self._produce = produce
+        self._loop = asyncio.get_event_loop()
+        self._events: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self._cancelled = threading.Event()
+        self._task: Optional[asyncio.Future] = None
+        self._finished = False
+
+    def start(self, submit: Callable[[Callable[[], None]], Any]) -> None:
+        self._task = asyncio.ensure_future(submit(self._pump))
+
+    def _put(self, event: Any) -> bool:
+        future = asyncio.run_coroutine_threadsafe(self._events.put(event), self._loop)
+        while True:
+            try:
+                future.result(timeout=1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if self._cancelled.is_set():
+                    future.cancel()
+                    return False
+
+    def _pump(self) -> None:
+        generator = self._produce()
+        try:
+            for event in generator:
+                if not self._put(event):
+                    return
+        except Exception as e:
+            self._put({"error": str(e)})
+        finally:
+            generator.close()
+            if not self._cancelled.is_set():
+                self._put(_END)
+
+    async def next(self) -> Optional[Dict[str, Any]]:
+        if self._finished:
+            return None
+        getter = asyncio.ensure_future(self._events.get())
+        if not self._task.done():
+            await asyncio.wait({getter, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if not getter.done() and self._task.done() and self._task.exception() is not None:
+            # The producer never ran (e.g. the scheduler rejected it).
+            getter.cancel()
+            raise self._task.exception()
+        event = await getter
+        if event is _END:
+            self._finished = True
+            return None
+        return event
+
+    async def events(self, first: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            if first is not None:
+                yield first
+            while True:
+                event = await self.next()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._cancelled.set()
@@ -0,0 +1,243 @@
+import os
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    # Cumulative-bucket histogram rendered in the Prometheus text exposition format.
+    # Observing is a bisect and a few additions under a lock, cheap enough for every request.
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not TELEMETRY_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # One counter per bucket plus +Inf, then the running sum.
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(snapshot.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = ",".join(labels + ['le="%s"' % le])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative:g}")
+            label_text = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_count{label_text} {cumulative:g}")
+            lines.append(f"{self.name}_sum{label_text} {series[-1]:.6f}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    # Monotonic counter per label set, rendered in the Prometheus text exposition format.
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not TELEMETRY_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._series)
+
+    def collect(self) -> List[str]:
+        return _collect_samples(self.name, self.documentation, "counter", self.labelnames, self.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Gauge:
+    # Current value per label set. replace() swaps the whole set at once, so series of label
+    # values that no longer exist (a function scaled to zero) disappear instead of going stale.
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def replace(self, series: Dict[Tuple, float]) -> None:
+        if not TELEMETRY_ENABLED:
+            return
+        snapshot = {tuple(str(_label(value)) for value in key): value for key, value in series.items()}
+        with self._lock:
+            self._series = snapshot
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            snapshot = dict(self._series)
+        return _collect_samples(self.name, self.documentation, "gauge", self.labelnames, snapshot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series = {}
+
+
+def _collect_samples(name: str, documentation: str, kind: str, labelnames: Tuple[str, ...],
+                     series: Dict[Tuple[str, ...], float]) -> List[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for key, value in sorted(series.items()):
+        labels = ",".join(f'{label}="{_escape(item)}"' for label, item in zip(labelnames, key))
+        lines.append(f"{name}{{{labels}}} {value:g}" if labels else f"{name} {value:g}")
+    return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+PHASE_SECONDS = Histogram(
+    "function_phase_duration_seconds",
+    "Time spent in each phase of a function invocation.",
+    ("function", "language", "runtime", "phase"),
+)
+REQUEST_SECONDS = Histogram(
+    "function_request_duration_seconds",
+    "End-to-end latency of function execution requests, by endpoint.",
+    ("function", "language", "runtime", "endpoint"),
+)
+
+EXECUTION_STARTS = Counter(
+    "function_execution_starts_total",
+    "Executions by whether they found a warm worker or had to start one (per-call containers are always cold).",
+    ("language", "runtime", "start"),
+)
+POOL_TARGET_SLOTS = Gauge(
+    "function_pool_target_slots",
+    "Warm workers the autoscaler keeps ready per pool.",
+    ("language", "runtime", "memory_mb"),
+)
+PREDICTED_RATE = Gauge(
+    "function_predicted_invocations_per_second",
+    "Invocation rate the autoscaler expects per function and runtime.",
+    ("function", "runtime"),
+)
+AGENT_DISPATCHES = Counter(
+    "function_agent_dispatches_total",
+    "Invocations sent to worker agents, by agent and outcome (ok, busy or failed).",
+    ("agent", "outcome"),
+)
+WORKER_AFFINITY = Counter(
+    "function_worker_affinity_total",
+    "Pooled invocations by whether the worker had already run the function's code (hit) or not (miss).",
+    ("language", "runtime", "result"),
+)
+WARM_HIT_RATIO = Gauge(
+    "function_warm_hit_ratio",
+    "Share of pooled invocations, since start, that ran on a worker already holding the function's code.",
+    ("runtime",),
+)
+
+REGISTRY = [PHASE_SECONDS, REQUEST_SECONDS, EXECUTION_STARTS, POOL_TARGET_SLOTS, PREDICTED_RATE, AGENT_DISPATCHES,
+            WORKER_AFFINITY, WARM_HIT_RATIO]
+
+# Container-reported metrics keys and the phase each one is exported as.
+CONTAINER_PHASES = (("startup_time", "startup"), ("code_time", "code"), ("teardown_time", "teardown"))
+
+
+def _label(value) -> str:
+    return getattr(value, "value", value)
+
+
+def observe_phase(phase: str, seconds: float, function_id: Optional[int], language, runtime) -> None:
+    PHASE_SECONDS.observe(seconds, function=function_id, language=_label(language), runtime=_label(runtime),
+                          phase=phase)
+
+
+def observe_request(endpoint: str, seconds: float, function_id: Optional[int], language, runtime) -> None:
+    REQUEST_SECONDS.observe(seconds, function=function_id, language=_label(language), runtime=_label(runtime),
+                            endpoint=endpoint)
+
+
+def observe_execution(function_id: Optional[int], language, runtime, metrics: Dict) -> None:
+    observe_phase("execution", metrics["execution_time"], function_id, language, runtime)
+    for field, phase in CONTAINER_PHASES:
+        if metrics.get(field) is not None:
+            observe_phase(phase, metrics[field], function_id, language, runtime)
+
+
+def observe_start(language, runtime, cold: bool) -> None:
+    EXECUTION_STARTS.inc(language=_label(language), runtime=_label(runtime), start="cold" if cold else "warm")
+
+
+def cold_start_ratio() -> Dict[str, Optional[float]]:
+    # Per runtime, over everything counted since the process started.
+    totals: Dict[str, List[float]] = {}
+    for (language, runtime, start), count in EXECUTION_STARTS.values().items():
+        counts = totals.setdefault(runtime, [0.0, 0.0])
+        counts[start == "cold"] += count
+    return {runtime: round(cold / (warm + cold), 4) if warm + cold else None
+            for runtime, (warm, cold) in totals.items()}
+
+
+def observe_affinity(language, runtime, hit: bool) -> None:
+    WORKER_AFFINITY.inc(language=_label(language), runtime=_label(runtime), result="hit" if hit else "miss")
+    WARM_HIT_RATIO.replace({(runtime,): ratio for runtime, ratio in warm_hit_ratio().items()})
+
+
+def warm_hit_ratio() -> Dict[str, float]:
+    # Per runtime, over everything counted since the process started.
+    totals: Dict[str, List[float]] = {}
+    for (language, runtime, result), count in WORKER_AFFINITY.values().items():
+        counts = totals.setdefault(runtime, [0.0, 0.0])
+        counts[result == "hit"] += count
+    return {runtime: round(hits / (misses + hits), 4) for runtime, (misses, hits) in totals.items()}
+
+
+@contextmanager
+def timed(phase: str, function_id: Optional[int], language, runtime) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(phase, time.perf_counter() - start, function_id, language, runtime)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
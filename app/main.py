@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import functions
-from app.core.database import engine, Base
+from fastapi.responses import JSONResponse, Response
+from app.api import agents, functions, jobs, stats
+from app.core import telemetry
+from app.core.database import engine, Base, pool_stats
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -22,4 +24,53 @@ app.add_middleware(
 )
 
 # Include routers
-app.include_router(functions.router, prefix="/functions", tags=["functions"]) 
\ No newline at end of file
+app.include_router(functions.router, prefix="/functions", tags=["functions"])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+app.include_router(stats.router, prefix="/stats", tags=["stats"])
+app.include_router(agents.router, prefix="/agents", tags=["agents"])
+
+@app.get("/health", tags=["health"])
+def health():
+    status = functions.execution_engine.health.status()
+    status["scheduler"] = functions.scheduler.stats()
+    status["artifacts"] = functions.execution_engine.artifacts.stats()
+    status["function_cache"] = functions.function_cache.stats()
+    status["result_cache"] = functions.execution_engine.results.stats()
+    status["db_pool"] = pool_stats()
+    status["metrics_recorder"] = functions.metric_recorder.stats()
+    status["metrics_retention"] = functions.retention_worker.stats()
+    status["autoscaler"] = functions.autoscaler.stats()
+    status["warm_hit_ratio"] = telemetry.warm_hit_ratio()
+    dispatcher = functions.execution_engine.dispatcher
+    if dispatcher is not None:
+        # Executions run on the agents, so the API is healthy while any agent can take work.
+        status["dispatcher"] = dispatcher.stats()
+        available = status["dispatcher"]["live_agents"] > 0
+    else:
+        available = status["docker"]["available"]
+    status_code = 200 if available else 503
+    return JSONResponse(content=status, status_code=status_code)
+
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+def metrics():
+    return Response(content=telemetry.render(), media_type=telemetry.CONTENT_TYPE)
+
+@app.on_event("startup")
+def start_execution_engine():
+    functions.metric_recorder.start()
+    functions.retention_worker.start()
+    functions.function_cache.start()
+    functions.execution_engine.start()
+    functions.autoscaler.start()
+    functions.job_workers.start()
+
+@app.on_event("shutdown")
+def stop_execution_engine():
+    functions.job_workers.shutdown()
+    functions.autoscaler.shutdown()
+    functions.retention_worker.shutdown()
+    functions.function_cache.shutdown()
+    functions.scheduler.shutdown()
+    functions.execution_engine.shutdown()
+    # Last, so metrics from executions that finished during shutdown are flushed.
+    functions.metric_recorder.shutdown()
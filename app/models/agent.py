@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON
+from datetime import datetime
+from app.core.database import Base
+
+class WorkerAgent(Base):
+    # Registry of worker agents, kept in the database so every API process dispatches from the
+    # same view. Each agent upserts its row on every heartbeat; a row whose heartbeat is older
+    # than AGENT_HEARTBEAT_TIMEOUT is treated as gone.
+    __tablename__ = "worker_agents"
+
+    id = Column(String(64), primary_key=True)
+    url = Column(String(255), nullable=False)  # Base URL the API reaches the agent on
+    capacity = Column(Integer, nullable=False)  # Executions the agent runs at once
+    in_flight = Column(Integer, default=0, nullable=False)  # As of the last heartbeat
+    draining = Column(Boolean, default=False, nullable=False)
+    runtimes = Column(JSON)  # Runtime values the agent can run
+    started_at = Column(DateTime, nullable=True)
+    last_heartbeat = Column(DateTime, default=datetime.utcnow, nullable=False)
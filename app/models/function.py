@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, DateTime
+from sqlalchemy import Column, Integer, String, Enum, DateTime, Boolean
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -11,6 +11,10 @@ class Language(str, enum.Enum):
 class Runtime(str, enum.Enum):
     DOCKER = "docker"
     GVISOR = "gvisor"
+    # Host processes instead of containers, for trusted functions and local testing:
+    # a fresh process per call, or a persistent per-language worker process.
+    SUBPROCESS = "subprocess"
+    PROCESS = "process"
 
 class Function(Base):
     __tablename__ = "functions"
@@ -22,8 +26,12 @@ class Function(Base):
     timeout = Column(Integer, default=30)
     memory_limit = Column(Integer, default=128)
     runtime = Column(Enum(Runtime), default=Runtime.DOCKER)
+    cacheable = Column(Boolean, default=False, nullable=False)  # Pure function: results may be memoized
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # NEW: Relationship to metrics
-    metrics = relationship("ExecutionMetric", back_populates="function", cascade="all, delete-orphan")
+    # Never loaded: accessing it raises, and deletes rely on the foreign key's ON DELETE CASCADE
+    # instead of loading every row.
+    metrics = relationship("ExecutionMetric", back_populates="function", cascade="all, delete-orphan",
+                           lazy="raise", passive_deletes=True)
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, Float, String, Enum, DateTime, ForeignKey, JSON, Index
+from datetime import datetime
+from app.core.database import Base
+import enum
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class ExecutionJob(Base):
+    __tablename__ = "execution_jobs"
+
+    id = Column(String(36), primary_key=True)
+    function_id = Column(Integer, ForeignKey("functions.id", ondelete="CASCADE"), index=True)
+    status = Column(Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    input = Column(JSON)
+    result = Column(JSON, nullable=True)
+    error = Column(String(4096), nullable=True)
+    execution_time = Column(Float, nullable=True)
+    memory_used = Column(Float, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    worker_id = Column(String(64), nullable=True)
+    # A running job whose lease has expired is handed to another worker (at-least-once delivery).
+    lease_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_execution_jobs_status_created_at", "status", "created_at"),
+    )
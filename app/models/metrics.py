@@ -1,18 +1,61 @@
 # models/metrics.py
-from sqlalchemy import Column, Integer, Float, Boolean, ForeignKey, DateTime, String
+from sqlalchemy import Column, Integer, BigInteger, Float, Boolean, ForeignKey, DateTime, String, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
+from app.models.function import Runtime
+
+# Per-invocation counters reported from the container's cgroup and rusage.
+RESOURCE_COUNTERS = (
+    "cpu_user_time", "cpu_system_time", "cpu_throttled_time",
+    "block_read_bytes", "block_write_bytes", "net_rx_bytes", "net_tx_bytes",
+)
+# Resource and phase columns copied from an execution's metrics dict when it is stored.
+RESOURCE_FIELDS = RESOURCE_COUNTERS + ("startup_time", "code_time", "teardown_time")
+
+class ExecutionError(Base):
+    # Error dictionary: each distinct message is stored once and referenced by id, since a
+    # failing function tends to repeat the same error on every call.
+    __tablename__ = "execution_errors"
+
+    id = Column(Integer, primary_key=True)
+    digest = Column(String(64), unique=True, nullable=False)  # sha256 of the message
+    message = Column(Text, nullable=False)
 
 class ExecutionMetric(Base):
     __tablename__ = "function_execution_metrics"
 
     id = Column(Integer, primary_key=True, index=True)
     function_id = Column(Integer, ForeignKey("functions.id", ondelete="CASCADE"))
+    runtime = Column(Enum(Runtime), nullable=True)  # Runtime the call ran under, for per-runtime rollups
     execution_time = Column(Float)  # In milliseconds
     success = Column(Boolean)
-    memory_used = Column(Float)  # In megabytes, optional if available
-    created_at = Column(DateTime, default=datetime.utcnow)
-    error = Column(String, nullable=True)  # Add this if you want to track errors
+    memory_used = Column(Float)  # Peak memory of the invocation, in megabytes
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    error_id = Column(Integer, ForeignKey("execution_errors.id"), nullable=True)
+    error_type = Column(String(16), nullable=True)  # "error", "timeout" or "oom" when the call failed
+    cache_hit = Column(Boolean, default=False, nullable=True)  # Served from the result cache without running
+    cpu_user_time = Column(Float, nullable=True)  # Seconds
+    cpu_system_time = Column(Float, nullable=True)  # Seconds
+    cpu_throttled_time = Column(Float, nullable=True)  # Seconds spent throttled by the CPU quota
+    block_read_bytes = Column(BigInteger, nullable=True)
+    block_write_bytes = Column(BigInteger, nullable=True)
+    net_rx_bytes = Column(BigInteger, nullable=True)
+    net_tx_bytes = Column(BigInteger, nullable=True)
+    startup_time = Column(Float, nullable=True)  # Seconds from request to user code starting
+    code_time = Column(Float, nullable=True)  # Seconds spent in user code
+    teardown_time = Column(Float, nullable=True)  # Seconds from user code finishing to the result
 
     function = relationship("Function", back_populates="metrics")
+    error_entry = relationship("ExecutionError", lazy="joined")
+
+    @property
+    def error(self):
+        return self.error_entry.message if self.error_entry is not None else None
+
+    __table_args__ = (
+        # Backs the cursor-paginated, time-filtered GET /functions/{id}/metrics.
+        Index("ix_execution_metrics_function_created", "function_id", "created_at", "id"),
+        # Lets retention find expired rows without scanning the table.
+        Index("ix_execution_metrics_created", "created_at"),
+    )
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, Float, String, Enum, DateTime, ForeignKey, JSON, Index
+from app.core.database import Base
+from app.models.function import Runtime
+
+class MetricRollup(Base):
+    # Pre-aggregated execution metrics per function, runtime and time bucket. Rows are
+    # updated incrementally as metrics are written, so dashboards never scan raw metrics.
+    __tablename__ = "function_metric_rollups"
+
+    id = Column(Integer, primary_key=True)
+    function_id = Column(Integer, ForeignKey("functions.id", ondelete="CASCADE"), nullable=False)
+    runtime = Column(Enum(Runtime), nullable=True)
+    granularity = Column(String(8), nullable=False)  # "minute", "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+    success_count = Column(Integer, default=0, nullable=False)
+    timeout_count = Column(Integer, default=0, nullable=False)
+    oom_count = Column(Integer, default=0, nullable=False)
+    cache_hit_count = Column(Integer, default=0, nullable=False)
+    time_sum = Column(Float, default=0.0, nullable=False)  # Seconds
+    time_min = Column(Float, nullable=True)
+    time_max = Column(Float, nullable=True)
+    memory_count = Column(Integer, default=0, nullable=False)  # Executions that reported memory
+    memory_sum = Column(Float, default=0.0, nullable=False)  # Megabytes
+    memory_min = Column(Float, nullable=True)
+    memory_max = Column(Float, nullable=True)
+    time_sketch = Column(JSON, nullable=True)  # LatencySketch.to_dict() of execution times
+
+    __table_args__ = (
+        Index("ux_metric_rollups_bucket", "function_id", "runtime", "granularity", "bucket_start", unique=True),
+        Index("ix_metric_rollups_granularity_bucket", "granularity", "bucket_start"),
+    )
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Optional, Any, List
+from datetime import datetime
+from app.models.function import Language, Runtime
+
+class AgentHeartbeat(BaseModel):
+    id: str
+    url: str
+    capacity: int
+    in_flight: int = 0
+    draining: bool = False
+    runtimes: List[Runtime] = []
+    started_at: Optional[datetime] = None
+
+class Agent(AgentHeartbeat):
+    last_heartbeat: datetime
+    live: bool
+
+class AgentExecute(BaseModel):
+    function_id: int
+    code: str
+    language: Language
+    runtime: Runtime
+    timeout: Optional[int] = None
+    memory_limit: Optional[int] = None
+    input: Optional[Any] = None
@@ -1,20 +1,42 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from typing import Optional, Any, List
 from datetime import datetime
 from app.models.function import Language, Runtime
+from app.core.sandbox import ALLOW_LOCAL_RUNTIMES, LOCAL_RUNTIMES
+import enum
 
 # NEW: Schema for metrics
 class ExecutionMetric(BaseModel):
     id: int
     execution_time: float
     success: bool
+    runtime: Optional[Runtime] = None
     memory_used: Optional[float] = None
     created_at: datetime
     error: Optional[str] = None
+    error_type: Optional[str] = None
+    cache_hit: Optional[bool] = None
+    cpu_user_time: Optional[float] = None
+    cpu_system_time: Optional[float] = None
+    cpu_throttled_time: Optional[float] = None
+    block_read_bytes: Optional[int] = None
+    block_write_bytes: Optional[int] = None
+    net_rx_bytes: Optional[int] = None
+    net_tx_bytes: Optional[int] = None
+    startup_time: Optional[float] = None
+    code_time: Optional[float] = None
+    teardown_time: Optional[float] = None
 
     class Config:
         from_attributes = True
 
+class FunctionMetricsSummary(BaseModel):
+    count: int = 0
+    success_count: int = 0
+    success_rate: Optional[float] = None
+    avg_execution_time: Optional[float] = None
+    max_execution_time: Optional[float] = None
+
 class FunctionBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
     code: str = Field(..., min_length=1)
@@ -22,9 +44,17 @@ class FunctionBase(BaseModel):
     timeout: Optional[int] = Field(30, ge=1, le=300)
     memory_limit: Optional[int] = Field(128, ge=64, le=1024)
     runtime: Optional[Runtime] = Field(Runtime.DOCKER)
+    # Opt in to result memoization; only for functions whose output depends on nothing but their input
+    cacheable: Optional[bool] = False
+
+def _check_runtime(runtime: Optional[Runtime]) -> Optional[Runtime]:
+    # Host-process runtimes offer little isolation, so they must be enabled explicitly.
+    if runtime in LOCAL_RUNTIMES and not ALLOW_LOCAL_RUNTIMES:
+        raise ValueError(f"the {runtime.value} runtime is disabled; set ALLOW_LOCAL_RUNTIMES=true to enable it")
+    return runtime
 
 class FunctionCreate(FunctionBase):
-    pass
+    _runtime_allowed = validator("runtime", allow_reuse=True)(_check_runtime)
 
 class FunctionUpdate(FunctionBase):
     name: Optional[str] = Field(None, min_length=1, max_length=255)
@@ -33,17 +63,35 @@ class FunctionUpdate(FunctionBase):
     timeout: Optional[int] = Field(None, ge=1, le=300)
     memory_limit: Optional[int] = Field(None, ge=64, le=1024)
     runtime: Optional[Runtime] = None
+    cacheable: Optional[bool] = None
+
+    _runtime_allowed = validator("runtime", allow_reuse=True)(_check_runtime)
 
 class Function(FunctionBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
 
-    # NEW: List of recent metrics (optional)
-    metrics: Optional[List[ExecutionMetric]] = []
+    # Only filled in when requested; execution history is served by GET /functions/{id}/metrics
+    metrics_summary: Optional[FunctionMetricsSummary] = None
 
     class Config:
         from_attributes = True
 
+class ExecutionMetricPage(BaseModel):
+    items: List[ExecutionMetric]
+    # Pass back as `cursor` to fetch the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
+
 class FunctionExecute(BaseModel):
     input: Any
+
+class FunctionBatchExecute(BaseModel):
+    inputs: List[Any]
+    parallelism: Optional[int] = Field(None, ge=1)
+    # Stream results in input order, or as soon as each one completes
+    ordered: bool = True
+
+class StreamFormat(str, enum.Enum):
+    NDJSON = "ndjson"
+    SSE = "sse"
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import Optional, Any
+from datetime import datetime
+from app.models.job import JobStatus
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: JobStatus
+
+class JobMetrics(BaseModel):
+    execution_time: Optional[float] = None
+    memory_used: Optional[float] = None
+    error: Optional[str] = None
+
+class Job(BaseModel):
+    job_id: str
+    function_id: int
+    status: JobStatus
+    result: Optional[Any] = None
+    metrics: JobMetrics
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,44 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+from app.models.function import Runtime
+import enum
+
+class Granularity(str, enum.Enum):
+    MINUTE = "minute"
+    HOUR = "hour"
+    DAY = "day"
+
+class MetricSummary(BaseModel):
+    count: int
+    success_count: int
+    success_rate: Optional[float] = None
+    timeout_count: int
+    oom_count: int
+    cache_hit_count: int = 0
+    cache_hit_rate: Optional[float] = None
+    avg_execution_time: Optional[float] = None
+    min_execution_time: Optional[float] = None
+    max_execution_time: Optional[float] = None
+    p50_execution_time: Optional[float] = None
+    p90_execution_time: Optional[float] = None
+    p99_execution_time: Optional[float] = None
+    avg_memory_used: Optional[float] = None
+    min_memory_used: Optional[float] = None
+    max_memory_used: Optional[float] = None
+
+class FunctionSummary(MetricSummary):
+    function_id: int
+
+class RuntimeSummary(MetricSummary):
+    runtime: Optional[Runtime] = None
+
+class SeriesPoint(MetricSummary):
+    bucket_start: datetime
+
+class FunctionStats(BaseModel):
+    function_id: int
+    granularity: Granularity
+    summary: MetricSummary
+    runtimes: List[RuntimeSummary]
+    series: List[SeriesPoint]
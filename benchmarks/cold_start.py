@@ -0,0 +1,70 @@
+"""Time-to-first-byte of the per-call `docker run` path against the warm fork-server pool.
+
+Run from the repository root with Docker and the function-*-base images available:
+
+    python -m benchmarks.cold_start --language python --runtime docker -n 20
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List
+from app.core import pool
+from app.core.execution import FunctionExecutionEngine
+from app.models.function import Language, Runtime
+
+HANDLERS = {
+    Language.PYTHON: "return {'echo': input_data}",
+    Language.JAVASCRIPT: "return { echo: input_data };",
+}
+
+
+def time_to_first_event(engine: FunctionExecutionEngine, language: Language, runtime: Runtime,
+                        iterations: int) -> List[float]:
+    samples = []
+    for index in range(iterations):
+        start = time.perf_counter()
+        events = engine.execute_stream(0, HANDLERS[language], language, {"n": index}, runtime)
+        next(events)
+        samples.append(time.perf_counter() - start)
+        events.close()
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "min_ms": round(ordered[0] * 1000, 2),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def run_mode(name: str, use_pool: bool, fork_server: bool, language: Language, runtime: Runtime,
+             iterations: int) -> None:
+    pool.POOL_FORK_SERVER = fork_server
+    engine = FunctionExecutionEngine(use_pool=use_pool)
+    engine.start()
+    try:
+        if use_pool:
+            # The first call pays for starting the worker container; measure steady state.
+            time_to_first_event(engine, language, runtime, 1)
+        print(name, summarize(time_to_first_event(engine, language, runtime, iterations)))
+    finally:
+        engine.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--language", type=Language, default=Language.PYTHON)
+    parser.add_argument("--runtime", type=Runtime, default=Runtime.DOCKER)
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    run_mode("docker run", False, False, args.language, args.runtime, args.iterations)
+    run_mode("warm pool", True, False, args.language, args.runtime, args.iterations)
+    run_mode("warm pool + fork server", True, True, args.language, args.runtime, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
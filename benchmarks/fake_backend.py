@@ -0,0 +1,35 @@
+"""Docker-free stand-in for the container backend, so the docker and gvisor runtimes can be benchmarked anywhere.
+
+Per-call containers and warm pool workers become host processes running the images' entrypoints,
+exactly as the subprocess and process runtimes do (app/core/sandbox.py), so the frame protocol,
+wrapping and result parsing are exercised as in production. Isolation, cgroup limits and container
+start-up are not, which makes the numbers a measure of the platform's own overhead only.
+
+install() must run before app.main is imported, since the API builds its engine at import time.
+"""
+from typing import Any, Dict, List
+from app.core import backends, execution, health, pool, sandbox
+from app.core.backends import ContainerBackend
+from app.core.sandbox import SubprocessBackend
+
+
+class FakeContainerBackend(SubprocessBackend):
+    name = "fake"
+
+    def info(self) -> Dict[str, Any]:
+        # Report gVisor as installed so both container runtimes can be benchmarked.
+        return {"Runtimes": {"runc": {}, "runsc": {}}}
+
+
+def _worker_cmd(self: pool.WarmContainer) -> List[str]:
+    env = ["env", "WORKER_FORK=1", "USAGE_CGROUP=0"] if pool.POOL_FORK_SERVER else ["env", "USAGE_CGROUP=0"]
+    return env + sandbox.script_command(self.language, "worker")
+
+
+def install() -> None:
+    def get_backend(name: str = backends.CONTAINER_BACKEND) -> ContainerBackend:
+        return FakeContainerBackend()
+
+    # Both modules imported get_backend by name, so each reference is replaced.
+    backends.get_backend = execution.get_backend = health.get_backend = get_backend
+    pool.WarmContainer._docker_cmd = _worker_cmd
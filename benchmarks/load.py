@@ -0,0 +1,357 @@
+"""Throughput and latency of the execution path under load, with JSON output for comparing commits.
+
+Runs the example functions against FunctionExecutionEngine directly (--target engine) or through
+POST /functions/{id}/execute (--target api, against --url or an in-process app). Load is either
+closed-loop (--concurrency clients, each waiting for its previous call) or open-loop (--rate
+Poisson arrivals per second; latency counts from the scheduled arrival, so a backed-up system is
+not hidden by the client slowing down). Run from the repository root:
+
+    python -m benchmarks.load --scenario warm --concurrency 8 --requests 500 --output warm.json
+    python -m benchmarks.load --rate 50 --duration 30 --workload fibonacci --runtime gvisor
+    python -m benchmarks.load --target api --url http://localhost:8000 --requests 200
+    python -m benchmarks.load --fake --requests 200 --output head.json --compare base.json
+
+--fake runs the docker/gvisor runtimes without Docker (see benchmarks/fake_backend.py); the
+subprocess and process runtimes never need it, but both targets refuse them unless
+ALLOW_LOCAL_RUNTIMES=true (set on the server for --target api --url). --compare exits non-zero when throughput or p50/p99 latency regress by more than
+--threshold against a previous --output.
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import platform
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.models.function import Language, Runtime
+from benchmarks.workloads import WORKLOADS
+
+# Client-observed latency, then the phases the platform reports in each call's metrics.
+PHASES = ("total", "execution_time", "startup_time", "code_time", "teardown_time")
+PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999))
+# Compared against the baseline; for throughput lower is worse, for latency higher is.
+REGRESSION_CHECKS = (("throughput_rps", None, -1), ("p50_ms", "total", 1), ("p99_ms", "total", 1))
+MAX_ERRORS_KEPT = 5
+
+Invoke = Callable[[], Dict[str, Any]]
+
+
+@dataclass
+class Run:
+    latencies: List[float] = field(default_factory=list)
+    metrics: List[Dict[str, Any]] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    error_count: int = 0
+    started: float = 0.0
+    finished: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def call(self, invoke: Invoke, scheduled: Optional[float] = None) -> None:
+        start = time.perf_counter()
+        try:
+            metrics = invoke()
+        except Exception as e:
+            with self.lock:
+                self.error_count += 1
+                if len(self.errors) < MAX_ERRORS_KEPT:
+                    self.errors.append(str(e))
+            return
+        latency = time.perf_counter() - (scheduled if scheduled is not None else start)
+        with self.lock:
+            self.latencies.append(latency)
+            self.metrics.append(metrics)
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    # Nearest rank, so p999 of fewer than 1000 samples is the maximum rather than an interpolation.
+    return ordered[min(len(ordered) - 1, max(math.ceil(q * len(ordered)) - 1, 0))]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    summary = {"count": len(ordered), "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+               "min_ms": round(ordered[0] * 1000, 2)}
+    for name, q in PERCENTILES:
+        summary[f"{name}_ms"] = round(percentile(ordered, q) * 1000, 2)
+    summary["max_ms"] = round(ordered[-1] * 1000, 2)
+    return summary
+
+
+def closed_loop(invoke: Invoke, concurrency: int, requests: Optional[int], duration: Optional[float]) -> Run:
+    run = Run()
+    remaining = [requests]
+    counter = threading.Lock()
+
+    def client(deadline: Optional[float]) -> None:
+        while deadline is None or time.perf_counter() < deadline:
+            if requests is not None:
+                with counter:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            run.call(invoke)
+
+    run.started = time.perf_counter()
+    deadline = run.started + duration if duration else None
+    threads = [threading.Thread(target=client, args=(deadline,), daemon=True) for _ in range(max(concurrency, 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    run.finished = time.perf_counter()
+    return run
+
+
+def open_loop(invoke: Invoke, rate: float, requests: Optional[int], duration: Optional[float],
+              max_in_flight: int, seed: int) -> Run:
+    # Arrivals follow a fixed Poisson schedule regardless of how fast calls complete. Calls that
+    # cannot start because max_in_flight are busy wait in the executor's queue, and that wait
+    # counts towards their latency.
+    run = Run()
+    arrivals = random.Random(seed)
+    executor = ThreadPoolExecutor(max_workers=max(max_in_flight, 1))
+    run.started = time.perf_counter()
+    scheduled, sent = run.started, 0
+    try:
+        while requests is None or sent < requests:
+            scheduled += arrivals.expovariate(rate)
+            if duration and scheduled - run.started > duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(run.call, invoke, scheduled)
+            sent += 1
+    finally:
+        executor.shutdown(wait=True)
+    run.finished = time.perf_counter()
+    return run
+
+
+class EngineTarget:
+    # Calls FunctionExecutionEngine in-process: no HTTP, scheduler or database in the path.
+    # Cold runs a container per call; warm serves calls from the pre-started pool.
+
+    def __init__(self, scenario: str):
+        from app.core.execution import FunctionExecutionEngine
+        self.engine = FunctionExecutionEngine(use_pool=scenario == "warm")
+        self.engine.start()
+        self._ids = iter(range(1_000_000, 2_000_000))
+
+    def prepare(self, workload: str, language: Language, runtime: Runtime) -> Invoke:
+        code, input_data, function_id = WORKLOADS[workload][language], WORKLOADS[workload]["input"], next(self._ids)
+
+        def invoke() -> Dict[str, Any]:
+            output, metrics = self.engine.execute(function_id, code, language, input_data, runtime)
+            if metrics["error"] is not None:
+                raise Exception(f"{metrics['error_type']}: {metrics['error']}")
+            return metrics
+        return invoke
+
+    def close(self) -> None:
+        self.engine.shutdown()
+
+
+class APITarget:
+    # Creates each workload as a function, then calls its execute endpoint. Without a URL the app
+    # is served in-process, which also honours --fake and --scenario; a remote server runs with
+    # whatever backend and pool settings it was started with.
+
+    def __init__(self, url: Optional[str], scenario: str):
+        self._client: Any = None
+        self._created: List[int] = []
+        if url:
+            import requests
+            self._session = requests.Session()
+            self._base = url.rstrip("/")
+        else:
+            os.environ["POOL_ENABLED"] = "true" if scenario == "warm" else "false"
+            from fastapi.testclient import TestClient
+            from app.main import app
+            self._client = TestClient(app)
+            self._client.__enter__()
+            self._session, self._base = self._client, ""
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self._session.post(f"{self._base}{path}", json=payload)
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def prepare(self, workload: str, language: Language, runtime: Runtime) -> Invoke:
+        function = self._post("/functions/", {
+            "name": f"bench-{workload}-{language.value}-{uuid.uuid4().hex[:8]}",
+            "code": WORKLOADS[workload][language],
+            "language": language.value,
+            "runtime": runtime.value,
+        })
+        self._created.append(function["id"])
+        path, payload = f"/functions/{function['id']}/execute", {"input": WORKLOADS[workload]["input"]}
+
+        def invoke() -> Dict[str, Any]:
+            metrics = self._post(path, payload)["metrics"]
+            if metrics["error"] is not None:
+                raise Exception(f"{metrics['error_type']}: {metrics['error']}")
+            return metrics
+        return invoke
+
+    def close(self) -> None:
+        for function_id in self._created:
+            try:
+                self._session.delete(f"{self._base}/functions/{function_id}")
+            except Exception:
+                pass
+        if self._client is not None:
+            self._client.__exit__(None, None, None)
+
+
+def report(run: Run) -> Dict[str, Any]:
+    elapsed = max(run.finished - run.started, 1e-9)
+    phases = {"total": summarize(run.latencies)}
+    for phase in PHASES[1:]:
+        phases[phase] = summarize([m[phase] for m in run.metrics if m.get(phase) is not None])
+    return {
+        "requests": len(run.latencies) + run.error_count,
+        "errors": run.error_count,
+        "error_samples": run.errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(run.latencies) / elapsed, 2),
+        "phases": phases,
+    }
+
+
+def result_key(result: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (result["target"], result["scenario"], result["workload"], result["language"], result["runtime"],
+            result["load"])
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = {result_key(result): result for result in json.load(f)["results"]}
+    regressed = False
+    for result in results:
+        before = baseline.get(result_key(result))
+        if before is None:
+            print(f"{'/'.join(map(str, result_key(result)))}: not in baseline")
+            continue
+        for metric, phase, direction in REGRESSION_CHECKS:
+            old = before["phases"][phase].get(metric) if phase else before.get(metric)
+            new = result["phases"][phase].get(metric) if phase else result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change * direction > threshold
+            regressed = regressed or worse
+            print(f"{result['workload']}/{result['language']}/{result['runtime']} {phase or ''} {metric}: "
+                  f"{old} -> {new} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+    return regressed
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=("engine", "api"), default="engine")
+    parser.add_argument("--url", help="API base URL for --target api; omit to serve the app in-process")
+    parser.add_argument("--scenario", choices=("cold", "warm"), default="warm",
+                        help="cold: a container per call; warm: the pre-started pool")
+    parser.add_argument("--workload", action="append", choices=sorted(WORKLOADS),
+                        help="repeatable (default: hello_world, fibonacci, json_processor)")
+    parser.add_argument("--language", action="append", type=Language, help="repeatable (default: python)")
+    parser.add_argument("--runtime", action="append", type=Runtime, help="repeatable (default: docker)")
+    parser.add_argument("--concurrency", type=int, default=1, help="closed-loop clients")
+    parser.add_argument("--rate", type=float, help="open-loop arrivals per second (overrides --concurrency)")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="open-loop cap on concurrent calls")
+    parser.add_argument("-n", "--requests", type=int, help="calls per workload (default 100 without --duration)")
+    parser.add_argument("--duration", type=float, help="seconds per workload")
+    parser.add_argument("--warmup", type=int, help="unmeasured calls per workload (default: --concurrency)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for open-loop arrival times")
+    parser.add_argument("--fake", action="store_true", help="run the in-container scripts as local processes")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from a previous --output")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    requests = args.requests if args.requests or args.duration else 100
+    workloads = args.workload or ["hello_world", "fibonacci", "json_processor"]
+    languages = args.language or [Language.PYTHON]
+    runtimes = args.runtime or [Runtime.DOCKER]
+    load = {"rate": args.rate, "max_in_flight": args.max_in_flight} if args.rate else {"concurrency": args.concurrency}
+    warmup = args.concurrency if args.warmup is None else args.warmup
+    if not args.url:
+        # Checked here too, so the run stops before any workload instead of failing every call.
+        from app.core.sandbox import ALLOW_LOCAL_RUNTIMES, LOCAL_RUNTIMES
+        local = [runtime.value for runtime in runtimes if runtime in LOCAL_RUNTIMES]
+        if local and not ALLOW_LOCAL_RUNTIMES:
+            parser.error(f"the {', '.join(local)} runtime(s) need ALLOW_LOCAL_RUNTIMES=true")
+
+    if args.fake:
+        from benchmarks import fake_backend
+        fake_backend.install()
+    target = EngineTarget(args.scenario) if args.target == "engine" else APITarget(args.url, args.scenario)
+    results = []
+    try:
+        for workload in workloads:
+            for language in languages:
+                if language not in WORKLOADS[workload]:
+                    continue
+                for runtime in runtimes:
+                    invoke = target.prepare(workload, language, runtime)
+                    if warmup:
+                        closed_loop(invoke, args.concurrency, warmup, None)
+                    if args.rate:
+                        run = open_loop(invoke, args.rate, requests, args.duration, args.max_in_flight, args.seed)
+                    else:
+                        run = closed_loop(invoke, args.concurrency, requests, args.duration)
+                    result = {
+                        "target": args.target if not args.url else "api-remote",
+                        "scenario": args.scenario,
+                        "workload": workload,
+                        "language": language.value,
+                        "runtime": runtime.value,
+                        "load": "rate={rate}".format(**load) if args.rate else "concurrency={concurrency}".format(**load),
+                        **report(run),
+                    }
+                    results.append(result)
+                    total = result["phases"]["total"]
+                    print(f"{workload}/{language.value}/{runtime.value}: {result['throughput_rps']} req/s, "
+                          f"p50 {total.get('p50_ms')}ms p99 {total.get('p99_ms')}ms, {result['errors']} errors")
+    finally:
+        target.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "commit": git_commit(),
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "fake_backend": args.fake,
+                    "args": vars(args),
+                    "load": load,
+                },
+                "results": results,
+            }, f, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Example functions shipped with the UI (see frontend.py), used as benchmark workloads."""
+from app.models.function import Language
+
+WORKLOADS = {
+    "hello_world": {
+        "input": {'name': 'Bob'},
+        Language.PYTHON: 'return f\'Hello, {input_data["name"]}!\'',
+        Language.JAVASCRIPT: 'return `Hello, ${input_data.name}!`;',
+    },
+    "calculator": {
+        "input": {'operation': 'add', 'num1': 10, 'num2': 5},
+        Language.PYTHON: "operation = input_data.get('operation', 'add')\nnum1 = input_data.get('num1', 0)\nnum2 = input_data.get('num2', 0)\n\nif operation == 'add':\n    return num1 + num2\nelif operation == 'subtract':\n    return num1 - num2\nelif operation == 'multiply':\n    return num1 * num2\nelif operation == 'divide':\n    return num1 / num2 if num2 != 0 else 'Error: Division by zero'\nelse:\n    return 'Error: Invalid operation'",
+        Language.JAVASCRIPT: "const operation = input_data.operation || 'add';\nconst num1 = input_data.num1 || 0;\nconst num2 = input_data.num2 || 0;\n\nswitch(operation) {\n  case 'add':\n    return num1 + num2;\n  case 'subtract':\n    return num1 - num2;\n  case 'multiply':\n    return num1 * num2;\n  case 'divide':\n    return num2 !== 0 ? num1 / num2 : 'Error: Division by zero';\n  default:\n    return 'Error: Invalid operation';\n}",
+    },
+    "fibonacci": {
+        "input": {'n': 10},
+        Language.PYTHON: "def fib(n):\n    if n <= 1:\n        return n\n    else:\n        return fib(n-1) + fib(n-2)\n\nn = input_data.get('n', 10)\nreturn fib(n)",
+        Language.JAVASCRIPT: 'function fib(n) {\n  if (n <= 1) return n;\n  return fib(n-1) + fib(n-2);\n}\n\nconst n = input_data.n || 10;\nreturn fib(n);',
+    },
+    "string_manipulation": {
+        "input": {'text': 'Hello World', 'operation': 'uppercase'},
+        Language.PYTHON: "text = input_data.get('text', '')\noperation = input_data.get('operation', 'reverse')\n\nif operation == 'reverse':\n    return text[::-1]\nelif operation == 'uppercase':\n    return text.upper()\nelif operation == 'lowercase':\n    return text.lower()\nelif operation == 'length':\n    return len(text)\nelse:\n    return 'Error: Invalid operation'",
+        Language.JAVASCRIPT: "const text = input_data.text || '';\nconst operation = input_data.operation || 'reverse';\n\nswitch(operation) {\n  case 'reverse':\n    return text.split('').reverse().join('');\n  case 'uppercase':\n    return text.toUpperCase();\n  case 'lowercase':\n    return text.toLowerCase();\n  case 'length':\n    return text.length;\n  default:\n    return 'Error: Invalid operation';\n}",
+    },
+    "json_processor": {
+        "input": {'data': {'name': 'John', 'age': 30, 'city': 'New York'}, 'operation': 'keys'},
+        Language.PYTHON: "data = input_data.get('data', {})\noperation = input_data.get('operation', 'keys')\n\nif operation == 'keys':\n    return list(data.keys())\nelif operation == 'values':\n    return list(data.values())\nelif operation == 'count':\n    return len(data)\nelse:\n    return 'Error: Invalid operation'",
+        Language.JAVASCRIPT: "const data = input_data.data || {};\nconst operation = input_data.operation || 'keys';\n\nswitch(operation) {\n  case 'keys':\n    return Object.keys(data);\n  case 'values':\n    return Object.values(data);\n  case 'count':\n    return Object.keys(data).length;\n  default:\n    return 'Error: Invalid operation';\n}",
+    },
+    "array_operations": {
+        "input": {'array': [1, 5, 3, 9, 2, 8, 4, 7, 6], 'operation': 'sum'},
+        Language.JAVASCRIPT: "const array = input_data.array || [];\nconst operation = input_data.operation || 'sum';\n\nswitch(operation) {\n  case 'sum':\n    return array.reduce((sum, val) => sum + val, 0);\n  case 'average':\n    return array.length > 0 ? array.reduce((sum, val) => sum + val, 0) / array.length : 0;\n  case 'max':\n    return array.length > 0 ? Math.max(...array) : null;\n  case 'min':\n    return array.length > 0 ? Math.min(...array) : null;\n  case 'sort':\n    return [...array].sort((a, b) => a - b);\n  default:\n    return 'Error: Invalid operation';\n}",
+    },
+    "date_formatting": {
+        "input": {'date': '2023-01-15T12:30:45Z', 'format': 'locale'},
+        Language.JAVASCRIPT: "const date = new Date(input_data.date || Date.now());\nconst format = input_data.format || 'iso';\n\nswitch(format) {\n  case 'iso':\n    return date.toISOString();\n  case 'locale':\n    return date.toLocaleDateString();\n  case 'time':\n    return date.toLocaleTimeString();\n  case 'datetime':\n    return date.toLocaleString();\n  case 'unix':\n    return Math.floor(date.getTime() / 1000);\n  default:\n    return 'Error: Invalid format';\n}",
+    },
+}
@@ -1,6 +1,8 @@
 import os
 from sqlalchemy import create_engine
 from app.models.function import Base
+# Import the remaining models so their tables are registered on Base
+from app.models import metrics, job, rollup, agent  # noqa: F401
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -0,0 +1,4 @@
+// Names function code can use besides input_data. The per-call entrypoint
+// (run.js) and the warm pool worker (worker.js) both pass exactly these, in
+// this order, so a handler behaves the same whichever path runs it.
+exports.HANDLER_GLOBALS = ['require', 'readFrame', 'writeFrame'];
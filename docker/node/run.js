@@ -1,18 +1,67 @@
 const fs = require('fs');
+const usage = require('./usage');
+const { HANDLER_GLOBALS } = require('./prelude');
 
-try {
-    // Read input from file
-    const inputData = JSON.parse(fs.readFileSync('/app/input.json', 'utf8'));
+// Per-invocation entrypoint. stdin carries length-prefixed frames (4-byte
+// big-endian size + JSON): first {"source": <wrapped function>}, then the
+// limits ({"timeout": <seconds>}, enforced by the host killing the container),
+// then the function input. The wrapped source reads the input with readFrame() and
+// writes its result with writeFrame(), so no files are mounted or written.
+// A {"usage": ...} frame with the container's resource usage follows the result.
+
+// Keep stdout for the protocol; anything user code logs goes to stderr.
+console.log = console.error;
 
-    // Import and execute function
-    const { handler } = require('./function.js');
-    const result = handler(inputData);
+function readExact(size) {
+    const buffer = Buffer.alloc(size);
+    let offset = 0;
+    while (offset < size) {
+        let read;
+        try {
+            read = fs.readSync(0, buffer, offset, size - offset, null);
+        } catch (error) {
+            if (error.code === 'EAGAIN') {
+                continue;
+            }
+            throw error;
+        }
+        if (read === 0) {
+            return null;
+        }
+        offset += read;
+    }
+    return buffer;
+}
 
-    // Ensure result is JSON serializable
-    const output = typeof result === 'object' ? result : { output: result };
+function readFrame() {
+    const header = readExact(4);
+    if (header === null) {
+        return null;
+    }
+    const payload = readExact(header.readUInt32BE(0));
+    return payload === null ? null : JSON.parse(payload.toString('utf8'));
+}
 
-    // Write output
-    fs.writeFileSync('/app/output.json', JSON.stringify(output));
+function writeFrame(message) {
+    const body = Buffer.from(JSON.stringify(message === undefined ? null : message), 'utf8');
+    const header = Buffer.alloc(4);
+    header.writeUInt32BE(body.length, 0);
+    fs.writeSync(1, Buffer.concat([header, body]));
+}
+
+const before = usage.processStartSnapshot();
+try {
+    const request = readFrame();
+    readFrame();
+    const globals = { require, readFrame, writeFrame };
+    const run = new Function(...HANDLER_GLOBALS, request.source);
+    run(...HANDLER_GLOBALS.map((name) => globals[name]));
 } catch (error) {
-    fs.writeFileSync('/app/output.json', JSON.stringify({ error: error.message }));
-} 
\ No newline at end of file
+    writeFrame({ error: error.message });
+} finally {
+    try {
+        writeFrame({ usage: usage.measure(before) });
+    } catch (error) {
+        // Usage is best effort; the result has already been written.
+    }
+}
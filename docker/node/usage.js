@@ -0,0 +1,156 @@
+const fs = require('fs');
+
+// Resource usage of one invocation, measured from inside the container. Counters
+// come from process.resourceUsage() and the container's cgroup (v2, falling back
+// to v1); the host turns the {"usage": ...} frame into metric columns.
+
+const CGROUP_V2 = '/sys/fs/cgroup';
+const CGROUP_V1 = {
+    memory: '/sys/fs/cgroup/memory',
+    cpu: '/sys/fs/cgroup/cpu,cpuacct',
+    blkio: '/sys/fs/cgroup/blkio',
+};
+// Host-process sandboxes share the host's cgroup, whose counters are not the
+// function's; they set USAGE_CGROUP=0 so only per-process counters are reported.
+const USE_CGROUP = process.env.USAGE_CGROUP !== '0';
+
+function readFile(path) {
+    try {
+        return fs.readFileSync(path, 'utf8');
+    } catch (error) {
+        return null;
+    }
+}
+
+function readInt(path) {
+    const value = parseInt(readFile(path), 10);
+    return Number.isNaN(value) ? null : value;
+}
+
+function readKeyed(path) {
+    const values = {};
+    for (const line of (readFile(path) || '').split('\n')) {
+        const parts = line.trim().split(/\s+/);
+        if (parts.length === 2 && /^\d+$/.test(parts[1])) {
+            values[parts[0]] = parseInt(parts[1], 10);
+        }
+    }
+    return values;
+}
+
+function cgroupPeakMemory() {
+    if (!USE_CGROUP) {
+        return null;
+    }
+    const peak = readInt(`${CGROUP_V2}/memory.peak`);
+    return peak !== null ? peak : readInt(`${CGROUP_V1.memory}/memory.max_usage_in_bytes`);
+}
+
+function cgroupThrottledSeconds() {
+    if (!USE_CGROUP) {
+        return 0;
+    }
+    let stat = readKeyed(`${CGROUP_V2}/cpu.stat`);
+    if ('throttled_usec' in stat) {
+        return stat.throttled_usec / 1e6;
+    }
+    stat = readKeyed(`${CGROUP_V1.cpu}/cpu.stat`);
+    return 'throttled_time' in stat ? stat.throttled_time / 1e9 : 0;
+}
+
+function cgroupBlockIO() {
+    let readBytes = 0;
+    let writeBytes = 0;
+    if (!USE_CGROUP) {
+        return [readBytes, writeBytes];
+    }
+    const text = readFile(`${CGROUP_V2}/io.stat`);
+    if (text !== null) {
+        // "<major>:<minor> rbytes=... wbytes=... rios=... wios=..."
+        for (const line of text.split('\n')) {
+            for (const field of line.trim().split(/\s+/).slice(1)) {
+                const [key, value] = field.split('=');
+                if (key === 'rbytes') {
+                    readBytes += parseInt(value, 10);
+                } else if (key === 'wbytes') {
+                    writeBytes += parseInt(value, 10);
+                }
+            }
+        }
+        return [readBytes, writeBytes];
+    }
+    for (const line of (readFile(`${CGROUP_V1.blkio}/blkio.throttle.io_service_bytes`) || '').split('\n')) {
+        const parts = line.trim().split(/\s+/);
+        if (parts.length === 3 && parts[1] === 'Read') {
+            readBytes += parseInt(parts[2], 10);
+        } else if (parts.length === 3 && parts[1] === 'Write') {
+            writeBytes += parseInt(parts[2], 10);
+        }
+    }
+    return [readBytes, writeBytes];
+}
+
+function networkIO() {
+    let rx = 0;
+    let tx = 0;
+    for (const line of (readFile('/proc/self/net/dev') || '').split('\n').slice(2)) {
+        const [name, counters] = line.split(':');
+        const fields = (counters || '').trim().split(/\s+/);
+        if (name.trim() !== 'lo' && fields.length >= 9) {
+            rx += parseInt(fields[0], 10);
+            tx += parseInt(fields[8], 10);
+        }
+    }
+    return [rx, tx];
+}
+
+function snapshot() {
+    const usage = process.resourceUsage();
+    const [blockRead, blockWrite] = cgroupBlockIO();
+    const [netRx, netTx] = networkIO();
+    return {
+        wall: Date.now() / 1000,
+        clock: Number(process.hrtime.bigint()) / 1e9,
+        cpu_user_time: usage.userCPUTime / 1e6,
+        cpu_system_time: usage.systemCPUTime / 1e6,
+        cpu_throttled_time: cgroupThrottledSeconds(),
+        block_read_bytes: blockRead,
+        block_write_bytes: blockWrite,
+        net_rx_bytes: netRx,
+        net_tx_bytes: netTx,
+    };
+}
+
+function measure(before, perProcessPeak = false) {
+    // A per-call container lives for one invocation, so the cgroup's peak is
+    // the invocation's. Warm workers share their cgroup across calls and report
+    // this process's peak RSS instead (maxRSS is in KiB).
+    const after = snapshot();
+    let peak = perProcessPeak ? null : cgroupPeakMemory();
+    if (peak === null) {
+        peak = process.resourceUsage().maxRSS * 1024;
+    }
+    const usage = {};
+    for (const key of Object.keys(after)) {
+        if (key !== 'wall' && key !== 'clock') {
+            usage[key] = after[key] - before[key];
+        }
+    }
+    usage.peak_memory_bytes = peak;
+    usage.code_started_at = before.wall;
+    usage.code_time = after.clock - before.clock;
+    return usage;
+}
+
+function processStartSnapshot() {
+    // The per-call entrypoint counts everything since the interpreter started.
+    const before = snapshot();
+    for (const key of Object.keys(before)) {
+        if (key !== 'wall' && key !== 'clock') {
+            before[key] = 0;
+        }
+    }
+    return before;
+}
+
+module.exports = { snapshot, measure, processStartSnapshot };
@@ -0,0 +1,117 @@
+// Long-lived worker used by the warm container pool. Messages on stdin and
+// stdout are length-prefixed frames (4-byte big-endian size + JSON). Each
+// request frame is one invocation ({"key": ..., "code": ..., "input": ...,
+// "stream": ...}) and the last frame written for it is its result. When
+// streaming, a handler that yields produces one {"chunk": ...} frame per item
+// first, and a {"usage": ...} frame with the invocation's resource usage comes
+// right before the result. "key" is the host's content hash of the code;
+// compiled handlers are cached under it so hot functions are only compiled once.
+
+const usage = require('./usage');
+const { HANDLER_GLOBALS } = require('./prelude');
+
+// Keep stdout for the protocol; anything user code logs goes to stderr.
+const channel = process.stdout;
+console.log = console.error;
+
+const GeneratorFunction = Object.getPrototypeOf(function* () {}).constructor;
+
+const HANDLER_CACHE_SIZE = 64;
+// Map iterates in insertion order, so re-inserting on a hit keeps it LRU.
+const handlers = new Map();
+
+function buildHandler(code) {
+    try {
+        return new Function('input_data', ...HANDLER_GLOBALS, code);
+    } catch (error) {
+        // Handlers that use `yield` are compiled as generator functions.
+        if (error instanceof SyntaxError && code.includes('yield')) {
+            return new GeneratorFunction('input_data', ...HANDLER_GLOBALS, code);
+        }
+        throw error;
+    }
+}
+
+function getHandler(key, code) {
+    if (key === undefined || key === null) {
+        return buildHandler(code);
+    }
+    let handler = handlers.get(key);
+    if (handler === undefined) {
+        handler = buildHandler(code);
+    } else {
+        handlers.delete(key);
+    }
+    handlers.set(key, handler);
+    if (handlers.size > HANDLER_CACHE_SIZE) {
+        handlers.delete(handlers.keys().next().value);
+    }
+    return handler;
+}
+
+// Same globals as run.js gives the handler, where the input has already been read by the time it
+// runs and the result is written after it returns.
+const handlerGlobals = { require, readFrame: () => null, writeFrame: () => {} };
+const handlerArgs = HANDLER_GLOBALS.map((name) => handlerGlobals[name]);
+
+function isIterator(value) {
+    return value !== null && typeof value === 'object' &&
+        typeof value.next === 'function' && typeof value[Symbol.iterator] === 'function';
+}
+
+function writeFrame(payload) {
+    const body = Buffer.from(payload, 'utf8');
+    const header = Buffer.alloc(4);
+    header.writeUInt32BE(body.length, 0);
+    channel.write(Buffer.concat([header, body]));
+}
+
+function emit(message) {
+    writeFrame(JSON.stringify(message));
+}
+
+function invoke(request) {
+    const data = request.input;
+    // Handle both direct input and nested input structure
+    const inputData = (data && data.input) || data;
+
+    const handler = getHandler(request.key, request.code);
+    let result = handler(inputData, ...handlerArgs);
+    if (isIterator(result)) {
+        if (request.stream) {
+            for (const chunk of result) {
+                emit({ chunk: chunk === undefined ? null : chunk });
+            }
+            return { output: null };
+        }
+        result = Array.from(result);
+    }
+    return typeof result === 'object' ? result : { output: result };
+}
+
+let buffered = Buffer.alloc(0);
+
+process.stdin.on('data', (data) => {
+    buffered = Buffer.concat([buffered, data]);
+    while (buffered.length >= 4) {
+        const size = buffered.readUInt32BE(0);
+        if (buffered.length < 4 + size) {
+            break;
+        }
+        const request = buffered.slice(4, 4 + size).toString('utf8');
+        buffered = buffered.slice(4 + size);
+        const before = usage.snapshot();
+        let response;
+        try {
+            response = JSON.stringify(invoke(JSON.parse(request)));
+        } catch (error) {
+            response = JSON.stringify({ error: error.message });
+        }
+        try {
+            emit({ usage: usage.measure(before, true) });
+        } catch (error) {
+            // Usage is best effort; the result still follows.
+        }
+        writeFrame(response);
+    }
+});
@@ -0,0 +1,12 @@
+import importlib
+
+# Globals that function code sees besides input_data. The per-call entrypoint
+# (run.py) and the warm pool worker (worker.py) both build a handler's
+# namespace here, so a handler behaves the same whichever path runs it.
+HANDLER_MODULES = ("json", "sys", "signal", "time")
+
+def handler_globals(**extra):
+    namespace = {"__name__": "__main__"}
+    namespace.update({name: importlib.import_module(name) for name in HANDLER_MODULES})
+    namespace.update(extra)
+    return namespace
@@ -1,31 +1,52 @@
 import json
+import struct
 import sys
-import signal
-import time
+import prelude
+import usage
 
-def timeout_handler(signum, frame):
-    raise TimeoutError("Function execution timed out")
+# Per-invocation entrypoint. stdin carries length-prefixed frames (4-byte
+# big-endian size + JSON): first {"source": <wrapped function>}, then the
+# limits ({"timeout": <seconds>}, exposed to the source as TIMEOUT), then the
+# function input. The wrapped source reads the input with read_frame() and
+# writes its result with write_frame(), so no files are mounted or written.
+# A {"usage": ...} frame with the container's resource usage follows the result.
 
-# Set timeout
-signal.signal(signal.SIGALRM, timeout_handler)
-signal.alarm(30)  # 30 seconds timeout
+# Keep stdout for the protocol; anything user code prints goes to stderr.
+channel = sys.stdout.buffer
+sys.stdout = sys.stderr
 
+def read_exact(size):
+    data = b""
+    while len(data) < size:
+        chunk = sys.stdin.buffer.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def read_frame():
+    header = read_exact(4)
+    if header is None:
+        return None
+    payload = read_exact(struct.unpack(">I", header)[0])
+    return None if payload is None else json.loads(payload)
+
+def write_frame(message):
+    payload = json.dumps(message).encode()
+    channel.write(struct.pack(">I", len(payload)) + payload)
+    channel.flush()
+
+before = usage.process_start_snapshot()
 try:
-    # Read input from file
-    with open('/app/input.json', 'r') as f:
-        input_data = json.load(f)
-    
-    # Import and execute function
-    from function import handler
-    result = handler(input_data)
-    
-    # Ensure result is JSON serializable
-    if not isinstance(result, (dict, list, str, int, float, bool, type(None))):
-        result = str(result)
-    
-    # Write output
-    with open('/app/output.json', 'w') as f:
-        json.dump({"output": result}, f)
+    request = read_frame()
+    limits = read_frame() or {}
+    namespace = prelude.handler_globals(read_frame=read_frame, write_frame=write_frame,
+                                        TIMEOUT=int(limits.get("timeout", 30)))
+    exec(compile(request["source"], "/app/function.py", "exec"), namespace)
 except Exception as e:
-    with open('/app/output.json', 'w') as f:
-        json.dump({"error": str(e)}, f) 
\ No newline at end of file
+    write_frame({"error": str(e)})
+finally:
+    try:
+        write_frame({"usage": usage.measure(before)})
+    except Exception:
+        pass
@@ -0,0 +1,129 @@
+import os
+import resource
+import time
+
+# Resource usage of one invocation, measured from inside the container. Counters
+# come from this process's rusage and the container's cgroup (v2, falling back
+# to v1); the host turns the {"usage": ...} frame into metric columns.
+
+CGROUP_V2 = "/sys/fs/cgroup"
+CGROUP_V1 = {
+    "memory": "/sys/fs/cgroup/memory",
+    "cpu": "/sys/fs/cgroup/cpu,cpuacct",
+    "blkio": "/sys/fs/cgroup/blkio",
+}
+# Host-process sandboxes share the host's cgroup, whose counters are not the
+# function's; they set USAGE_CGROUP=0 so only per-process counters are reported.
+USE_CGROUP = os.environ.get("USAGE_CGROUP", "1") != "0"
+
+def read_file(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+def read_int(path):
+    value = read_file(path)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+def read_keyed(path):
+    values = {}
+    for line in (read_file(path) or "").splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            values[parts[0]] = int(parts[1])
+    return values
+
+def cgroup_peak_memory():
+    if not USE_CGROUP:
+        return None
+    peak = read_int(f"{CGROUP_V2}/memory.peak")
+    if peak is None:
+        peak = read_int(f"{CGROUP_V1['memory']}/memory.max_usage_in_bytes")
+    return peak
+
+def cgroup_throttled_seconds():
+    if not USE_CGROUP:
+        return 0.0
+    stat = read_keyed(f"{CGROUP_V2}/cpu.stat")
+    if "throttled_usec" in stat:
+        return stat["throttled_usec"] / 1e6
+    stat = read_keyed(f"{CGROUP_V1['cpu']}/cpu.stat")
+    if "throttled_time" in stat:
+        return stat["throttled_time"] / 1e9
+    return 0.0
+
+def cgroup_block_io():
+    read_bytes = write_bytes = 0
+    if not USE_CGROUP:
+        return read_bytes, write_bytes
+    text = read_file(f"{CGROUP_V2}/io.stat")
+    if text is not None:
+        # "<major>:<minor> rbytes=... wbytes=... rios=... wios=..."
+        for line in text.splitlines():
+            for field in line.split()[1:]:
+                key, _, value = field.partition("=")
+                if key == "rbytes":
+                    read_bytes += int(value)
+                elif key == "wbytes":
+                    write_bytes += int(value)
+        return read_bytes, write_bytes
+    for line in (read_file(f"{CGROUP_V1['blkio']}/blkio.throttle.io_service_bytes") or "").splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[1] == "Read":
+            read_bytes += int(parts[2])
+        elif len(parts) == 3 and parts[1] == "Write":
+            write_bytes += int(parts[2])
+    return read_bytes, write_bytes
+
+def network_io():
+    rx = tx = 0
+    for line in (read_file("/proc/self/net/dev") or "").splitlines()[2:]:
+        name, _, counters = line.partition(":")
+        fields = counters.split()
+        if name.strip() != "lo" and len(fields) >= 9:
+            rx += int(fields[0])
+            tx += int(fields[8])
+    return rx, tx
+
+def snapshot():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    block_read, block_write = cgroup_block_io()
+    net_rx, net_tx = network_io()
+    return {
+        "wall": time.time(),
+        "clock": time.perf_counter(),
+        "cpu_user_time": usage.ru_utime,
+        "cpu_system_time": usage.ru_stime,
+        "cpu_throttled_time": cgroup_throttled_seconds(),
+        "block_read_bytes": block_read,
+        "block_write_bytes": block_write,
+        "net_rx_bytes": net_rx,
+        "net_tx_bytes": net_tx,
+    }
+
+def measure(before, per_process_peak=False):
+    # A per-call container lives for one invocation, so the cgroup's peak is
+    # the invocation's. Warm workers share their cgroup across calls and report
+    # this process's peak RSS instead (ru_maxrss is in KiB on Linux).
+    after = snapshot()
+    peak = None if per_process_peak else cgroup_peak_memory()
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    usage = {key: after[key] - before[key] for key in after if key not in ("wall", "clock")}
+    usage["peak_memory_bytes"] = peak
+    usage["code_started_at"] = before["wall"]
+    usage["code_time"] = after["clock"] - before["clock"]
+    return usage
+
+def process_start_snapshot():
+    # The per-call entrypoint counts everything since the interpreter started.
+    before = snapshot()
+    for key in before:
+        if key not in ("wall", "clock"):
+            before[key] = 0
+    return before
@@ -0,0 +1,164 @@
+import os
+import json
+import struct
+import sys
+import signal
+import types
+import prelude
+import usage
+from collections import OrderedDict
+
+# Long-lived worker used by the warm container pool. Messages on stdin and
+# stdout are length-prefixed frames (4-byte big-endian size + JSON). Each
+# request frame is one invocation ({"key": ..., "code": ..., "input": ...,
+# "timeout": ..., "stream": ...}) and the last frame written for it is its
+# result. When streaming, a handler that yields produces one {"chunk": ...}
+# frame per item first, and a {"usage": ...} frame with the invocation's
+# resource usage comes right before the result. "key" is the host's content
+# hash of the code; compiled handlers are cached under it so hot functions are
+# only compiled once.
+#
+# With WORKER_FORK=1 the worker is a fork server: this process compiles and
+# caches the handler, then forks a child per invocation that runs it and exits.
+# Each call starts from the same pre-initialised interpreter, and a crash,
+# leak or global mutation in user code never reaches the parent.
+
+FORK_SERVER = os.environ.get("WORKER_FORK") == "1"
+
+HANDLER_CACHE_SIZE = 64
+handlers = OrderedDict()
+
+def timeout_handler(signum, frame):
+    raise TimeoutError("Function execution timed out")
+
+signal.signal(signal.SIGALRM, timeout_handler)
+
+# Keep stdout for the protocol; anything user code prints goes to stderr.
+channel = sys.stdout.buffer
+sys.stdout = sys.stderr
+
+def read_exact(size):
+    data = b""
+    while len(data) < size:
+        chunk = sys.stdin.buffer.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def read_frame():
+    header = read_exact(4)
+    if header is None:
+        return None
+    payload = read_exact(struct.unpack(">I", header)[0])
+    return None if payload is None else json.loads(payload)
+
+def write_frame(payload):
+    channel.write(struct.pack(">I", len(payload)) + payload)
+    channel.flush()
+
+def build_handler(code):
+    indented_code = '\n'.join('    ' + line for line in code.split('\n'))
+    # Same globals as on the per-call path, where the input has already been read by the time the
+    # handler runs and the result is written after it returns.
+    namespace = prelude.handler_globals(read_frame=lambda: None, write_frame=lambda message: None)
+    exec(f"def handler(input_data):\n{indented_code}\n", namespace)
+    return namespace["handler"]
+
+def get_handler(key, code):
+    if key is None:
+        return build_handler(code)
+    handler = handlers.get(key)
+    if handler is None:
+        handler = build_handler(code)
+        handlers[key] = handler
+        if len(handlers) > HANDLER_CACHE_SIZE:
+            handlers.popitem(last=False)
+    else:
+        handlers.move_to_end(key)
+    return handler
+
+def serializable(value):
+    if not isinstance(value, (dict, list, str, int, float, bool, type(None))):
+        return str(value)
+    return value
+
+def emit(message):
+    write_frame(json.dumps(message).encode())
+
+def invoke(request, handler):
+    data = request.get("input")
+    # Handle both direct input and nested input structure
+    input_data = data.get("input", data) if isinstance(data, dict) else data
+
+    timeout = int(request.get("timeout", 30))
+    handler.__globals__["TIMEOUT"] = timeout
+    signal.alarm(timeout)
+    try:
+        result = handler(input_data)
+        if isinstance(result, types.GeneratorType):
+            if request.get("stream"):
+                for chunk in result:
+                    emit({"chunk": serializable(chunk)})
+                result = None
+            else:
+                result = [serializable(chunk) for chunk in result]
+    finally:
+        signal.alarm(0)
+
+    return {"output": serializable(result)}
+
+def respond(request, handler):
+    before = usage.snapshot()
+    try:
+        response = json.dumps(invoke(request, handler))
+    except TimeoutError as e:
+        response = json.dumps({"error": str(e), "error_type": "timeout"})
+    except MemoryError:
+        # Raised under an address-space rlimit; in a container the OOM killer usually acts first.
+        response = json.dumps({"error": "Function exceeded its memory limit", "error_type": "oom"})
+    except Exception as e:
+        response = json.dumps({"error": str(e)})
+    try:
+        emit({"usage": usage.measure(before, per_process_peak=True)})
+    except Exception:
+        pass
+    write_frame(response.encode())
+
+def respond_forked(request, handler):
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            respond(request, handler)
+            code = 0
+        finally:
+            sys.stderr.flush()
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        # The child died before writing its result (killed, OOM, os._exit in user code).
+        # Nothing but the kernel's OOM killer sends SIGKILL to a child of this worker.
+        if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGKILL:
+            emit({"error": "Function exceeded its memory limit", "error_type": "oom"})
+            return
+        if os.WIFSIGNALED(status):
+            reason = f"signal {os.WTERMSIG(status)}"
+        else:
+            reason = f"exit code {os.WEXITSTATUS(status)}"
+        emit({"error": f"Function process terminated with {reason}"})
+
+while True:
+    request = read_frame()
+    if request is None:
+        break
+    try:
+        handler = get_handler(request.get("key"), request["code"])
+    except Exception as e:
+        emit({"error": str(e)})
+        continue
+    if FORK_SERVER:
+        respond_forked(request, handler)
+    else:
+        respond(request, handler)
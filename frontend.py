@@ -7,6 +7,7 @@ from datetime import datetime
 
 # Constants
 API_BASE_URL = "http://localhost:8000/functions"
+STATS_BASE_URL = "http://localhost:8000/stats"
 
 # Page config
 st.set_page_config(
@@ -27,7 +28,7 @@ if page == "Functions List":
     st.header("Functions List")
     
     try:
-        response = requests.get(f"{API_BASE_URL}/")
+        response = requests.get(f"{API_BASE_URL}/", params={"include_summary": True})
         functions = response.json()
         
         if functions:
@@ -50,20 +51,23 @@ if page == "Functions List":
                         except Exception as e:
                             st.error(f"Error: {str(e)}")
                     
-                    if func['metrics']:
-                        st.write("**Recent Executions:**")
-                        metrics_df = pd.DataFrame(func['metrics'])
-                        metrics_df['created_at'] = pd.to_datetime(metrics_df['created_at'])
-                        metrics_df = metrics_df.sort_values('created_at', ascending=False)
+                    summary = func.get('metrics_summary') or {}
+                    if summary.get('count'):
+                        st.write("**Executions:**")
                         
                         # Success rate
-                        success_rate = (metrics_df['success'].sum() / len(metrics_df)) * 100
-                        st.metric("Success Rate", f"{success_rate:.1f}%")
+                        st.metric("Success Rate", f"{summary['success_rate'] * 100:.1f}%")
                         
-                        # Execution time chart
-                        fig = px.line(metrics_df, x='created_at', y='execution_time',
-                                    title='Execution Time Trend')
-                        st.plotly_chart(fig, use_container_width=True)
+                        # Recent executions are fetched only when asked for
+                        if st.checkbox("Show execution time trend", key=f"trend_{func['id']}"):
+                            recent = requests.get(f"{API_BASE_URL}/{func['id']}/metrics", params={"limit": 100}).json()
+                            metrics_df = pd.DataFrame(recent['items'])
+                            metrics_df['created_at'] = pd.to_datetime(metrics_df['created_at'])
+                            
+                            # Execution time chart
+                            fig = px.line(metrics_df, x='created_at', y='execution_time',
+                                        title='Execution Time Trend')
+                            st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No functions found. Create one using the 'Create Function' page.")
             
@@ -283,9 +287,12 @@ elif page == "Create Function":
         name = st.text_input("Function Name", value=example_functions[example_function]["name"] if example_function else "")
         code = st.text_area("Function Code", value=example_functions[example_function]["code"] if example_function else "")
         language = st.selectbox("Language", ["python", "javascript"], index=0 if example_function and example_functions[example_function]["language"] == "python" else 1)
-        runtime = st.selectbox("Runtime", ["docker", "gvisor"], index=0 if example_function and example_functions[example_function]["runtime"] == "docker" else 1)
+        runtimes = ["docker", "gvisor", "subprocess", "process"]
+        runtime = st.selectbox("Runtime", runtimes, index=runtimes.index(example_functions[example_function]["runtime"]) if example_function else 1,
+                               help="subprocess and process run on the host without a container: for trusted functions only")
         timeout = st.number_input("Timeout (seconds)", min_value=1, max_value=300, value=30)
         memory_limit = st.number_input("Memory Limit (MB)", min_value=64, max_value=1024, value=128)
+        cacheable = st.checkbox("Cache results (same input always gives the same output)", value=False)
         
         submitted = st.form_submit_button("Create Function")
         
@@ -297,7 +304,8 @@ elif page == "Create Function":
                     "language": language,
                     "runtime": runtime,
                     "timeout": timeout,
-                    "memory_limit": memory_limit
+                    "memory_limit": memory_limit,
+                    "cacheable": cacheable
                 }
                 
                 response = requests.post(f"{API_BASE_URL}/", json=data)
@@ -641,182 +649,160 @@ elif page == "Execute Function":
 elif page == "Metrics Dashboard":
     st.header("Metrics Dashboard")
     
+    # Aggregates come pre-computed from the rollup tables, so the page no longer downloads raw metrics.
+    granularity = st.selectbox("Granularity", ["minute", "hour", "day"], index=1)
+    
     try:
-        response = requests.get(f"{API_BASE_URL}/")
-        functions = response.json()
+        functions = requests.get(f"{API_BASE_URL}/").json()
+        function_names = {func['id']: func['name'] for func in functions}
+        function_stats = requests.get(f"{STATS_BASE_URL}/functions", params={"granularity": granularity}).json()
         
-        if functions:
-            # Collect all metrics
-            all_metrics = []
-            for func in functions:
-                if func['metrics']:
-                    for metric in func['metrics']:
-                        metric['function_name'] = func['name']
-                        metric['runtime'] = func['runtime']
-                        all_metrics.append(metric)
+        if function_stats:
+            stats_df = pd.DataFrame(function_stats)
+            stats_df['function_name'] = stats_df['function_id'].map(function_names)
             
-            if all_metrics:
-                metrics_df = pd.DataFrame(all_metrics)
-                metrics_df['created_at'] = pd.to_datetime(metrics_df['created_at'])
-                
-                # Success Rate by Function
-                st.subheader("Success Rate by Function")
-                success_rate = metrics_df.groupby('function_name')['success'].mean() * 100
-                fig = px.bar(success_rate, title='Success Rate by Function')
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Execution Time Distribution
-                st.subheader("Execution Time Distribution")
-                fig = px.histogram(metrics_df, x='execution_time', 
-                                 title='Execution Time Distribution',
-                                 nbins=20)
+            # Success Rate by Function
+            st.subheader("Success Rate by Function")
+            stats_df['success_rate_percent'] = stats_df['success_rate'] * 100
+            fig = px.bar(stats_df, x='function_name', y='success_rate_percent', title='Success Rate by Function',
+                        labels={'success_rate_percent': 'Success Rate (%)', 'function_name': 'Function'})
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Result Cache Hit Ratio
+            cached_df = stats_df[stats_df['cache_hit_count'] > 0]
+            if not cached_df.empty:
+                st.subheader("Result Cache Hit Ratio")
+                cached_df = cached_df.assign(cache_hit_percent=cached_df['cache_hit_rate'] * 100)
+                fig = px.bar(cached_df, x='function_name', y='cache_hit_percent', title='Result Cache Hit Ratio by Function',
+                            labels={'cache_hit_percent': 'Cache Hits (%)', 'function_name': 'Function'})
                 st.plotly_chart(fig, use_container_width=True)
-                
-                # Memory Usage Trend
-                st.subheader("Memory Usage Trend")
-                fig = px.line(metrics_df, x='created_at', y='memory_used',
+            
+            # Execution Time Percentiles
+            st.subheader("Execution Time Percentiles")
+            percentiles_df = stats_df.melt(id_vars='function_name',
+                                           value_vars=['p50_execution_time', 'p90_execution_time', 'p99_execution_time'],
+                                           var_name='percentile', value_name='execution_time')
+            percentiles_df['percentile'] = percentiles_df['percentile'].str.split('_').str[0]
+            fig = px.bar(percentiles_df, x='function_name', y='execution_time', color='percentile', barmode='group',
+                        title='Execution Time Percentiles by Function',
+                        labels={'execution_time': 'Execution Time (seconds)', 'function_name': 'Function'})
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Memory Usage Trend
+            st.subheader("Memory Usage Trend")
+            series = []
+            for func in function_stats:
+                detail = requests.get(f"{STATS_BASE_URL}/functions/{func['function_id']}",
+                                      params={"granularity": granularity}).json()
+                for point in detail['series']:
+                    point['function_name'] = function_names.get(func['function_id'])
+                    series.append(point)
+            if series:
+                series_df = pd.DataFrame(series)
+                series_df['bucket_start'] = pd.to_datetime(series_df['bucket_start'])
+                fig = px.line(series_df, x='bucket_start', y='avg_memory_used',
                             color='function_name',
-                            title='Memory Usage Over Time')
+                            title='Average Memory Usage Over Time')
+                st.plotly_chart(fig, use_container_width=True)
+            
+            # Error Analysis
+            st.subheader("Error Analysis")
+            total_errors = stats_df['count'].sum() - stats_df['success_count'].sum()
+            if total_errors:
+                error_counts = {
+                    "timeout": stats_df['timeout_count'].sum(),
+                    "oom": stats_df['oom_count'].sum(),
+                }
+                error_counts["error"] = total_errors - error_counts["timeout"] - error_counts["oom"]
+                fig = px.pie(values=list(error_counts.values()), names=list(error_counts.keys()),
+                           title='Error Distribution by Type')
                 st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No errors recorded in the metrics")
+            
+            # Runtime Comparison
+            st.subheader("Runtime Comparison")
+            
+            runtime_df = pd.DataFrame(requests.get(f"{STATS_BASE_URL}/runtimes", params={"granularity": granularity}).json())
+            runtimes = runtime_df['runtime'].unique() if not runtime_df.empty else []
+            if len(runtimes) >= 2:
+                # Create tabs for different comparison metrics
+                comparison_tab1, comparison_tab2, comparison_tab3 = st.tabs(["Execution Time", "Memory Usage", "Success Rate"])
                 
-                # Error Analysis
-                st.subheader("Error Analysis")
-                error_df = metrics_df[metrics_df['error'].notna()]
-                if not error_df.empty:
-                    error_counts = error_df.groupby('error').size()
-                    fig = px.pie(values=error_counts.values, names=error_counts.index,
-                               title='Error Distribution')
+                with comparison_tab1:
+                    st.write("### Execution Time Comparison")
+                    exec_time_comparison = runtime_df[['runtime', 'count', 'avg_execution_time', 'p50_execution_time',
+                                                       'p90_execution_time', 'p99_execution_time']].round(4)
+                    st.table(exec_time_comparison)
+                    
+                    fig = px.bar(exec_time_comparison.melt(id_vars='runtime',
+                                                           value_vars=['p50_execution_time', 'p90_execution_time', 'p99_execution_time'],
+                                                           var_name='percentile', value_name='execution_time'),
+                                x='runtime', y='execution_time', color='percentile', barmode='group',
+                                title='Execution Time Percentiles by Runtime',
+                                labels={'execution_time': 'Execution Time (seconds)', 'runtime': 'Runtime'})
                     st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.info("No errors recorded in the metrics")
                 
-                # Docker vs gVisor Comparison
-                st.subheader("Docker vs gVisor Comparison")
-                
-                # Check if we have both runtimes
-                runtimes = metrics_df['runtime'].unique()
-                if 'docker' in runtimes and 'gvisor' in runtimes:
-                    # Create tabs for different comparison metrics
-                    comparison_tab1, comparison_tab2, comparison_tab3 = st.tabs(["Execution Time", "Memory Usage", "Success Rate"])
+                with comparison_tab2:
+                    st.write("### Memory Usage Comparison")
+                    memory_comparison = runtime_df[['runtime', 'count', 'avg_memory_used', 'min_memory_used',
+                                                    'max_memory_used']].round(2)
+                    st.table(memory_comparison)
                     
-                    with comparison_tab1:
-                        st.write("### Execution Time Comparison")
-                        # Calculate average execution time by runtime
-                        exec_time_comparison = metrics_df.groupby('runtime')['execution_time'].agg(['mean', 'std', 'count']).reset_index()
-                        exec_time_comparison['mean'] = exec_time_comparison['mean'].round(4)
-                        exec_time_comparison['std'] = exec_time_comparison['std'].round(4)
-                        
-                        # Display as a table
-                        st.table(exec_time_comparison)
-                        
-                        # Create a bar chart
-                        fig = px.bar(exec_time_comparison, x='runtime', y='mean', 
-                                    error_y='std',
-                                    title='Average Execution Time by Runtime',
-                                    labels={'mean': 'Average Execution Time (seconds)', 'runtime': 'Runtime'})
-                        st.plotly_chart(fig, use_container_width=True)
-                        
-                        # Box plot for distribution
-                        fig = px.box(metrics_df, x='runtime', y='execution_time',
-                                    title='Execution Time Distribution by Runtime')
-                        st.plotly_chart(fig, use_container_width=True)
-                    
-                    with comparison_tab2:
-                        st.write("### Memory Usage Comparison")
-                        # Calculate average memory usage by runtime
-                        memory_comparison = metrics_df.groupby('runtime')['memory_used'].agg(['mean', 'std', 'count']).reset_index()
-                        memory_comparison['mean'] = memory_comparison['mean'].round(2)
-                        memory_comparison['std'] = memory_comparison['std'].round(2)
-                        
-                        # Display as a table
-                        st.table(memory_comparison)
-                        
-                        # Create a bar chart
-                        fig = px.bar(memory_comparison, x='runtime', y='mean', 
-                                    error_y='std',
-                                    title='Average Memory Usage by Runtime',
-                                    labels={'mean': 'Average Memory Usage (MB)', 'runtime': 'Runtime'})
-                        st.plotly_chart(fig, use_container_width=True)
-                        
-                        # Box plot for distribution
-                        fig = px.box(metrics_df, x='runtime', y='memory_used',
-                                    title='Memory Usage Distribution by Runtime')
-                        st.plotly_chart(fig, use_container_width=True)
-                    
-                    with comparison_tab3:
-                        st.write("### Success Rate Comparison")
-                        # Calculate success rate by runtime
-                        success_comparison = metrics_df.groupby('runtime')['success'].agg(['mean', 'count']).reset_index()
-                        success_comparison['mean'] = (success_comparison['mean'] * 100).round(2)
-                        success_comparison.rename(columns={'mean': 'success_rate'}, inplace=True)
-                        
-                        # Display as a table
-                        st.table(success_comparison)
-                        
-                        # Create a bar chart
-                        fig = px.bar(success_comparison, x='runtime', y='success_rate',
-                                    title='Success Rate by Runtime',
-                                    labels={'success_rate': 'Success Rate (%)', 'runtime': 'Runtime'})
-                        st.plotly_chart(fig, use_container_width=True)
-                        
-                        # Error rate by runtime
-                        error_by_runtime = metrics_df[metrics_df['error'].notna()].groupby('runtime').size().reset_index(name='error_count')
-                        total_by_runtime = metrics_df.groupby('runtime').size().reset_index(name='total_count')
-                        
-                        error_by_runtime = error_by_runtime.merge(total_by_runtime, on='runtime')
-                        error_by_runtime['error_rate'] = (error_by_runtime['error_count'] / error_by_runtime['total_count'] * 100).round(2)
-                        
-                        fig = px.bar(error_by_runtime, x='runtime', y='error_rate',
-                                    title='Error Rate by Runtime',
-                                    labels={'error_rate': 'Error Rate (%)', 'runtime': 'Runtime'})
-                        st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Summary insights
-                    st.subheader("Summary Insights")
-                    
-                    # Execution time insights
-                    docker_time = exec_time_comparison[exec_time_comparison['runtime'] == 'docker']['mean'].values[0]
-                    gvisor_time = exec_time_comparison[exec_time_comparison['runtime'] == 'gvisor']['mean'].values[0]
-                    time_diff = abs(docker_time - gvisor_time)
-                    time_diff_percent = (time_diff / min(docker_time, gvisor_time) * 100).round(2)
-                    
-                    if docker_time < gvisor_time:
-                        time_insight = f"Docker is {time_diff_percent}% faster than gVisor on average."
-                    else:
-                        time_insight = f"gVisor is {time_diff_percent}% faster than Docker on average."
-                    
-                    # Memory usage insights
-                    docker_memory = memory_comparison[memory_comparison['runtime'] == 'docker']['mean'].values[0]
-                    gvisor_memory = memory_comparison[memory_comparison['runtime'] == 'gvisor']['mean'].values[0]
-                    memory_diff = abs(docker_memory - gvisor_memory)
-                    memory_diff_percent = (memory_diff / min(docker_memory, gvisor_memory) * 100).round(2)
-                    
-                    if docker_memory < gvisor_memory:
-                        memory_insight = f"Docker uses {memory_diff_percent}% less memory than gVisor on average."
-                    else:
-                        memory_insight = f"gVisor uses {memory_diff_percent}% less memory than Docker on average."
-                    
-                    # Success rate insights
-                    docker_success = success_comparison[success_comparison['runtime'] == 'docker']['success_rate'].values[0]
-                    gvisor_success = success_comparison[success_comparison['runtime'] == 'gvisor']['success_rate'].values[0]
-                    success_diff = abs(docker_success - gvisor_success)
-                    
-                    if docker_success > gvisor_success:
-                        success_insight = f"Docker has a {success_diff:.2f}% higher success rate than gVisor."
-                    else:
-                        success_insight = f"gVisor has a {success_diff:.2f}% higher success rate than Docker."
-                    
-                    # Display insights
-                    st.write(f"**Execution Time:** {time_insight}")
-                    st.write(f"**Memory Usage:** {memory_insight}")
-                    st.write(f"**Success Rate:** {success_insight}")
+                    fig = px.bar(memory_comparison, x='runtime', y='avg_memory_used',
+                                title='Average Memory Usage by Runtime',
+                                labels={'avg_memory_used': 'Average Memory Usage (MB)', 'runtime': 'Runtime'})
+                    st.plotly_chart(fig, use_container_width=True)
+                
+                with comparison_tab3:
+                    st.write("### Success Rate Comparison")
+                    success_comparison = runtime_df[['runtime', 'count', 'success_rate', 'timeout_count', 'oom_count']].copy()
+                    success_comparison['success_rate'] = (success_comparison['success_rate'] * 100).round(2)
+                    st.table(success_comparison)
                     
+                    fig = px.bar(success_comparison, x='runtime', y='success_rate',
+                                title='Success Rate by Runtime',
+                                labels={'success_rate': 'Success Rate (%)', 'runtime': 'Runtime'})
+                    st.plotly_chart(fig, use_container_width=True)
+                
+                # Summary insights: compare the best and worst runtime on each metric, so any pair of
+                # runtimes (not only Docker and gVisor) can be summarised
+                st.subheader("Summary Insights")
+                
+                # Execution time insights (median, so a few slow calls do not skew the comparison)
+                by_time = runtime_df.sort_values('p50_execution_time')
+                fastest, slowest = by_time.iloc[0], by_time.iloc[-1]
+                time_diff_percent = round((slowest['p50_execution_time'] - fastest['p50_execution_time'])
+                                          / fastest['p50_execution_time'] * 100, 2)
+                time_insight = f"{fastest['runtime']} is {time_diff_percent}% faster than {slowest['runtime']} at the median."
+                
+                # Memory usage insights
+                by_memory = runtime_df.dropna(subset=['avg_memory_used']).sort_values('avg_memory_used')
+                if len(by_memory) >= 2:
+                    leanest, heaviest = by_memory.iloc[0], by_memory.iloc[-1]
+                    memory_diff_percent = round((heaviest['avg_memory_used'] - leanest['avg_memory_used'])
+                                                / leanest['avg_memory_used'] * 100, 2)
+                    memory_insight = (f"{leanest['runtime']} uses {memory_diff_percent}% less memory than "
+                                      f"{heaviest['runtime']} on average.")
                 else:
-                    st.info("Not enough data to compare Docker and gVisor. Make sure you have functions executed with both runtimes.")
+                    memory_insight = "Not enough memory samples to compare."
+                
+                # Success rate insights
+                by_success = runtime_df.sort_values('success_rate', ascending=False)
+                most_reliable, least_reliable = by_success.iloc[0], by_success.iloc[-1]
+                success_diff = (most_reliable['success_rate'] - least_reliable['success_rate']) * 100
+                success_insight = (f"{most_reliable['runtime']} has a {success_diff:.2f}% higher success rate than "
+                                   f"{least_reliable['runtime']}.")
+                
+                # Display insights
+                st.write(f"**Execution Time:** {time_insight}")
+                st.write(f"**Memory Usage:** {memory_insight}")
+                st.write(f"**Success Rate:** {success_insight}")
+                
             else:
-                st.info("No metrics data available")
+                st.info("Not enough data to compare runtimes. Make sure you have functions executed with at least two runtimes.")
         else:
-            st.info("No functions found")
+            st.info("No metrics data available")
             
     except Exception as e:
-        st.error(f"Error loading metrics: {str(e)}") 
\ No newline at end of file
+        st.error(f"Error loading metrics: {str(e)}")
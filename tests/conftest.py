@@ -0,0 +1,17 @@
+import os
+import sys
+import shutil
+import tempfile
+
+# Settings are read when app modules are imported, so they are set before any test imports one.
+_tmp = tempfile.mkdtemp(prefix="serverless-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp, 'test.db')}")
+os.environ.setdefault("METRICS_SPILL_PATH", os.path.join(_tmp, "metrics_spill.jsonl"))
+# The suite runs functions on the host-process runtimes, so it needs no Docker.
+os.environ.setdefault("ALLOW_LOCAL_RUNTIMES", "true")
+os.environ.setdefault("AGENT_TOKEN", "test-agent-token")
+if os.geteuid() == 0 and "SANDBOX_PYTHON" not in os.environ:
+    # As root, functions run as SANDBOX_USER, which cannot reach an interpreter under a home directory.
+    os.environ["SANDBOX_PYTHON"] = shutil.which("python3", path="/usr/local/bin:/usr/bin:/bin") or sys.executable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
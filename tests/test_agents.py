@@ -0,0 +1,168 @@
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.agent import Agent, create_app
+from app.core.database import SessionLocal
+from app.core.dispatcher import AGENT_TOKEN, AGENT_TOKEN_HEADER, Dispatcher, record_heartbeat
+from app.core.execution import FunctionExecutionEngine
+from app.models.agent import WorkerAgent
+from app.models.function import Language, Runtime
+from app.schemas.agent import AgentHeartbeat
+
+CODE = "return input_data * 2"
+
+
+class Bridge(BaseHTTPRequestHandler):
+    # Serves an ASGI app over real HTTP on an ephemeral port, in place of uvicorn.
+    def _forward(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        headers = {name: value for name, value in self.headers.items() if name.lower() not in ("host", "content-length")}
+        response = self.server.client.request(self.command, self.path, content=body, headers=headers)
+        self.send_response(response.status_code)
+        self.send_header("Content-Type", response.headers.get("content-type", "application/json"))
+        self.send_header("Content-Length", str(len(response.content)))
+        self.end_headers()
+        self.wfile.write(response.content)
+
+    do_GET = do_POST = do_DELETE = _forward
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(app) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Bridge)
+    server.client = TestClient(app)
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop(server: ThreadingHTTPServer) -> None:
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cluster():
+    # The API (for the agents' heartbeats) and two in-process agents, each with its own engine.
+    registry = serve(main.app)
+    agents, servers = {}, {}
+    for name in ("agent-a", "agent-b"):
+        agent = Agent(FunctionExecutionEngine(use_pool=False), agent_id=name, url="", registry_url=registry.url,
+                      capacity=4)
+        servers[name] = serve(create_app(agent))
+        agent.url = servers[name].url
+        agent.heartbeat()
+        agents[name] = agent
+    dispatcher = Dispatcher(placement="hash", retries=2)
+    dispatcher.refresh()
+    yield dispatcher, agents, servers, registry
+    dispatcher.shutdown()
+    for name, server in servers.items():
+        registry.client.delete(f"/agents/{name}")
+        agents[name].executor.shutdown(wait=False)
+        if server.socket.fileno() != -1:
+            stop(server)
+    stop(registry)
+
+
+def run(dispatcher: Dispatcher, function_id: int, value: int = 21):
+    output, metrics = dispatcher.execute(function_id, CODE, Language.PYTHON, value, Runtime.SUBPROCESS,
+                                         timeout=5, memory_limit=128)
+    assert output == {"output": value * 2}, metrics
+    return metrics["agent"]
+
+
+def test_functions_are_placed_on_a_stable_agent(cluster):
+    dispatcher, agents, _, _ = cluster
+    assert dispatcher.stats()["live_agents"] == 2
+    for function_id in (1, 2, 3):
+        assert len({run(dispatcher, function_id) for _ in range(3)}) == 1
+    # The hash ring spreads functions over both agents.
+    assert {run(dispatcher, function_id) for function_id in range(1, 21)} == set(agents)
+
+
+def test_calls_fail_over_when_an_agent_dies(cluster):
+    dispatcher, agents, servers, _ = cluster
+    home = run(dispatcher, 7)
+    other = next(name for name in agents if name != home)
+    stop(servers[home])
+
+    assert run(dispatcher, 7) == other
+    assert dispatcher.stats()["failed"] == 1
+    # The dead agent is skipped from then on, without another failed attempt.
+    assert run(dispatcher, 7) == other
+    assert dispatcher.stats()["failed"] == 1
+    assert dispatcher.stats()["agents"][home]["available"] is False
+
+
+def test_draining_agent_takes_no_new_calls(cluster):
+    dispatcher, agents, servers, registry = cluster
+    home = run(dispatcher, 7)
+    other = next(name for name in agents if name != home)
+
+    # An operator drains the agent; it learns so from its next heartbeat and turns calls away.
+    assert registry.client.post(f"/agents/{home}/drain").json()["draining"] is True
+    agents[home].heartbeat()
+    assert agents[home].draining
+    response = servers[home].client.post("/execute", json={"function_id": 7, "code": CODE, "language": "python",
+                                                           "runtime": "subprocess", "input": 1},
+                                         headers={AGENT_TOKEN_HEADER: AGENT_TOKEN})
+    assert (response.status_code, response.json()["draining"]) == (503, True)
+
+    # A dispatcher that has not refreshed yet still tries it, and moves on when it answers 503.
+    assert run(dispatcher, 7) == other
+    assert dispatcher.stats()["failed"] == 0
+
+    dispatcher.refresh()
+    assert dispatcher.stats()["agents"][home]["available"] is False
+    assert [agent.id for agent in dispatcher.candidates(7, Runtime.SUBPROCESS)] == [other]
+    assert {run(dispatcher, 7) for _ in range(3)} == {other}
+    assert agents[home].status()["completed"] == 1
+
+
+def test_drain_survives_a_database_without_fractional_seconds():
+    heartbeat = AgentHeartbeat(id="agent-precision", url="http://127.0.0.1:1", capacity=1, runtimes=["subprocess"],
+                               started_at=datetime(2030, 1, 1, 12, 0, 0, 123456))
+    with SessionLocal() as db:
+        row = record_heartbeat(db, heartbeat)
+        # What MySQL's DATETIME keeps of the row, plus a drain requested through the API.
+        row.started_at = row.started_at.replace(microsecond=0)
+        row.draining = True
+        db.commit()
+        assert record_heartbeat(db, heartbeat).draining is True
+        # A restarted agent (a new started_at) is no longer drained.
+        restarted = heartbeat.copy(update={"started_at": datetime(2030, 1, 1, 12, 5)})
+        assert record_heartbeat(db, restarted).draining is False
+        db.query(WorkerAgent).filter(WorkerAgent.id == "agent-precision").delete()
+        db.commit()
+
+
+def test_agent_routes_require_the_shared_token(cluster):
+    _, _, servers, registry = cluster
+    beat = {"id": "agent-rogue", "url": "http://127.0.0.1:1", "capacity": 1, "runtimes": ["subprocess"]}
+    assert registry.client.post("/agents/heartbeat", json=beat).status_code == 401
+    assert registry.client.post("/agents/heartbeat", json=beat, headers={AGENT_TOKEN_HEADER: "wrong"}).status_code == 401
+    assert "agent-rogue" not in [agent["id"] for agent in registry.client.get("/agents/").json()]
+    assert registry.client.delete("/agents/agent-a").status_code == 401
+
+    agent = servers["agent-a"].client
+    call = {"function_id": 7, "code": CODE, "language": "python", "runtime": "subprocess", "input": 1}
+    assert agent.post("/execute", json=call).status_code == 401
+    assert agent.post("/drain").status_code == 401
+    assert agent.get("/status").json()["draining"] is False
+    assert agent.post("/execute", json=call, headers={AGENT_TOKEN_HEADER: AGENT_TOKEN}).json()["result"] == {"output": 2}
+
+
+def test_dispatcher_fails_over_from_an_agent_with_another_token(cluster):
+    dispatcher, agents, _, _ = cluster
+    home = run(dispatcher, 7)
+    other = next(name for name in agents if name != home)
+    dispatcher._client(dispatcher._agents[home]).token = "wrong"
+
+    assert run(dispatcher, 7) == other
+    assert dispatcher.stats()["failed"] == 1
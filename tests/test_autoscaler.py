@@ -0,0 +1,87 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.core import pool as pool_module
+from app.core.autoscaler import Autoscaler
+from app.core.database import Base, SessionLocal, engine
+from app.core.pool import ContainerPool
+from app.models import metrics  # noqa: F401  (Function.metrics relationship)
+from app.models.function import Function, Language, Runtime
+from app.models.rollup import MetricRollup
+
+KEY = (Language.PYTHON, Runtime.PROCESS, 128)
+# Far from the wall clock, so rollups written by other tests are not in the window.
+START = datetime(2030, 1, 1, 12, 0)
+
+
+class FakeWorker:
+    def __init__(self, language, runtime, memory_mb):
+        self.key = (language, runtime, memory_mb)
+        self.code_keys = {}
+        self.last_used = time.monotonic()
+        self.alive = True
+
+    def stop(self):
+        self.alive = False
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(pool_module, "WarmContainer", FakeWorker)
+    pool = ContainerPool(min_size=2)
+    pool.start([KEY])
+    pool._fill_to_min()
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def function():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        function = Function(name="autoscaler-test", code="return 1", language=Language.PYTHON,
+                            runtime=Runtime.PROCESS, memory_limit=128)
+        db.add(function)
+        db.commit()
+        yield function.id
+        db.delete(function)
+        db.commit()
+
+
+def add_calls(function_id: int, minute: datetime, count: int, seconds_each: float) -> None:
+    with SessionLocal() as db:
+        db.add(MetricRollup(function_id=function_id, runtime=Runtime.PROCESS, granularity="minute",
+                            bucket_start=minute, count=count, success_count=count, time_sum=count * seconds_each))
+        db.commit()
+
+
+def test_prewarmed_workers_are_kept_until_a_full_idle_window_has_passed(pool, function):
+    autoscaler = Autoscaler(pool, lambda runtime: runtime == Runtime.PROCESS, idle_after=900, time_of_day=False,
+                            enabled=False)
+
+    # No history yet: the pool keeps its min_size floor instead of reading "no calls" as idle.
+    assert KEY not in autoscaler.run_once(now=START)
+    assert pool.stats()["python/process/128m"]["total"] == 2
+
+    add_calls(function, START + timedelta(minutes=1), count=60, seconds_each=3)
+    targets = autoscaler.run_once(now=START + timedelta(minutes=2))
+    assert targets[KEY] >= 1
+    assert pool.stats()["python/process/128m"]["total"] >= targets[KEY]
+
+    # The calls stop; the pool stays warm until they are idle_after old.
+    assert autoscaler.run_once(now=START + timedelta(minutes=10))[KEY] >= 1
+    assert pool.stats()["python/process/128m"]["total"] >= 1
+
+    assert autoscaler.run_once(now=START + timedelta(minutes=20))[KEY] == 0
+    assert pool.stats()["python/process/128m"] == {"idle": 0, "total": 0}
+
+
+def test_pool_without_calls_scales_to_zero_after_idle_after(pool):
+    autoscaler = Autoscaler(pool, lambda runtime: runtime == Runtime.PROCESS, idle_after=900, time_of_day=False,
+                            enabled=False)
+    autoscaler.run_once(now=START)
+    autoscaler.run_once(now=START + timedelta(minutes=14))
+    assert pool.stats()["python/process/128m"]["total"] == 2
+
+    assert autoscaler.run_once(now=START + timedelta(minutes=15))[KEY] == 0
+    assert pool.stats()["python/process/128m"]["total"] == 0
@@ -0,0 +1,34 @@
+import asyncio
+from datetime import datetime
+from app.core.database import AsyncSessionLocal, Base, SessionLocal, engine
+from app.models.function import Function, Language, Runtime
+from app.models.job import ExecutionJob, JobStatus
+from app.models.metrics import ExecutionMetric
+from app.models.rollup import MetricRollup
+
+
+def test_deleting_a_function_cascades_to_its_rows():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        function = Function(name="cascade-test", code="def handler(x):\n    return x", language=Language.PYTHON,
+                            runtime=Runtime.SUBPROCESS)
+        db.add(function)
+        db.commit()
+        function_id = function.id
+        db.add_all([
+            ExecutionMetric(function_id=function_id, execution_time=1.0, success=True),
+            MetricRollup(function_id=function_id, granularity="minute", bucket_start=datetime.utcnow()),
+            ExecutionJob(id="cascade-test", function_id=function_id, status=JobStatus.SUCCEEDED),
+        ])
+        db.commit()
+
+    async def delete():
+        # Same path as DELETE /functions/{id}: the relationship is passive, so the database cascades.
+        async with AsyncSessionLocal() as db:
+            await db.delete(await db.get(Function, function_id))
+            await db.commit()
+    asyncio.run(delete())
+
+    with SessionLocal() as db:
+        for model in (ExecutionMetric, MetricRollup, ExecutionJob):
+            assert db.query(model).filter(model.function_id == function_id).count() == 0
@@ -0,0 +1,122 @@
+import json
+import os
+import socketserver
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+import pytest
+from app.core.backends import ContainerSpec, DockerDaemonError, EngineAPIBackend
+
+
+def frame(stream: int, payload: bytes) -> bytes:
+    return struct.pack(">BxxxL", stream, len(payload)) + payload
+
+
+class FakeEngineHandler(BaseHTTPRequestHandler):
+    # Just enough of the Docker Engine API for one attached container run.
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        path = urlsplit(self.path).path
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.calls.append((self.command, path))
+        if path.endswith("/containers/create"):
+            image = json.loads(body)["Image"]
+            if image == "missing":
+                return self._reply(404, {"message": f"No such image: {image}:latest"})
+            return self._reply(201, {"Id": "broken" if image == "broken" else "c1"})
+        if path.endswith("/attach"):
+            # Hijacked connection: read stdin to EOF, answer with multiplexed stdout and stderr.
+            self.wfile.write(b"HTTP/1.1 101 UPGRADED\r\nConnection: Upgrade\r\nUpgrade: tcp\r\n\r\n")
+            self.wfile.flush()
+            stdin = b""
+            while True:
+                chunk = self.connection.recv(65536)
+                if not chunk:
+                    break
+                stdin += chunk
+            self.wfile.write(frame(1, stdin.upper()) + frame(2, b"warning"))
+            self.close_connection = True
+            return
+        if path.endswith("/broken/start"):
+            return self._reply(500, {"message": "cannot start container"})
+        if path.endswith("/start"):
+            return self._reply(204)
+        if path.endswith("/wait"):
+            return self._reply(200, {"StatusCode": 0})
+        if path.endswith("/json"):
+            return self._reply(200, {"State": {"OOMKilled": False}})
+        if self.command == "DELETE":
+            return self._reply(204)
+        self._reply(404, {"message": "page not found"})
+
+    do_GET = do_POST = do_DELETE = _handle
+
+
+class FakeEngine(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        super().__init__(path, FakeEngineHandler)
+        self.calls = []
+
+
+@pytest.fixture
+def engine_api(tmp_path):
+    path = str(tmp_path / "docker.sock")
+    server = FakeEngine(path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    backend = EngineAPIBackend(socket_path=path)
+    yield server, backend
+    backend.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_run_creates_attaches_waits_and_removes(engine_api):
+    server, backend = engine_api
+    result = backend.run(ContainerSpec(image="function-python-base", command=[]), stdin=b"hello", timeout=5)
+
+    assert (result.exit_code, result.stdout, result.stderr) == (0, b"HELLO", "warning")
+    assert not result.timed_out and not result.oom_killed
+    assert [call for call in server.calls if not call[1].endswith("/json")] == [
+        ("POST", "/v1.41/containers/create"),
+        ("POST", "/v1.41/containers/c1/attach"),
+        ("POST", "/v1.41/containers/c1/start"),
+        ("POST", "/v1.41/containers/c1/wait"),
+        ("DELETE", "/v1.41/containers/c1"),
+    ]
+
+
+def test_missing_image_is_reported(engine_api):
+    server, backend = engine_api
+    with pytest.raises(Exception, match=r"Container creation failed \(404\): No such image: missing:latest"):
+        backend.run(ContainerSpec(image="missing", command=[]), stdin=b"{}", timeout=5)
+    # Nothing was created, so nothing is removed.
+    assert server.calls == [("POST", "/v1.41/containers/create")]
+
+
+def test_error_status_is_raised_and_container_removed(engine_api):
+    server, backend = engine_api
+    with pytest.raises(Exception, match=r"Container start failed \(500\): cannot start container"):
+        backend.run(ContainerSpec(image="broken", command=[]), stdin=b"{}", timeout=5)
+    assert server.calls[-1] == ("DELETE", "/v1.41/containers/broken")
+
+
+def test_unreachable_daemon_is_a_daemon_error(tmp_path):
+    backend = EngineAPIBackend(socket_path=os.path.join(str(tmp_path), "absent.sock"))
+    with pytest.raises(DockerDaemonError):
+        backend.info()
@@ -0,0 +1,54 @@
+import pytest
+from app.core import pool as pool_module
+from app.core.execution import FunctionExecutionEngine
+from app.core.pool import ContainerPool
+from app.models.function import Language, Runtime
+
+
+@pytest.fixture
+def engine():
+    engine = FunctionExecutionEngine(use_pool=False)
+    engine.pool = ContainerPool(min_size=0)
+    yield engine
+    engine.pool.shutdown()
+
+
+def run(engine, code: str, timeout: int = 5, memory_limit: int = 128):
+    return engine.execute(1, code, Language.PYTHON, {}, runtime=Runtime.PROCESS, timeout=timeout,
+                          memory_limit=memory_limit)
+
+
+def test_allocation_past_the_memory_limit_is_oom(engine):
+    output, metrics = run(engine, "return len(bytearray(512 * 1024 * 1024))", memory_limit=64)
+    assert metrics["error_type"] == "oom", output
+    # The worker survives and serves the next call.
+    assert run(engine, "return 1", memory_limit=64)[0] == {"output": 1}
+
+
+def test_handler_past_its_timeout_is_a_timeout(engine):
+    output, metrics = run(engine, "while True:\n    pass", timeout=1)
+    assert metrics["error_type"] == "timeout", output
+
+
+def test_worker_killed_at_the_host_deadline_is_a_timeout(engine, monkeypatch):
+    monkeypatch.setattr(pool_module, "POOL_TIMEOUT_GRACE", 0.5)
+    # Ignoring SIGALRM keeps the worker from timing itself out, so the host has to kill it.
+    output, metrics = run(engine, "signal.signal(signal.SIGALRM, signal.SIG_IGN)\nwhile True:\n    pass", timeout=1)
+    assert metrics["error_type"] == "timeout", output
+    assert engine.pool.stats()["python/process/128m"]["total"] == 0
+
+
+def test_forked_child_killed_by_sigkill_is_oom(engine):
+    output, metrics = run(engine, "import os\nos.kill(os.getpid(), signal.SIGKILL)")
+    assert metrics["error_type"] == "oom", output
+    assert output == {"error": "Function exceeded its memory limit", "error_type": "oom"}
+
+
+def test_worker_exiting_with_137_is_oom(engine, monkeypatch):
+    # Without the fork server the handler runs in the worker itself, as in a container whose
+    # main process the OOM killer ended.
+    monkeypatch.setattr(pool_module, "POOL_FORK_SERVER", False)
+    output, metrics = run(engine, "import os\nos._exit(137)")
+    assert metrics["error_type"] == "oom", output
+    assert output == {"error": "Function exceeded its 128MB memory limit"}
+    assert engine.pool.stats()["python/process/128m"]["total"] == 0
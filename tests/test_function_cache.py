@@ -0,0 +1,113 @@
+import time
+import pytest
+from app.core.database import Base, SessionLocal, engine
+from app.core.function_cache import FunctionCache
+from app.models import metrics  # noqa: F401  (Function.metrics relationship)
+from app.models.function import Function, Language, Runtime
+
+
+@pytest.fixture
+def function_ids():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        functions = [Function(name=f"function-cache-{index}", code=f"return {index}", language=Language.PYTHON,
+                              runtime=Runtime.PROCESS) for index in range(3)]
+        db.add_all(functions)
+        db.commit()
+        ids = [function.id for function in functions]
+        yield ids
+        db.query(Function).filter(Function.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+
+
+class CountingSessions:
+    def __init__(self):
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return SessionLocal()
+
+
+def set_code(function_id: int, code: str) -> None:
+    with SessionLocal() as db:
+        db.get(Function, function_id).code = code
+        db.commit()
+
+
+def test_stale_read_racing_an_invalidation_is_not_cached(function_ids):
+    function_id = function_ids[0]
+    cache = FunctionCache()
+
+    class RacingSession:
+        # Reads the function, then lets an update and its invalidation land before the read is stored.
+        def __init__(self):
+            self._db = SessionLocal()
+            self._query = None
+
+        def query(self, *entities):
+            self._query = self._db.query(*entities)
+            return self
+
+        def filter(self, *criteria):
+            self._query = self._query.filter(*criteria)
+            return self
+
+        def first(self):
+            function = self._query.first()
+            set_code(function_id, "return 'new'")
+            cache.invalidate(function_id)
+            return function
+
+        def close(self):
+            self._db.close()
+
+    cache.session_factory = RacingSession
+
+    assert cache.get(function_id).code == "return 0"
+    assert cache.stats()["entries"] == 0
+
+    cache.session_factory = SessionLocal
+    assert cache.get(function_id).code == "return 'new'"
+    assert cache.get(function_id).code == "return 'new'"
+    assert cache.stats()["entries"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_entries_expire_after_the_ttl(function_ids):
+    sessions = CountingSessions()
+    cache = FunctionCache(session_factory=sessions, ttl=0.2)
+
+    cache.get(function_ids[0])
+    cache.get(function_ids[0])
+    assert sessions.opened == 1
+
+    time.sleep(0.3)
+    cache.get(function_ids[0])
+    assert sessions.opened == 2
+
+
+def test_least_recently_used_entry_is_evicted(function_ids):
+    sessions = CountingSessions()
+    cache = FunctionCache(session_factory=sessions, max_entries=2)
+    first, second, third = function_ids
+
+    cache.get(first)
+    cache.get(second)
+    cache.get(first)
+    cache.get(third)
+    assert sessions.opened == 3 and cache.stats()["entries"] == 2
+
+    cache.get(first)
+    assert sessions.opened == 3
+    cache.get(second)
+    assert sessions.opened == 4
+
+
+def test_invalidate_drops_the_entry(function_ids):
+    cache = FunctionCache()
+    assert cache.get(function_ids[1]).code == "return 1"
+    set_code(function_ids[1], "return 'updated'")
+    assert cache.get(function_ids[1]).code == "return 1"
+
+    cache.invalidate(function_ids[1])
+    assert cache.get(function_ids[1]).code == "return 'updated'"
@@ -0,0 +1,180 @@
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.api import functions
+from app.core.result_cache import ResultCache
+from app.core.scheduler import ExecutionScheduler
+from app.main import app
+from app.models.function import Runtime
+
+
+@pytest.fixture(scope="module")
+def client():
+    # Entering the client runs the startup hooks: recorder, engine, job workers and the rest.
+    with TestClient(app) as client:
+        yield client
+
+
+def create(client, name: str, **fields) -> dict:
+    body = {"name": name, "code": "return {'sum': input_data['a'] + input_data['b']}",
+            "language": "python", "runtime": "subprocess", "timeout": 5, **fields}
+    response = client.post("/functions/", json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def wait_for_metrics(client, function_id: int, count: int) -> list:
+    # Metrics are written by the background recorder, at most METRICS_FLUSH_INTERVAL after the call.
+    deadline = time.monotonic() + 10
+    while True:
+        items = client.get(f"/functions/{function_id}/metrics").json()["items"]
+        if len(items) >= count or time.monotonic() > deadline:
+            return items
+        time.sleep(0.1)
+
+
+def test_create_read_update_list(client):
+    created = create(client, "api-crud")
+    assert created["runtime"] == "subprocess" and created["cacheable"] is False
+
+    assert client.get(f"/functions/{created['id']}").json()["name"] == "api-crud"
+    updated = client.put(f"/functions/{created['id']}", json={"timeout": 10, "cacheable": True}).json()
+    assert (updated["timeout"], updated["cacheable"], updated["name"]) == (10, True, "api-crud")
+    assert created["id"] in [function["id"] for function in client.get("/functions/").json()]
+
+    assert client.post("/functions/", json={"name": "api-crud-bad", "code": "", "language": "python"}).status_code == 422
+    assert client.get("/functions/999999").status_code == 404
+
+
+def test_execute_records_metrics(client):
+    function = create(client, "api-execute")
+    response = client.post(f"/functions/{function['id']}/execute", json={"input": {"a": 2, "b": 3}})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["result"] == {"output": {"sum": 5}}
+    assert body["metrics"]["error"] is None
+
+    items = wait_for_metrics(client, function["id"], 1)
+    assert len(items) == 1
+    assert items[0]["success"] is True and items[0]["runtime"] == "subprocess"
+
+
+def test_metrics_are_paginated(client):
+    function = create(client, "api-metrics-pages")
+    for value in range(3):
+        assert client.post(f"/functions/{function['id']}/execute", json={"input": {"a": value, "b": 0}}).status_code == 200
+    assert len(wait_for_metrics(client, function["id"], 3)) == 3
+
+    first = client.get(f"/functions/{function['id']}/metrics", params={"limit": 2}).json()
+    assert len(first["items"]) == 2 and first["next_cursor"]
+    rest = client.get(f"/functions/{function['id']}/metrics",
+                      params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert len(rest["items"]) == 1 and rest["next_cursor"] is None
+    ids = [item["id"] for item in first["items"] + rest["items"]]
+    assert ids == sorted(ids, reverse=True)
+
+
+def test_delete_removes_function_and_metrics(client):
+    function = create(client, "api-delete")
+    client.post(f"/functions/{function['id']}/execute", json={"input": {"a": 1, "b": 1}})
+    assert len(wait_for_metrics(client, function["id"], 1)) == 1
+
+    assert client.delete(f"/functions/{function['id']}").json() == {"message": "Function deleted successfully"}
+    assert client.get(f"/functions/{function['id']}").status_code == 404
+    assert client.get(f"/functions/{function['id']}/metrics").status_code == 404
+    assert client.post(f"/functions/{function['id']}/execute", json={"input": {}}).status_code == 404
+
+
+def test_saturated_scheduler_answers_with_retry_after(client, monkeypatch):
+    # One subprocess slot and no room to queue behind it.
+    limited = ExecutionScheduler(runtime_limits={Runtime.SUBPROCESS: 1}, max_per_function=1,
+                                 max_function_queue=0)
+    monkeypatch.setattr(functions, "scheduler", limited)
+    release = threading.Event()
+    execute = functions.execution_engine.execute
+
+    def blocked(**kwargs):
+        release.wait(5)
+        return execute(**kwargs)
+    monkeypatch.setattr(functions.execution_engine, "execute", blocked)
+
+    busy, other = create(client, "api-saturated"), create(client, "api-saturated-other")
+    running = threading.Thread(target=client.post, args=(f"/functions/{busy['id']}/execute",),
+                               kwargs={"json": {"input": {"a": 1, "b": 1}}})
+    running.start()
+    try:
+        deadline = time.monotonic() + 5
+        while limited.stats()["running"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        response = client.post(f"/functions/{busy['id']}/execute", json={"input": {"a": 1, "b": 1}})
+        assert response.status_code == 429 and int(response.headers["Retry-After"]) >= 1
+
+        # Another function may queue, but the shared admission queue is full.
+        limited.max_function_queue, limited.max_queue = 1, 0
+        response = client.post(f"/functions/{other['id']}/execute", json={"input": {"a": 1, "b": 1}})
+        assert response.status_code == 503 and int(response.headers["Retry-After"]) >= 1
+    finally:
+        release.set()
+        running.join()
+        limited.shutdown()
+
+
+def execute(client, function_id: int, **input_data) -> dict:
+    response = client.post(f"/functions/{function_id}/execute", json={"input": input_data})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def cache_hit(body: dict) -> bool:
+    return bool(body["metrics"].get("cache_hit"))
+
+
+def test_only_successful_results_of_cacheable_functions_are_cached(client, monkeypatch):
+    # A fresh cache, since functions in this module share their code.
+    monkeypatch.setattr(functions.execution_engine, "results", ResultCache())
+    plain = create(client, "api-cache-plain")
+    assert not cache_hit(execute(client, plain["id"], a=1, b=2))
+    assert not cache_hit(execute(client, plain["id"], a=1, b=2))
+
+    pure = create(client, "api-cache-pure", cacheable=True)
+    first = execute(client, pure["id"], a=1, b=2)
+    second = execute(client, pure["id"], b=2, a=1)
+    assert not cache_hit(first) and cache_hit(second)
+    assert second["result"] == first["result"] == {"output": {"sum": 3}}
+
+    failing = create(client, "api-cache-failing", code="raise ValueError('not cached')", cacheable=True)
+    assert execute(client, failing["id"])["metrics"]["error"]
+    assert not cache_hit(execute(client, failing["id"]))
+
+
+def test_result_cache_evicts_least_recently_used_and_expired_entries(client, monkeypatch):
+    monkeypatch.setattr(functions.execution_engine, "results", ResultCache(ttl=0.5, max_entries=2))
+    function = create(client, "api-cache-eviction", cacheable=True)
+
+    for a in (1, 2):
+        execute(client, function["id"], a=a, b=0)
+    assert cache_hit(execute(client, function["id"], a=1, b=0))
+    # The third input evicts a=2, the least recently used.
+    execute(client, function["id"], a=3, b=0)
+    assert not cache_hit(execute(client, function["id"], a=2, b=0))
+
+    time.sleep(0.6)
+    assert not cache_hit(execute(client, function["id"], a=2, b=0))
+
+
+def test_update_and_delete_invalidate_cached_results(client, monkeypatch):
+    results = ResultCache()
+    monkeypatch.setattr(functions.execution_engine, "results", results)
+    function = create(client, "api-cache-invalidate", cacheable=True)
+
+    execute(client, function["id"], a=1, b=1)
+    assert cache_hit(execute(client, function["id"], a=1, b=1))
+    assert client.put(f"/functions/{function['id']}", json={"timeout": 10}).status_code == 200
+    assert results.stats()["entries"] == 0
+    assert not cache_hit(execute(client, function["id"], a=1, b=1))
+
+    assert results.stats()["entries"] == 1
+    assert client.delete(f"/functions/{function['id']}").status_code == 200
+    assert results.stats()["entries"] == 0
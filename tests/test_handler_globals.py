@@ -0,0 +1,31 @@
+import pytest
+from app.core.execution import FunctionExecutionEngine
+from app.core.pool import ContainerPool
+from app.models.function import Language, Runtime
+
+# Handlers that use the modules and names the per-call template provides without importing them.
+HANDLERS = {
+    Language.PYTHON: "return {'dumped': json.dumps(input_data), 'clock': isinstance(time.time(), float), "
+                     "'timeout': TIMEOUT, 'argv': isinstance(sys.argv, list), 'alarm': hasattr(signal, 'alarm')}",
+    Language.JAVASCRIPT: "return { dumped: JSON.stringify(input_data), "
+                         "hash: require('crypto').createHash('sha256').update('x').digest('hex').length, "
+                         "frames: typeof readFrame + '/' + typeof writeFrame };",
+}
+
+
+@pytest.fixture
+def engine():
+    engine = FunctionExecutionEngine(use_pool=False)
+    engine.pool = ContainerPool(min_size=0)
+    yield engine
+    engine.pool.shutdown()
+
+
+@pytest.mark.parametrize("language", list(HANDLERS))
+def test_pooled_and_per_call_runs_see_the_same_globals(engine, language):
+    outputs = {}
+    for runtime in (Runtime.SUBPROCESS, Runtime.PROCESS):
+        output, metrics = engine.execute(1, HANDLERS[language], language, {"a": 1}, runtime=runtime, timeout=5)
+        assert metrics["error"] is None, (runtime, output)
+        outputs[runtime] = output
+    assert outputs[Runtime.SUBPROCESS] == outputs[Runtime.PROCESS]
@@ -0,0 +1,96 @@
+import time
+import pytest
+from app.core.health import CircuitState, DockerHealthMonitor, DockerUnavailableError
+from app.models.function import Runtime
+
+
+class StubBackend:
+    name = "stub"
+
+    def __init__(self, healthy: bool = False):
+        self.healthy = healthy
+        self.calls = 0
+
+    def info(self):
+        self.calls += 1
+        if not self.healthy:
+            raise ConnectionError("daemon is down")
+        return {"ServerVersion": "99.0", "Runtimes": {"runc": {}, "runsc": {}}}
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_circuit_opens_half_opens_and_closes():
+    backend = StubBackend()
+    monitor = DockerHealthMonitor(backend, interval=60, reset_timeout=0.1)
+
+    # A failed daemon check trips the breaker at once.
+    assert monitor.check() is False
+    assert monitor.state == CircuitState.OPEN
+    with pytest.raises(DockerUnavailableError, match="daemon is down"):
+        monitor.ensure_available(Runtime.DOCKER)
+    # Host-process runtimes do not depend on the daemon.
+    monitor.ensure_available(Runtime.PROCESS)
+
+    # After reset_timeout one trial call is let through; its failure reopens the circuit.
+    assert wait_for(lambda: monitor.state == CircuitState.HALF_OPEN)
+    monitor.ensure_available(Runtime.DOCKER)
+    monitor.record_failure()
+    assert monitor.state == CircuitState.OPEN
+
+    assert wait_for(lambda: monitor.state == CircuitState.HALF_OPEN)
+    backend.healthy = True
+    assert monitor.check() is True
+    assert monitor.state == CircuitState.CLOSED
+    monitor.ensure_available(Runtime.GVISOR)
+    assert monitor.status()["docker"] == {"available": True, "backend": "stub", "version": "99.0", "error": None}
+
+
+def test_execution_failures_open_the_circuit_at_the_threshold():
+    monitor = DockerHealthMonitor(StubBackend(healthy=True), failure_threshold=3)
+    assert monitor.check() is True
+
+    monitor.record_failure()
+    monitor.record_failure()
+    assert monitor.state == CircuitState.CLOSED
+    monitor.record_success()
+    monitor.record_failure()
+    monitor.record_failure()
+    assert monitor.state == CircuitState.CLOSED
+    monitor.record_failure()
+    assert monitor.state == CircuitState.OPEN
+    with pytest.raises(DockerUnavailableError, match="circuit breaker open"):
+        monitor.ensure_available(Runtime.DOCKER)
+
+
+def test_daemon_is_checked_on_the_interval_not_per_call():
+    backend = StubBackend(healthy=True)
+    monitor = DockerHealthMonitor(backend, interval=60)
+    monitor.start()
+    try:
+        for _ in range(100):
+            monitor.ensure_available(Runtime.DOCKER)
+        assert backend.calls == 1
+    finally:
+        monitor.shutdown()
+
+
+def test_background_check_notices_the_daemon_recovering():
+    backend = StubBackend()
+    monitor = DockerHealthMonitor(backend, interval=0.05, reset_timeout=60)
+    monitor.start()
+    try:
+        assert monitor.state == CircuitState.OPEN and not monitor.daemon_available
+        backend.healthy = True
+        assert wait_for(lambda: monitor.daemon_available)
+        assert monitor.state == CircuitState.CLOSED
+        assert backend.calls >= 2
+    finally:
+        monitor.shutdown()
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+import pytest
+from app.core.database import Base, SessionLocal, engine
+from app.core.jobs import JOB_ERROR_MAX_LENGTH, JobWorkerPool
+from app.models.function import Function, Language, Runtime
+from app.models.job import ExecutionJob, JobStatus
+from app.models import metrics  # noqa: F401  (Function.metrics relationship)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    function = Function(name="jobs-test", code="def handler(x):\n    return x", language=Language.PYTHON,
+                        runtime=Runtime.SUBPROCESS, timeout=5, memory_limit=128)
+    session.add(function)
+    session.commit()
+    yield session, function
+    session.query(ExecutionJob).filter(ExecutionJob.function_id == function.id).delete()
+    session.delete(function)
+    session.commit()
+    session.close()
+
+
+def add_job(session, function, **fields) -> ExecutionJob:
+    job = JobWorkerPool(None, None)._new_job(function.id, {}, fields.pop("max_attempts", 3))
+    for name, value in fields.items():
+        setattr(job, name, value)
+    session.add(job)
+    session.commit()
+    return job
+
+
+def test_expired_lease_on_last_attempt_fails_the_job(db):
+    session, function = db
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    job = add_job(session, function, status=JobStatus.RUNNING, attempts=3, lease_expires_at=expired)
+
+    assert JobWorkerPool(None, None)._claim(session, "worker") is None
+    session.refresh(job)
+    assert job.status == JobStatus.FAILED
+    assert job.attempts == 3
+    assert job.error == "Gave up after 3 of 3 attempts"
+    assert job.finished_at is not None
+
+
+def test_expired_lease_with_attempts_left_is_reclaimed(db):
+    session, function = db
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    job = add_job(session, function, status=JobStatus.RUNNING, attempts=2, lease_expires_at=expired)
+
+    claimed = JobWorkerPool(None, None)._claim(session, "worker")
+    assert claimed.id == job.id
+    assert (claimed.status, claimed.attempts, claimed.worker_id) == (JobStatus.RUNNING, 3, "worker")
+
+
+def test_queued_job_without_attempts_is_not_run(db):
+    session, function = db
+    job = add_job(session, function, max_attempts=0)
+
+    assert JobWorkerPool(None, None)._claim(session, "worker") is None
+    session.refresh(job)
+    assert job.status == JobStatus.FAILED
+
+
+class FailingEngine:
+    def execute(self, **kwargs):
+        raise RuntimeError("x" * 10000)
+
+
+def test_long_errors_are_truncated_to_fit_the_column(db):
+    session, function = db
+    job = add_job(session, function, max_attempts=2)
+    pool = JobWorkerPool(FailingEngine(), None)
+
+    assert pool._process_next("worker")
+    session.refresh(job)
+    assert job.status == JobStatus.QUEUED
+    assert len(job.error) == JOB_ERROR_MAX_LENGTH
+
+    assert pool._process_next("worker")
+    session.refresh(job)
+    assert job.status == JobStatus.FAILED
+    assert len(job.error) == JOB_ERROR_MAX_LENGTH
+    assert job.error.endswith("...")
@@ -0,0 +1,42 @@
+import sqlite3
+from sqlalchemy import create_engine, inspect
+import migrate_db
+from app.models.function import Base
+
+# The schema the first release created, before any of the columns the models have gained since.
+BASELINE = """
+CREATE TABLE functions (id INTEGER PRIMARY KEY, name VARCHAR(255), code VARCHAR(4096), language VARCHAR(10),
+                        timeout INTEGER, memory_limit INTEGER, runtime VARCHAR(6), created_at DATETIME NOT NULL,
+                        updated_at DATETIME);
+CREATE UNIQUE INDEX ix_functions_name ON functions (name);
+CREATE INDEX ix_functions_id ON functions (id);
+CREATE TABLE function_execution_metrics (id INTEGER PRIMARY KEY,
+                                         function_id INTEGER REFERENCES functions (id) ON DELETE CASCADE,
+                                         execution_time FLOAT, success BOOLEAN, memory_used FLOAT,
+                                         created_at DATETIME, error VARCHAR);
+CREATE INDEX ix_function_execution_metrics_id ON function_execution_metrics (id);
+INSERT INTO functions VALUES (1, 'f', 'return 1', 'PYTHON', 30, 128, 'DOCKER', '2024-01-01', NULL);
+INSERT INTO function_execution_metrics VALUES (1, 1, 1.0, 0, 1.0, '2024-01-01', 'boom'),
+                                              (2, 1, 1.0, 0, 1.0, '2024-01-01', 'boom'),
+                                              (3, 1, 1.0, 1, 1.0, '2024-01-01', NULL);
+"""
+
+
+def test_migrates_a_baseline_database(tmp_path):
+    path = tmp_path / "baseline.db"
+    with sqlite3.connect(path) as db:
+        db.executescript(BASELINE)
+    engine = create_engine(f"sqlite:///{path}")
+
+    assert migrate_db.migrate(engine, dry_run=True)
+    assert migrate_db.migrate(engine)
+    assert migrate_db.plan(engine) == []
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {column.name for column in table.columns} <= {column["name"] for column in inspector.get_columns(table.name)}
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT cacheable FROM functions").fetchall() == [(0,)]
+        rows = db.execute("SELECT m.id, e.message FROM function_execution_metrics m "
+                          "LEFT JOIN execution_errors e ON e.id = m.error_id ORDER BY m.id").fetchall()
+    assert rows == [(1, "boom"), (2, "boom"), (3, None)]
@@ -0,0 +1,91 @@
+import threading
+import time
+import pytest
+from app.core.execution import FunctionExecutionEngine
+from app.core.pool import ContainerPool
+from app.models.function import Language, Runtime
+
+KEY = (Language.PYTHON, Runtime.PROCESS, 128)
+
+
+@pytest.fixture
+def pool():
+    pool = ContainerPool(min_size=0, max_size=2)
+    yield pool
+    pool.shutdown()
+
+
+def warm(pool: ContainerPool, *code_keys: str):
+    # One idle worker per code key, each having run only that code.
+    workers = [pool.acquire(*KEY, code_key=code_key) for code_key in code_keys]
+    for worker, code_key in zip(workers, code_keys):
+        pool.release(worker, code_key=code_key)
+    return workers
+
+
+def test_calls_return_to_the_worker_that_ran_their_code(pool):
+    first, second = warm(pool, "f", "g")
+    assert pool._affinity == {"f": {first}, "g": {second}}
+
+    for code_key, expected in [("f", first), ("g", second), ("f", first), ("f", first), ("g", second)]:
+        worker = pool.acquire(*KEY, code_key=code_key)
+        assert worker is expected
+        pool.release(worker, code_key=code_key)
+    assert pool.stats()["python/process/128m"] == {"idle": 2, "total": 2}
+
+
+def test_engine_reuses_the_warm_worker_for_repeated_calls():
+    engine = FunctionExecutionEngine(use_pool=False)
+    engine.pool = ContainerPool(min_size=0, max_size=2)
+    acquired = []
+    acquire = engine.pool.acquire
+
+    def recording(*args, **kwargs):
+        acquired.append(acquire(*args, **kwargs))
+        return acquired[-1]
+    engine.pool.acquire = recording
+    try:
+        for value in range(3):
+            output, metrics = engine.execute(1, "return input_data['n']", Language.PYTHON, {"n": value},
+                                             runtime=Runtime.PROCESS, timeout=5)
+            assert (output, metrics["error"]) == ({"output": value}, None)
+        assert engine.pool.stats()["python/process/128m"] == {"idle": 1, "total": 1}
+    finally:
+        engine.pool.shutdown()
+    assert acquired[0] is acquired[1] is acquired[2]
+
+
+def test_without_stickiness_a_busy_affine_worker_is_not_waited_for(pool):
+    affine, other = warm(pool, "f", "g")
+    busy = pool.acquire(*KEY, code_key="f")
+    assert busy is affine and pool._busy_with(KEY, "f")
+
+    taken = pool.acquire(*KEY, code_key="f")
+    assert taken is other
+    # Workers in use are not stopped by shutdown(), so hand them back.
+    pool.release(busy)
+    pool.release(taken)
+
+
+def test_call_waits_for_its_busy_worker_until_stickiness_runs_out():
+    pool = ContainerPool(min_size=0, max_size=2, stickiness=0.3)
+    try:
+        affine, other = warm(pool, "f", "g")
+        busy = pool.acquire(*KEY, code_key="f")
+        assert busy is affine
+
+        # The affine worker comes back within the stickiness window, so the call waits for it.
+        timer = threading.Timer(0.1, pool.release, args=(busy,), kwargs={"code_key": "f"})
+        timer.start()
+        assert pool.acquire(*KEY, code_key="f") is affine
+        timer.join()
+
+        # It stays busy past the window: the call falls back to the other idle worker.
+        started = time.monotonic()
+        taken = pool.acquire(*KEY, code_key="f")
+        assert taken is other
+        assert time.monotonic() - started >= 0.3
+        pool.release(affine)
+        pool.release(taken)
+    finally:
+        pool.shutdown()
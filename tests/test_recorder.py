@@ -0,0 +1,70 @@
+import os
+from datetime import datetime
+import pytest
+from sqlalchemy.exc import OperationalError
+from app.core.database import Base, SessionLocal, engine
+from app.core.recorder import MetricRecorder
+from app.models.function import Function, Language, Runtime
+from app.models.metrics import ExecutionMetric
+from app.models.rollup import MetricRollup
+
+# Far from the wall clock, so rollups written by other tests share no bucket with these.
+MINUTE = datetime(2032, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def function_id():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        function = Function(name="recorder-test", code="return 1", language=Language.PYTHON,
+                            runtime=Runtime.PROCESS)
+        db.add(function)
+        db.commit()
+        yield function.id
+        db.delete(function)
+        db.commit()
+
+
+class FlakyDatabase:
+    # Session factory whose database is down until it is brought back.
+    def __init__(self):
+        self.down = True
+
+    def __call__(self):
+        if self.down:
+            raise OperationalError("INSERT", {}, ConnectionError("database is down"))
+        return SessionLocal()
+
+
+def metrics(second: int, error=None):
+    return {"execution_time": 0.1, "memory_used": 12.0, "error": error, "error_type": "error" if error else None,
+            "created_at": MINUTE.replace(second=second)}
+
+
+def test_failed_insert_spills_and_the_next_flush_replays_once(function_id, tmp_path):
+    spill_path = tmp_path / "spill.jsonl"
+    database = FlakyDatabase()
+    recorder = MetricRecorder(session_factory=database, spill_path=str(spill_path))
+
+    recorder.record_many(function_id, [metrics(1), metrics(2, error="boom"), metrics(3)], Runtime.PROCESS)
+    recorder._write(recorder._drain(block=False))
+    assert len(spill_path.read_text().splitlines()) == 3
+    assert recorder.stats() == {"queued": 0, "written": 0, "spilled": 3}
+
+    database.down = False
+    recorder.record(function_id, metrics(4), Runtime.PROCESS)
+    recorder._write(recorder._drain(block=False))
+    # A later flush (and shutdown) must not write the replayed rows again.
+    recorder.record(function_id, metrics(5), Runtime.PROCESS)
+    recorder.shutdown()
+
+    assert not os.path.exists(spill_path) and not os.path.exists(f"{spill_path}.replay")
+    assert recorder.stats() == {"queued": 0, "written": 5, "spilled": 3}
+    with SessionLocal() as db:
+        stored = db.query(ExecutionMetric).filter(ExecutionMetric.function_id == function_id).all()
+        assert sorted(metric.created_at.second for metric in stored) == [1, 2, 3, 4, 5]
+        assert [metric.error for metric in stored if not metric.success] == ["boom"]
+        assert all(metric.runtime == Runtime.PROCESS for metric in stored)
+        rollups = db.query(MetricRollup).filter(MetricRollup.function_id == function_id).all()
+        assert {rollup.granularity: (rollup.count, rollup.success_count) for rollup in rollups} == {
+            "minute": (5, 4), "hour": (5, 4), "day": (5, 4)}
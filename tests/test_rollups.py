@@ -0,0 +1,138 @@
+import math
+import random
+from datetime import datetime
+import pytest
+from app.core.database import Base, SessionLocal, engine
+from app.core.rollups import apply_rollups, rebuild_rollups
+from app.core.sketch import LatencySketch
+from app.models.function import Function, Language, Runtime
+from app.models.metrics import ExecutionMetric
+from app.models.rollup import MetricRollup
+
+# Far from the wall clock, so metrics written by other tests are not rebuilt with these.
+DAY = datetime(2031, 1, 1)
+TIMES = [
+    datetime(2031, 1, 1, 10, 0, 10), datetime(2031, 1, 1, 10, 0, 50), datetime(2031, 1, 1, 10, 1, 30),
+    datetime(2031, 1, 1, 11, 5), datetime(2031, 1, 2, 9, 0),
+]
+
+
+def latencies(count: int, seed: int):
+    generator = random.Random(seed)
+    return [generator.lognormvariate(-3, 1) for _ in range(count)]
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    values = latencies(5000, seed=1)
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    ordered = sorted(values)
+    for q in (0.0, 0.1, 0.5, 0.9, 0.99, 1.0):
+        exact = ordered[math.floor(q * (len(ordered) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact + 1e-12
+
+
+def test_zero_durations_and_empty_sketches():
+    sketch = LatencySketch()
+    assert sketch.quantile(0.5) is None
+    sketch.add(0.0, count=3)
+    sketch.add(1.0)
+    assert sketch.count == 4
+    assert sketch.quantile(0.5) == 0.0
+
+
+def test_merged_sketches_match_one_sketch_of_all_values():
+    first, second = latencies(1000, seed=2), latencies(1000, seed=3)
+    merged, whole = LatencySketch(), LatencySketch()
+    part = LatencySketch()
+    for value in first:
+        merged.add(value)
+        whole.add(value)
+    for value in second:
+        part.add(value)
+        whole.add(value)
+
+    # Through to_dict, as rollups store them.
+    merged.merge(LatencySketch.from_dict(part.to_dict()))
+    assert merged.bins == whole.bins and merged.count == 2000
+    assert merged.quantile(0.99) == whole.quantile(0.99)
+
+    with pytest.raises(ValueError):
+        merged.merge(LatencySketch(relative_accuracy=0.05))
+
+
+@pytest.fixture
+def function_id():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        function = Function(name="rollups-test", code="return 1", language=Language.PYTHON,
+                            runtime=Runtime.PROCESS)
+        db.add(function)
+        db.commit()
+        yield function.id
+        db.delete(function)
+        db.commit()
+
+
+def metric_rows(function_id: int):
+    return [
+        {"function_id": function_id, "runtime": Runtime.PROCESS, "created_at": created_at,
+         "execution_time": 0.1 * (index + 1), "memory_used": 10.0 * (index + 1), "success": index != 2,
+         "error_type": "timeout" if index == 2 else None, "cache_hit": index == 0}
+        for index, created_at in enumerate(TIMES)
+    ]
+
+
+def snapshot(db, function_id: int):
+    rollups = db.query(MetricRollup).filter(MetricRollup.function_id == function_id).all()
+    return {
+        (rollup.granularity, rollup.bucket_start): (
+            rollup.count, rollup.success_count, rollup.timeout_count, rollup.oom_count, rollup.cache_hit_count,
+            round(rollup.time_sum, 9), rollup.time_min, rollup.time_max, rollup.memory_count,
+            round(rollup.memory_sum, 9), rollup.memory_min, rollup.memory_max, rollup.time_sketch,
+        )
+        for rollup in rollups
+    }
+
+
+def test_apply_rollups_upserts_minute_hour_and_day_buckets(function_id):
+    rows = metric_rows(function_id)
+    with SessionLocal() as db:
+        apply_rollups(db, rows[:2])
+        db.commit()
+        # The second batch updates the 10:00 buckets written by the first and adds new ones.
+        apply_rollups(db, rows[2:])
+        db.commit()
+        rollups = snapshot(db, function_id)
+
+    assert sorted(rollups) == [
+        ("day", datetime(2031, 1, 1)), ("day", datetime(2031, 1, 2)),
+        ("hour", datetime(2031, 1, 1, 10)), ("hour", datetime(2031, 1, 1, 11)), ("hour", datetime(2031, 1, 2, 9)),
+        ("minute", datetime(2031, 1, 1, 10, 0)), ("minute", datetime(2031, 1, 1, 10, 1)),
+        ("minute", datetime(2031, 1, 1, 11, 5)), ("minute", datetime(2031, 1, 2, 9, 0)),
+    ]
+    count, success, timeouts, _, cache_hits, time_sum, time_min, time_max, *_ = rollups[("day", DAY)]
+    assert (count, success, timeouts, cache_hits) == (4, 3, 1, 1)
+    assert (time_sum, time_min, time_max) == (1.0, 0.1, 0.4)
+    assert rollups[("minute", datetime(2031, 1, 1, 10, 0))][:2] == (2, 2)
+    assert rollups[("hour", datetime(2031, 1, 1, 10))][:3] == (3, 2, 1)
+
+
+def test_rebuild_matches_incremental_application(function_id):
+    rows = metric_rows(function_id)
+    with SessionLocal() as db:
+        db.add_all([
+            ExecutionMetric(function_id=row["function_id"], runtime=row["runtime"], created_at=row["created_at"],
+                            execution_time=row["execution_time"], memory_used=row["memory_used"],
+                            success=row["success"], error_type=row["error_type"], cache_hit=row["cache_hit"])
+            for row in rows
+        ])
+        for row in rows:
+            apply_rollups(db, [row])
+        db.commit()
+        incremental = snapshot(db, function_id)
+
+        assert rebuild_rollups(db, since=DAY, batch_size=2) == len(rows)
+        assert snapshot(db, function_id) == incremental
@@ -0,0 +1,50 @@
+import os
+import pytest
+from pydantic import ValidationError
+from app.core import health
+from app.core.execution import FunctionExecutionEngine
+from app.core.health import DockerUnavailableError
+from app.core.pool import ContainerPool
+from app.models.function import Language, Runtime
+from app.schemas import function as schemas
+
+# Reports what a function can see of the host: /root is only listable by host root.
+PROBE = ("import os\n"
+         "try:\n"
+         "    os.listdir('/root')\n"
+         "    return 'root'\n"
+         "except PermissionError:\n"
+         "    return 'unprivileged'")
+
+
+@pytest.fixture
+def disabled(monkeypatch):
+    monkeypatch.setattr(schemas, "ALLOW_LOCAL_RUNTIMES", False)
+    monkeypatch.setattr(health, "ALLOW_LOCAL_RUNTIMES", False)
+
+
+@pytest.mark.parametrize("runtime", [Runtime.SUBPROCESS, Runtime.PROCESS])
+def test_local_runtimes_are_rejected_unless_enabled(disabled, runtime):
+    with pytest.raises(ValidationError, match="ALLOW_LOCAL_RUNTIMES"):
+        schemas.FunctionCreate(name="f", code="return 1", language=Language.PYTHON, runtime=runtime)
+    with pytest.raises(ValidationError, match="ALLOW_LOCAL_RUNTIMES"):
+        schemas.FunctionUpdate(runtime=runtime)
+    assert schemas.FunctionCreate(name="f", code="return 1", language=Language.PYTHON).runtime == Runtime.DOCKER
+
+    monitor = FunctionExecutionEngine(use_pool=False).health
+    with pytest.raises(DockerUnavailableError, match="ALLOW_LOCAL_RUNTIMES"):
+        monitor.ensure_available(runtime)
+    assert monitor.status()["runtimes"][runtime.value] is False
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="privileges are only dropped when the API runs as root")
+@pytest.mark.parametrize("runtime", [Runtime.SUBPROCESS, Runtime.PROCESS])
+def test_functions_do_not_run_as_host_root(runtime):
+    engine = FunctionExecutionEngine(use_pool=False)
+    engine.pool = ContainerPool(min_size=0)
+    try:
+        output, metrics = engine.execute(1, PROBE, Language.PYTHON, None, runtime=runtime, timeout=5)
+    finally:
+        engine.pool.shutdown()
+    assert metrics["error"] is None, output
+    assert output == {"output": "unprivileged"}
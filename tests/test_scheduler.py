@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.core.scheduler import ExecutionScheduler, SchedulerSaturatedError
+from app.models.function import Runtime
+
+
+class Calls:
+    # Blocking work for the scheduler's threads that records how many calls overlapped.
+    def __init__(self):
+        self.release = threading.Event()
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, value=None):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        self.release.wait(5)
+        with self._lock:
+            self.running -= 1
+        return value
+
+
+async def until(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def scheduler(**options) -> ExecutionScheduler:
+    options.setdefault("runtime_limits", {Runtime.PROCESS: 4, Runtime.SUBPROCESS: 4})
+    return ExecutionScheduler(**options)
+
+
+def test_per_function_limit_queues_calls_of_one_function():
+    calls = Calls()
+    limited = scheduler(max_per_function=1)
+
+    async def run():
+        tasks = [asyncio.ensure_future(limited.submit(1, Runtime.PROCESS, calls, index)) for index in range(3)]
+        other = asyncio.ensure_future(limited.submit(2, Runtime.PROCESS, calls, "other"))
+        # Function 2 has its own slot, so it runs beside function 1's call.
+        await until(lambda: calls.running == 2)
+        assert limited.stats()["waiting"] == 2
+        calls.release.set()
+        return await asyncio.gather(*tasks, other)
+
+    assert asyncio.run(run()) == [0, 1, 2, "other"]
+    assert calls.peak == 2
+    limited.shutdown()
+
+
+def test_per_runtime_limit_is_shared_between_functions():
+    calls = Calls()
+    limited = scheduler(runtime_limits={Runtime.PROCESS: 1, Runtime.SUBPROCESS: 1})
+
+    async def run():
+        first = asyncio.ensure_future(limited.submit(1, Runtime.PROCESS, calls))
+        second = asyncio.ensure_future(limited.submit(2, Runtime.PROCESS, calls))
+        other = asyncio.ensure_future(limited.submit(3, Runtime.SUBPROCESS, calls))
+        await until(lambda: calls.running == 2)
+        assert limited.stats()["waiting"] == 1
+        calls.release.set()
+        await asyncio.gather(first, second, other)
+
+    asyncio.run(run())
+    assert calls.peak == 2
+    limited.shutdown()
+
+
+def saturate(limited: ExecutionScheduler, calls: Calls, function_id: int) -> SchedulerSaturatedError:
+    async def run():
+        running = asyncio.ensure_future(limited.submit(1, Runtime.PROCESS, calls))
+        await until(lambda: calls.running == 1)
+        try:
+            with pytest.raises(SchedulerSaturatedError) as rejected:
+                await limited.submit(function_id, Runtime.PROCESS, calls)
+        finally:
+            calls.release.set()
+            await running
+        return rejected.value
+
+    try:
+        return asyncio.run(run())
+    finally:
+        limited.shutdown()
+
+
+def test_full_function_queue_is_rejected_with_429():
+    error = saturate(scheduler(max_per_function=1, max_function_queue=0), Calls(), function_id=1)
+    assert error.status_code == 429 and error.retry_after >= 1
+
+
+def test_full_admission_queue_is_rejected_with_503():
+    limits = {Runtime.PROCESS: 1}
+    error = saturate(scheduler(runtime_limits=limits, max_queue=0), Calls(), function_id=2)
+    assert error.status_code == 503 and error.retry_after >= 1
+
+
+def test_queue_timeout_is_rejected_with_503():
+    limits = {Runtime.PROCESS: 1}
+    error = saturate(scheduler(runtime_limits=limits, queue_timeout=0.05), Calls(), function_id=2)
+    assert error.status_code == 503 and str(error) == "Timed out waiting for an execution slot"
+
+
+def test_retry_after_grows_with_the_queue():
+    limited = scheduler(runtime_limits={Runtime.PROCESS: 1})
+    limited._avg_duration = 2.0
+    assert limited.retry_after() == 2
+    limited._waiting = 4
+    assert limited.retry_after() == 10
+    limited.shutdown()